@@ -20,7 +20,7 @@ class PPOPolicy:
         self.optimizer = torch.optim.Adam([
             {'params': self.actor.parameters()},
             {'params': self.critic.parameters()}
-        ], lr=self.lr)
+        ], lr=self.lr, fused=args.use_fused_optimizer or None)
 
     def get_actions(self, obs, rnn_states_actor, rnn_states_critic, masks):
         """
@@ -3,7 +3,7 @@ import torch.nn as nn
 from typing import Union, List
 from .ppo_policy import PPOPolicy
 from ..utils.buffer import ReplayBuffer
-from ..utils.utils import check, get_gard_norm
+from ..utils.utils import check, get_gard_norm, all_reduce_gradients, all_reduce_mean
 
 
 class PPOTrainer():
@@ -23,8 +23,14 @@ class PPOTrainer():
         # rnn configs
         self.use_recurrent_policy = args.use_recurrent_policy
         self.data_chunk_length = args.data_chunk_length
+        # fast training configs
+        self.use_bf16_autocast = args.use_bf16_autocast
+        # data-parallel training over learner processes (see DistributedLearners)
+        self.num_learners = args.num_learners
+        if args.use_torch_compile:
+            self.ppo_loss = torch.compile(self.ppo_loss, dynamic=True)
 
-    def ppo_update(self, policy: PPOPolicy, sample):
+    def ppo_loss(self, policy: PPOPolicy, sample):
 
         obs_batch, actions_batch, masks_batch, old_action_log_probs_batch, advantages_batch, \
             returns_batch, value_preds_batch, rnn_states_actor_batch, rnn_states_critic_batch = sample
@@ -35,11 +41,13 @@ class PPOTrainer():
         value_preds_batch = check(value_preds_batch).to(**self.tpdv)
 
         # Reshape to do in a single forward pass for all steps
-        values, action_log_probs, dist_entropy = policy.evaluate_actions(obs_batch,
-                                                                         rnn_states_actor_batch,
-                                                                         rnn_states_critic_batch,
-                                                                         actions_batch,
-                                                                         masks_batch)
+        with torch.autocast(self.device.type, dtype=torch.bfloat16, enabled=self.use_bf16_autocast):
+            values, action_log_probs, dist_entropy = policy.evaluate_actions(obs_batch,
+                                                                             rnn_states_actor_batch,
+                                                                             rnn_states_critic_batch,
+                                                                             actions_batch,
+                                                                             masks_batch)
+        values, action_log_probs, dist_entropy = values.float(), action_log_probs.float(), dist_entropy.float()
 
         # Obtain the loss function
         ratio = torch.exp(action_log_probs - old_action_log_probs_batch)
@@ -60,13 +68,22 @@ class PPOTrainer():
         policy_entropy_loss = -dist_entropy.mean()
 
         loss = policy_loss + value_loss * self.value_loss_coef + policy_entropy_loss * self.entropy_coef
+        return loss, policy_loss, value_loss, policy_entropy_loss, ratio
+
+    def ppo_update(self, policy: PPOPolicy, sample):
+        loss, policy_loss, value_loss, policy_entropy_loss, ratio = self.ppo_loss(policy, sample)
 
         # Optimize the loss function
         policy.optimizer.zero_grad()
         loss.backward()
+        if self.num_learners > 1:
+            # weighted by number of chunks of the minibatch shard of each learner
+            all_reduce_gradients(list(policy.actor.parameters()) + list(policy.critic.parameters()), len(sample[-1]))
         if self.use_max_grad_norm:
-            actor_grad_norm = nn.utils.clip_grad_norm_(policy.actor.parameters(), self.max_grad_norm).item()
-            critic_grad_norm = nn.utils.clip_grad_norm_(policy.critic.parameters(), self.max_grad_norm).item()
+            actor_grad_norm = nn.utils.clip_grad_norm_(policy.actor.parameters(), self.max_grad_norm,
+                                                       foreach=True).item()
+            critic_grad_norm = nn.utils.clip_grad_norm_(policy.critic.parameters(), self.max_grad_norm,
+                                                        foreach=True).item()
         else:
             actor_grad_norm = get_gard_norm(policy.actor.parameters())
             critic_grad_norm = get_gard_norm(policy.critic.parameters())
@@ -82,10 +99,12 @@ class PPOTrainer():
         train_info['actor_grad_norm'] = 0
         train_info['critic_grad_norm'] = 0
         train_info['ratio'] = 0
+        rank, world_size = (torch.distributed.get_rank(), self.num_learners) if self.num_learners > 1 else (0, 1)
 
         for _ in range(self.ppo_epoch):
             if self.use_recurrent_policy:
-                data_generator = ReplayBuffer.recurrent_generator(buffer, self.num_mini_batch, self.data_chunk_length)
+                data_generator = ReplayBuffer.recurrent_generator(buffer, self.num_mini_batch, self.data_chunk_length,
+                                                                    rank, world_size)
             else:
                 raise NotImplementedError
 
@@ -106,4 +125,6 @@ class PPOTrainer():
         for k in train_info.keys():
             train_info[k] /= num_updates
 
+        if self.num_learners > 1:
+            train_info = all_reduce_mean(train_info)
         return train_info
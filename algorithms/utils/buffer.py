@@ -1,6 +1,8 @@
 import torch
+import torch.distributed
 import numpy as np
-from typing import Union, List
+from functools import lru_cache
+from typing import Union, List, Dict
 from abc import ABC, abstractmethod
 from .utils import get_shape_from_space
 
@@ -23,15 +25,63 @@ class Buffer(ABC):
         pass
 
 
-class ReplayBuffer(Buffer):
+class ChunkRNNStates:
+    """RNN states of steps 0..T of a replay buffer, which only keeps the states at chunk starts (steps at
+    multiples of `chunk_length`) consumed by recurrent generators, and the latest written step of each thread
+    consumed by rollouts.
+
+    It is indexed like the full array of shape (T + 1, n_rollout_threads, ...), by a step or by (steps, threads)
+    index arrays. Reading any other step raises an IndexError.
+    """
+    def __init__(self, shape, chunk_length: int, dtype=np.float32):
+        assert (shape[0] - 1) % chunk_length == 0, \
+            f"Buffer size ({shape[0] - 1}) must be a multiple of chunk length ({chunk_length}) to store chunk rnn states"
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.chunk_length = chunk_length
+        self.chunks = np.zeros(((shape[0] - 1) // chunk_length + 1, *shape[1:]), dtype=dtype)
+        # NOTE: rollouts always read full precision states
+        self.latest = np.zeros(shape[1:], dtype=np.float32)
+        self.latest_steps = np.zeros(shape[1], dtype=np.int64)
 
-    @staticmethod
-    def _flatten(T: int, N: int, x: np.ndarray):
-        return x.reshape(T * N, *x.shape[2:])
+    @property
+    def nbytes(self) -> int:
+        return self.chunks.nbytes + self.latest.nbytes + self.latest_steps.nbytes
+
+    def fill(self, value):
+        self.chunks.fill(value)
+        self.latest.fill(value)
+        self.latest_steps.fill(0)
+
+    def _index(self, key):
+        """Steps and threads of `key`, as arrays of the same length."""
+        steps, threads = key if isinstance(key, tuple) else (key, slice(None))
+        threads = np.arange(self.shape[1])[threads]
+        steps = np.broadcast_to(np.asarray(steps) % self.shape[0], threads.shape)
+        return steps, threads
+
+    def __getitem__(self, key) -> np.ndarray:
+        steps, threads = self._index(key)
+        if np.all(steps == self.latest_steps[threads]):
+            return self.latest[threads]
+        if np.all(steps % self.chunk_length == 0):
+            return self.chunks[steps // self.chunk_length, threads]
+        raise IndexError(f"RNN states are only stored at the latest step and at multiples of {self.chunk_length}")
+
+    def __setitem__(self, key, value):
+        steps, threads = self._index(key)
+        value = np.broadcast_to(value, (len(threads), *self.shape[2:]))
+        self.latest[threads] = value
+        self.latest_steps[threads] = steps
+        starts = steps % self.chunk_length == 0
+        self.chunks[steps[starts] // self.chunk_length, threads[starts]] = value[starts]
 
-    @staticmethod
-    def _cast(x: np.ndarray):
-        return x.transpose(1, 2, 0, *range(3, x.ndim)).reshape(-1, *x.shape[3:])
+
+class ReplayBuffer(Buffer):
+    # data arrays, masks are cleared to ones and others to zeros
+    _fields = ["obs", "actions", "rewards", "masks", "bad_masks", "action_log_probs", "value_preds", "returns",
+               "rnn_states_actor", "rnn_states_critic"]
+    _mask_fields = ["masks", "bad_masks"]
 
     def __init__(self, args, num_agents, obs_space, act_space):
         # buffer config
@@ -64,12 +114,19 @@ class ReplayBuffer(Buffer):
         self.value_preds = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
         self.returns = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
         # rnn
-        self.rnn_states_actor = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents,
-                                          self.recurrent_hidden_layers, self.recurrent_hidden_size), dtype=np.float32)
-        self.rnn_states_critic = np.zeros_like(self.rnn_states_actor)
+        self.rnn_states_actor = self._rnn_states(args)
+        self.rnn_states_critic = self._rnn_states(args)
 
         self.step = 0
 
+    def _rnn_states(self, args) -> Union[np.ndarray, ChunkRNNStates]:
+        """RNN states of steps 0..T, stored as set by `--rnn-states-storage` and `--rnn-states-dtype`."""
+        shape = (self.buffer_size + 1, self.n_rollout_threads, self.num_agents,
+                 self.recurrent_hidden_layers, self.recurrent_hidden_size)
+        if args.rnn_states_storage == "chunk":
+            return ChunkRNNStates(shape, args.data_chunk_length, args.rnn_states_dtype)
+        return np.zeros(shape, dtype=args.rnn_states_dtype)
+
     @property
     def advantages(self) -> np.ndarray:
         advantages = self.returns[:-1] - self.value_preds[:-1]  # type: np.ndarray
@@ -119,54 +176,63 @@ class ReplayBuffer(Buffer):
         self.rnn_states_critic[0] = self.rnn_states_critic[-1].copy()
 
     def clear(self):
+        """Reset all data in place, without reallocating the arrays."""
         self.step = 0
-        self.obs = np.zeros_like(self.obs, dtype=np.float32)
-        self.actions = np.zeros_like(self.actions, dtype=np.float32)
-        self.rewards = np.zeros_like(self.rewards, dtype=np.float32)
-        self.masks = np.ones_like(self.masks, dtype=np.float32)
-        self.bad_masks = np.ones_like(self.bad_masks, dtype=np.float32)
-        self.action_log_probs = np.zeros_like(self.action_log_probs, dtype=np.float32)
-        self.value_preds = np.zeros_like(self.value_preds, dtype=np.float32)
-        self.returns = np.zeros_like(self.returns, dtype=np.float32)
-        self.rnn_states_actor = np.zeros_like(self.rnn_states_critic)
-        self.rnn_states_critic = np.zeros_like(self.rnn_states_actor)
+        for name in self._fields:
+            getattr(self, name).fill(1 if name in self._mask_fields else 0)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Size in bytes of each data array."""
+        return {name: getattr(self, name).nbytes for name in self._fields}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.memory_usage().values())
 
     def compute_returns(self, next_value: np.ndarray):
         """
         Compute returns either as discounted sum of rewards, or using GAE.
 
+        NOTE: terms independent of the recursion (td deltas, discounts and bootstrap values) are computed for all
+        steps at once, and the backward recursion runs in-place ufuncs on each step, with the same float32 results
+        as a step-by-step computation. The recursion itself still loops over steps in Python, one multiply-add per
+        step, so the discounted sum of rewards, which only hoists `gamma * masks`, gains less than GAE.
+
         Args:
             next_value(np.ndarray): value predictions for the step after the last episode step.
         """
-        if self.use_proper_time_limits:
-            if self.use_gae:
-                self.value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.rewards.shape[0])):
-                    td_delta = self.rewards[step] + self.gamma * self.value_preds[step + 1] * self.masks[step + 1] - self.value_preds[step]
-                    gae = td_delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                    gae = gae * self.bad_masks[step + 1]
-                    self.returns[step] = gae + self.value_preds[step]
-            else:
-                self.returns[-1] = next_value
-                for step in reversed(range(self.rewards.shape[0])):
-                    self.returns[step] = (self.returns[step + 1] * self.gamma * self.masks[step + 1] + self.rewards[step]) \
-                        * self.bad_masks[step + 1] + (1 - self.bad_masks[step + 1]) * self.value_preds[step]
+        # per-step row views, indexed once
+        returns, rewards = list(self.returns), list(self.rewards)
+        bad_masks = list(self.bad_masks[1:])
+        if self.use_gae:
+            self.value_preds[-1] = next_value
+            # returns[:-1] hold gae until values are added
+            td_deltas = list(self.rewards + self.gamma * self.value_preds[1:] * self.masks[1:] - self.value_preds[:-1])
+            discounts = list(self.gamma * self.gae_lambda * self.masks[1:])
+            gae = np.zeros_like(returns[0])
+            for step in reversed(range(len(rewards))):
+                np.multiply(discounts[step], gae, out=returns[step])
+                np.add(returns[step], td_deltas[step], out=returns[step])
+                if self.use_proper_time_limits:
+                    np.multiply(returns[step], bad_masks[step], out=returns[step])
+                gae = returns[step]
+            self.returns[:-1] += self.value_preds[:-1]
         else:
-            if self.use_gae:
-                self.value_preds[-1] = next_value
-                gae = 0
-                for step in reversed(range(self.rewards.shape[0])):
-                    td_delta = self.rewards[step] + self.gamma * self.value_preds[step + 1] * self.masks[step + 1] - self.value_preds[step]
-                    gae = td_delta + self.gamma * self.gae_lambda * self.masks[step + 1] * gae
-                    self.returns[step] = gae + self.value_preds[step]
-            else:
-                self.returns[-1] = next_value
-                for step in reversed(range(self.rewards.shape[0])):
-                    self.returns[step] = self.returns[step + 1] * self.gamma * self.masks[step + 1] + self.rewards[step]
+            self.returns[-1] = next_value
+            discounts = list(self.gamma * self.masks[1:])
+            if self.use_proper_time_limits:
+                bootstrap_values = list((1 - self.bad_masks[1:]) * self.value_preds[:-1])
+            for step in reversed(range(len(rewards))):
+                # returns[step] = gamma * masks[step + 1] * returns[step + 1] + rewards[step], in place
+                np.multiply(discounts[step], returns[step + 1], out=returns[step])
+                np.add(returns[step], rewards[step], out=returns[step])
+                if self.use_proper_time_limits:
+                    np.multiply(returns[step], bad_masks[step], out=returns[step])
+                    np.add(returns[step], bootstrap_values[step], out=returns[step])
 
     @staticmethod
-    def recurrent_generator(buffer: Union[Buffer, List[Buffer]], num_mini_batch: int, data_chunk_length: int):
+    def recurrent_generator(buffer: Union[Buffer, List[Buffer]], num_mini_batch: int, data_chunk_length: int,
+                            rank=0, world_size=1):
         """
         A recurrent generator that yields training data for chunked RNN training arranged in mini batches.
         This generator shuffles the data by sequences.
@@ -175,6 +241,9 @@ class ReplayBuffer(Buffer):
             buffers (Buffer or List[Buffer])
             num_mini_batch (int): number of minibatches to split the batch into.
             data_chunk_length (int): length of sequence chunks with which to train RNN.
+            rank (int): rank of current learner process, for data-parallel training.
+            world_size (int): number of learner processes. If larger than 1, all of them must call the generator
+                together, and each one gets its shard of every minibatch.
 
         Returns:
             (obs_batch, actions_batch, masks_batch, old_action_log_probs_batch, advantages_batch, \
@@ -196,78 +265,189 @@ class ReplayBuffer(Buffer):
             "to be greater than or equal to the number of "
             "data chunk length ({}).".format(n_rollout_threads, buffer_size, num_agents, data_chunk_length))
 
-        # Transpose and reshape parallel data into sequential data
-        obs = np.vstack([ReplayBuffer._cast(buf.obs[:-1]) for buf in buffer])
-        actions = np.vstack([ReplayBuffer._cast(buf.actions) for buf in buffer])
-        masks = np.vstack([ReplayBuffer._cast(buf.masks[:-1]) for buf in buffer])
-        old_action_log_probs = np.vstack([ReplayBuffer._cast(buf.action_log_probs) for buf in buffer])
-        advantages = np.vstack([ReplayBuffer._cast(buf.advantages) for buf in buffer])
-        returns = np.vstack([ReplayBuffer._cast(buf.returns[:-1]) for buf in buffer])
-        value_preds = np.vstack([ReplayBuffer._cast(buf.value_preds[:-1]) for buf in buffer])
-        rnn_states_actor = np.vstack([ReplayBuffer._cast(buf.rnn_states_actor[:-1]) for buf in buffer])
-        rnn_states_critic = np.vstack([ReplayBuffer._cast(buf.rnn_states_critic[:-1]) for buf in buffer])
+        # Flat views of the buffers, gathered by chunk index into minibatches
+        sequences, rnn_states = ReplayBuffer._recurrent_data(buffer, [buf.advantages for buf in buffer])
+        index = ReplayBuffer._recurrent_index(len(buffer), buffer[0].buffer_size, n_rollout_threads, num_agents,
+                                              data_chunk_length).to(sequences[0].device)
 
         # Get mini-batch size and shuffle chunk data
         data_chunks = n_rollout_threads * buffer_size // data_chunk_length
         mini_batch_size = data_chunks // num_mini_batch
-        rand = torch.randperm(data_chunks).numpy()
-        sampler = [rand[i * mini_batch_size:(i + 1) * mini_batch_size] for i in range(num_mini_batch)]
+        rand = ReplayBuffer._shuffle(data_chunks, mini_batch_size, world_size).to(index.device)
+        sampler = [rand[i * mini_batch_size:(i + 1) * mini_batch_size].tensor_split(world_size)[rank]
+                   for i in range(num_mini_batch)]
 
         for indices in sampler:
-            obs_batch = []
-            actions_batch = []
-            masks_batch = []
-            old_action_log_probs_batch = []
-            advantages_batch = []
-            returns_batch = []
-            value_preds_batch = []
-            rnn_states_actor_batch = []
-            rnn_states_critic_batch = []
-
-            for index in indices:
-
-                ind = index * data_chunk_length
-                # size [T+1, N, Dim] => [T, N, Dim] => [N, T, Dim] => [N * T, Dim] => [L, Dim]
-                obs_batch.append(obs[ind:ind + data_chunk_length])
-                actions_batch.append(actions[ind:ind + data_chunk_length])
-                masks_batch.append(masks[ind:ind + data_chunk_length])
-                old_action_log_probs_batch.append(old_action_log_probs[ind:ind + data_chunk_length])
-                advantages_batch.append(advantages[ind:ind + data_chunk_length])
-                returns_batch.append(returns[ind:ind + data_chunk_length])
-                value_preds_batch.append(value_preds[ind:ind + data_chunk_length])
-                # size [T+1, N, Dim] => [T, N, Dim] => [N, T, Dim] => [N * T, Dim] => [1, Dim]
-                rnn_states_actor_batch.append(rnn_states_actor[ind])
-                rnn_states_critic_batch.append(rnn_states_critic[ind])
-
-            L, N = data_chunk_length, mini_batch_size
-
-            # These are all from_numpys of size (L, N, Dim)
-            obs_batch = np.stack(obs_batch, axis=1)
-            actions_batch = np.stack(actions_batch, axis=1)
-            masks_batch = np.stack(masks_batch, axis=1)
-            old_action_log_probs_batch = np.stack(old_action_log_probs_batch, axis=1)
-            advantages_batch = np.stack(advantages_batch, axis=1)
-            returns_batch = np.stack(returns_batch, axis=1)
-            value_preds_batch = np.stack(value_preds_batch, axis=1)
-
-            # States is just a (N, -1) from_numpy
-            rnn_states_actor_batch = np.stack(rnn_states_actor_batch).reshape(N, *buffer[0].rnn_states_actor.shape[3:])
-            rnn_states_critic_batch = np.stack(rnn_states_critic_batch).reshape(N, *buffer[0].rnn_states_critic.shape[3:])
-
-            # Flatten the (L, N, ...) from_numpys to (L * N, ...)
-            obs_batch = ReplayBuffer._flatten(L, N, obs_batch)
-            actions_batch = ReplayBuffer._flatten(L, N, actions_batch)
-            masks_batch = ReplayBuffer._flatten(L, N, masks_batch)
-            old_action_log_probs_batch = ReplayBuffer._flatten(L, N, old_action_log_probs_batch)
-            advantages_batch = ReplayBuffer._flatten(L, N, advantages_batch)
-            returns_batch = ReplayBuffer._flatten(L, N, returns_batch)
-            value_preds_batch = ReplayBuffer._flatten(L, N, value_preds_batch)
+            # size (L, N) => (L * N), sequence batches ordered by step then chunk
+            batch_index = index[:, indices].reshape(-1)
+            # chunk start rnn states, size (N, layers, hidden)
+            start_index = buffer[0]._recurrent_state_index(index[0, indices], data_chunk_length)
+            obs_batch, actions_batch, masks_batch, old_action_log_probs_batch, advantages_batch, \
+                returns_batch, value_preds_batch = [x[batch_index] for x in sequences]
+            rnn_states_actor_batch, rnn_states_critic_batch = [x[start_index] for x in rnn_states]
 
             yield obs_batch, actions_batch, masks_batch, old_action_log_probs_batch, advantages_batch, \
                 returns_batch, value_preds_batch, rnn_states_actor_batch, rnn_states_critic_batch
 
+    @staticmethod
+    def _shuffle(data_chunks: int, mini_batch_size: int, world_size=1) -> torch.Tensor:
+        """Random order of chunks, the same on all learner processes if `world_size` > 1."""
+        rand = torch.randperm(data_chunks)
+        if world_size > 1:
+            assert mini_batch_size >= world_size, \
+                f"Mini batch size ({mini_batch_size} chunks) must be at least the number of learners ({world_size})"
+            torch.distributed.broadcast(rand, src=0)
+        return rand
+
+    def _recurrent_fields(self, advantages: np.ndarray) -> List[np.ndarray]:
+        """Per-step data of recurrent minibatches, each of shape (T, n_rollout_threads, num_agents, *dim)."""
+        return [self.obs[:-1], self.actions, self.masks[:-1], self.action_log_probs,
+                advantages, self.returns[:-1], self.value_preds[:-1]]
+
+    def _recurrent_states(self) -> List[np.ndarray]:
+        """Per-step rnn states of recurrent minibatches, only gathered at chunk starts."""
+        return [x.chunks[:-1] if isinstance(x, ChunkRNNStates) else x[:-1]
+                for x in [self.rnn_states_actor, self.rnn_states_critic]]
+
+    def _recurrent_state_index(self, start_index: torch.Tensor, data_chunk_length: int) -> torch.Tensor:
+        """Map chunk start indices into the flattened step data to indices into the flattened `_recurrent_states`."""
+        if not isinstance(self.rnn_states_actor, ChunkRNNStates):
+            return start_index
+        chunk_length = self.rnn_states_actor.chunk_length
+        assert self.buffer_size % data_chunk_length == 0 and data_chunk_length % chunk_length == 0, \
+            f"Buffer size ({self.buffer_size}) and data chunk length ({data_chunk_length}) must be multiples of " \
+            f"the chunk length of stored rnn states ({chunk_length})"
+        # step data are ordered by (buffer, step, thread, agent), chunk start steps are multiples of chunk length
+        n = self.n_rollout_threads * self.num_agents
+        return start_index // (n * chunk_length) * n + start_index % n
+
+    @staticmethod
+    def _recurrent_data(buffer: List["ReplayBuffer"], advantages: List[np.ndarray]):
+        """Flatten the recurrent data of buffers to (num_buffers * T * n_rollout_threads * num_agents, *dim) tensors.
+
+        A single buffer is viewed without copy, multiple buffers are concatenated.
+        """
+        def flatten(arrays):
+            tensors = [torch.as_tensor(x).flatten(0, 2) for x in arrays]
+            return tensors[0] if len(tensors) == 1 else torch.cat(tensors)
+        fields = zip(*[buf._recurrent_fields(adv) for buf, adv in zip(buffer, advantages)])
+        states = zip(*[buf._recurrent_states() for buf in buffer])
+        return [flatten(x) for x in fields], [flatten(x) for x in states]
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _recurrent_index(num_buffers: int, T: int, N: int, M: int, data_chunk_length: int) -> torch.Tensor:
+        """Index of the chunked sequences into the flattened buffers, of shape (data_chunk_length, data_chunks).
+
+        Sequences are ordered by (buffer, thread, agent, step), and split into chunks of `data_chunk_length` steps,
+        while flattened buffers are ordered by (buffer, step, thread, agent).
+        """
+        b, n, m, t = np.meshgrid(np.arange(num_buffers), np.arange(N), np.arange(M), np.arange(T), indexing='ij')
+        index = (((b * T + t) * N + n) * M + m).reshape(-1)
+        # NOTE: only threads * steps (not * agents) are chunked, as in the unbatched generators
+        data_chunks = N * T * num_buffers // data_chunk_length
+        index = index[:data_chunks * data_chunk_length].reshape(data_chunks, data_chunk_length).T
+        return torch.from_numpy(np.ascontiguousarray(index))
+
+
+class TorchReplayBuffer(ReplayBuffer):
+    """ReplayBuffer whose data are preallocated torch tensors on `device`.
+
+    Runners write policy outputs into it in place, without numpy round trips, and trainers gather minibatches
+    from it on `device`. Inserted numpy data are copied into the tensors.
+    """
+    def __init__(self, args, num_agents, obs_space, act_space, device=torch.device("cpu")):
+        assert args.rnn_states_storage == "full", "TorchReplayBuffer only supports full rnn states storage"
+        super().__init__(args, num_agents, obs_space, act_space)
+        self.device = device
+        for name in self._fields:
+            setattr(self, name, torch.from_numpy(getattr(self, name)).to(device))
+
+    def _as_tensor(self, x) -> torch.Tensor:
+        return torch.as_tensor(x, dtype=torch.float32, device=self.device)
+
+    @property
+    def advantages(self) -> torch.Tensor:
+        advantages = self.returns[:-1] - self.value_preds[:-1]
+        return (advantages - advantages.mean()) / (advantages.std(unbiased=False) + 1e-5)
+
+    def insert(self,
+               obs,
+               actions,
+               rewards,
+               masks,
+               action_log_probs,
+               value_preds,
+               rnn_states_actor,
+               rnn_states_critic,
+               bad_masks=None,
+               **kwargs):
+        """Insert numpy or torch data, see `ReplayBuffer.insert`."""
+        self.obs[self.step + 1] = self._as_tensor(obs)
+        self.actions[self.step] = self._as_tensor(actions)
+        self.rewards[self.step] = self._as_tensor(rewards)
+        self.masks[self.step + 1] = self._as_tensor(masks)
+        self.action_log_probs[self.step] = self._as_tensor(action_log_probs)
+        self.value_preds[self.step] = self._as_tensor(value_preds)
+        self.rnn_states_actor[self.step + 1] = self._as_tensor(rnn_states_actor)
+        self.rnn_states_critic[self.step + 1] = self._as_tensor(rnn_states_critic)
+        if bad_masks is not None:
+            self.bad_masks[self.step + 1] = self._as_tensor(bad_masks)
+
+        self.step = (self.step + 1) % self.buffer_size
+
+    def after_update(self):
+        """Copy last timestep data to first index. Called after update to model."""
+        self.obs[0] = self.obs[-1]
+        self.masks[0] = self.masks[-1]
+        self.bad_masks[0] = self.bad_masks[-1]
+        self.rnn_states_actor[0] = self.rnn_states_actor[-1]
+        self.rnn_states_critic[0] = self.rnn_states_critic[-1]
+
+    def clear(self):
+        self.step = 0
+        for name in self._fields:
+            getattr(self, name).fill_(1 if name in self._mask_fields else 0)
+
+    @torch.no_grad()
+    def compute_returns(self, next_value):
+        """
+        Compute returns either as discounted sum of rewards, or using GAE, with the same operations as
+        `ReplayBuffer.compute_returns` on tensors.
+
+        Args:
+            next_value(np.ndarray or torch.Tensor): value predictions for the step after the last episode step.
+        """
+        returns, rewards = list(self.returns), list(self.rewards)
+        bad_masks = list(self.bad_masks[1:])
+        if self.use_gae:
+            self.value_preds[-1] = self._as_tensor(next_value)
+            # returns[:-1] hold gae until values are added
+            td_deltas = list(self.rewards + self.gamma * self.value_preds[1:] * self.masks[1:] - self.value_preds[:-1])
+            discounts = list(self.gamma * self.gae_lambda * self.masks[1:])
+            gae = torch.zeros_like(returns[0])
+            for step in reversed(range(len(rewards))):
+                torch.mul(discounts[step], gae, out=returns[step])
+                returns[step].add_(td_deltas[step])
+                if self.use_proper_time_limits:
+                    returns[step].mul_(bad_masks[step])
+                gae = returns[step]
+            self.returns[:-1] += self.value_preds[:-1]
+        else:
+            self.returns[-1] = self._as_tensor(next_value)
+            discounts = list(self.gamma * self.masks[1:])
+            if self.use_proper_time_limits:
+                bootstrap_values = list((1 - self.bad_masks[1:]) * self.value_preds[:-1])
+            for step in reversed(range(len(rewards))):
+                torch.mul(discounts[step], returns[step + 1], out=returns[step])
+                returns[step].add_(rewards[step])
+                if self.use_proper_time_limits:
+                    returns[step].mul_(bad_masks[step]).add_(bootstrap_values[step])
+
 
 class SharedReplayBuffer(ReplayBuffer):
+    _fields = ReplayBuffer._fields + ["share_obs", "active_masks"]
+    _mask_fields = ReplayBuffer._mask_fields + ["active_masks"]
 
     def __init__(self, args, num_agents, obs_space, share_obs_space, act_space):
         # env config
@@ -303,9 +483,8 @@ class SharedReplayBuffer(ReplayBuffer):
         self.value_preds = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
         self.returns = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents, 1), dtype=np.float32)
         # rnn
-        self.rnn_states_actor = np.zeros((self.buffer_size + 1, self.n_rollout_threads, self.num_agents,
-                                          self.recurrent_hidden_layers, self.recurrent_hidden_size), dtype=np.float32)
-        self.rnn_states_critic = np.zeros_like(self.rnn_states_actor)
+        self.rnn_states_actor = self._rnn_states(args)
+        self.rnn_states_critic = self._rnn_states(args)
 
         self.step = 0
 
@@ -347,7 +526,8 @@ class SharedReplayBuffer(ReplayBuffer):
         self.share_obs[0] = self.share_obs[-1].copy()
         return super().after_update()
 
-    def recurrent_generator(self, advantages: np.ndarray, num_mini_batch: int, data_chunk_length: int):
+    def recurrent_generator(self, advantages: np.ndarray, num_mini_batch: int, data_chunk_length: int,
+                            rank=0, world_size=1):
         """
         A recurrent generator that yields training data for chunked RNN training arranged in mini batches.
         This generator shuffles the data by sequences.
@@ -356,6 +536,8 @@ class SharedReplayBuffer(ReplayBuffer):
             advantages (np.ndarray): advantage estimates.
             num_mini_batch (int): number of minibatches to split the batch into.
             data_chunk_length (int): length of sequence chunks with which to train RNN.
+            rank (int): rank of current learner process, for data-parallel training.
+            world_size (int): number of learner processes (see `ReplayBuffer.recurrent_generator`).
 
         Returns:
             (obs_batch, share_obs_batch, actions_batch, masks_batch, active_masks_batch, \
@@ -367,83 +549,30 @@ class SharedReplayBuffer(ReplayBuffer):
             "to be greater than or equal to the number of data chunk length ({}).".format(
                 self.n_rollout_threads, self.buffer_size, data_chunk_length))
 
-        # Transpose and reshape parallel data into sequential data
-        obs = self._cast(self.obs[:-1])
-        share_obs = self._cast(self.share_obs[:-1])
-        actions = self._cast(self.actions)
-        masks = self._cast(self.masks[:-1])
-        active_masks = self._cast(self.active_masks[:-1])
-        old_action_log_probs = self._cast(self.action_log_probs)
-        advantages = self._cast(advantages)
-        returns = self._cast(self.returns[:-1])
-        value_preds = self._cast(self.value_preds[:-1])
-        rnn_states_actor = self._cast(self.rnn_states_actor[:-1])
-        rnn_states_critic = self._cast(self.rnn_states_critic[:-1])
+        # Flat views of the buffer, gathered by chunk index into minibatches
+        sequences, rnn_states = self._recurrent_data([self], [advantages])
+        index = self._recurrent_index(1, self.buffer_size, self.n_rollout_threads, self.num_agents, data_chunk_length)
 
         # Get mini-batch size and shuffle chunk data
         data_chunks = self.n_rollout_threads * self.buffer_size // data_chunk_length
         mini_batch_size = data_chunks // num_mini_batch
-        rand = torch.randperm(data_chunks).numpy()
-        sampler = [rand[i * mini_batch_size:(i + 1) * mini_batch_size] for i in range(num_mini_batch)]
+        rand = self._shuffle(data_chunks, mini_batch_size, world_size)
+        sampler = [rand[i * mini_batch_size:(i + 1) * mini_batch_size].tensor_split(world_size)[rank]
+                   for i in range(num_mini_batch)]
 
         for indices in sampler:
-            obs_batch = []
-            share_obs_batch = []
-            actions_batch = []
-            masks_batch = []
-            active_masks_batch = []
-            old_action_log_probs_batch = []
-            advantages_batch = []
-            returns_batch = []
-            value_preds_batch = []
-            rnn_states_actor_batch = []
-            rnn_states_critic_batch = []
-
-            for index in indices:
-
-                ind = index * data_chunk_length
-                # size [T+1, N, M, Dim] => [T, N, M, Dim] => [N, M, T, Dim] => [N * M * T, Dim] => [L, Dim]
-                obs_batch.append(obs[ind:ind + data_chunk_length])
-                share_obs_batch.append(share_obs[ind:ind + data_chunk_length])
-                actions_batch.append(actions[ind:ind + data_chunk_length])
-                masks_batch.append(masks[ind:ind + data_chunk_length])
-                active_masks_batch.append(active_masks[ind:ind + data_chunk_length])
-                old_action_log_probs_batch.append(old_action_log_probs[ind:ind + data_chunk_length])
-                advantages_batch.append(advantages[ind:ind + data_chunk_length])
-                returns_batch.append(returns[ind:ind + data_chunk_length])
-                value_preds_batch.append(value_preds[ind:ind + data_chunk_length])
-                # size [T+1, N, M, Dim] => [T, N, M, Dim] => [N, M, T, Dim] => [N * M * T, Dim] => [1, Dim]
-                rnn_states_actor_batch.append(rnn_states_actor[ind])
-                rnn_states_critic_batch.append(rnn_states_critic[ind])
-
-            L, N = data_chunk_length, mini_batch_size
-
-            # These are all from_numpys of size (L, N, Dim)
-            obs_batch = np.stack(obs_batch, axis=1)
-            share_obs_batch = np.stack(share_obs_batch, axis=1)
-            actions_batch = np.stack(actions_batch, axis=1)
-            masks_batch = np.stack(masks_batch, axis=1)
-            active_masks_batch = np.stack(active_masks_batch, axis=1)
-            old_action_log_probs_batch = np.stack(old_action_log_probs_batch, axis=1)
-            advantages_batch = np.stack(advantages_batch, axis=1)
-            returns_batch = np.stack(returns_batch, axis=1)
-            value_preds_batch = np.stack(value_preds_batch, axis=1)
-
-            # States is just a (N, -1) from_numpy
-            rnn_states_actor_batch = np.stack(rnn_states_actor_batch).reshape(N, *self.rnn_states_actor.shape[3:])
-            rnn_states_critic_batch = np.stack(rnn_states_critic_batch).reshape(N, *self.rnn_states_critic.shape[3:])
-
-            # Flatten the (L, N, ...) from_numpys to (L * N, ...)
-            obs_batch = self._flatten(L, N, obs_batch)
-            share_obs_batch = self._flatten(L, N, share_obs_batch)
-            actions_batch = self._flatten(L, N, actions_batch)
-            masks_batch = self._flatten(L, N, masks_batch)
-            active_masks_batch = self._flatten(L, N, active_masks_batch)
-            old_action_log_probs_batch = self._flatten(L, N, old_action_log_probs_batch)
-            advantages_batch = self._flatten(L, N, advantages_batch)
-            returns_batch = self._flatten(L, N, returns_batch)
-            value_preds_batch = self._flatten(L, N, value_preds_batch)
+            # size (L, N) => (L * N), sequence batches ordered by step then chunk
+            batch_index = index[:, indices].reshape(-1)
+            # chunk start rnn states, size (N, layers, hidden)
+            start_index = self._recurrent_state_index(index[0, indices], data_chunk_length)
+            obs_batch, share_obs_batch, actions_batch, masks_batch, active_masks_batch, old_action_log_probs_batch, \
+                advantages_batch, returns_batch, value_preds_batch = [x[batch_index] for x in sequences]
+            rnn_states_actor_batch, rnn_states_critic_batch = [x[start_index] for x in rnn_states]
 
             yield obs_batch, share_obs_batch, actions_batch, masks_batch, active_masks_batch, \
                 old_action_log_probs_batch, advantages_batch, returns_batch, value_preds_batch, \
                 rnn_states_actor_batch, rnn_states_critic_batch
+
+    def _recurrent_fields(self, advantages: np.ndarray) -> List[np.ndarray]:
+        return [self.obs[:-1], self.share_obs[:-1], self.actions, self.masks[:-1], self.active_masks[:-1],
+                self.action_log_probs, advantages, self.returns[:-1], self.value_preds[:-1]]
@@ -1,10 +1,12 @@
 import copy
 import math
+from typing import Dict, Iterable
 
 import gym as gym
 import numpy as np
 import torch
 import torch.nn as nn
+import torch.distributed
 
 
 def check(input):
@@ -36,6 +38,30 @@ def get_gard_norm(it):
     return math.sqrt(sum_grad)
 
 
+def all_reduce_gradients(parameters: Iterable[nn.Parameter], weight: float = 1.):
+    """Average gradients over all processes of the default process group, weighted by `weight` of each process
+    (e.g. its number of samples), in a single all-reduce like DistributedDataParallel.
+    Missing gradients count as zeros."""
+    params = [p for p in parameters if p.requires_grad]
+    for p in params:
+        if p.grad is None:
+            p.grad = torch.zeros_like(p)
+    grads = [p.grad for p in params]
+    flat = torch._utils._flatten_dense_tensors(grads + [torch.ones(1, dtype=grads[0].dtype)]) * weight
+    torch.distributed.all_reduce(flat)
+    flat = flat[:-1] / flat[-1]
+    for grad, reduced in zip(grads, torch._utils._unflatten_dense_tensors(flat, grads)):
+        grad.copy_(reduced)
+
+
+def all_reduce_mean(infos: Dict[str, float]) -> Dict[str, float]:
+    """Average scalar infos (e.g. losses) over all processes of the default process group."""
+    values = torch.tensor([float(v) for v in infos.values()], dtype=torch.float64)
+    torch.distributed.all_reduce(values)
+    values /= torch.distributed.get_world_size()
+    return dict(zip(infos.keys(), values.tolist()))
+
+
 def init(module: nn.Module, weight_init, bias_init, gain=1):
     weight_init(module.weight.data, gain=gain)
     bias_init(module.bias.data)
@@ -1,3 +1,4 @@
+import os
 import argparse
 from tokenize import group
 
@@ -40,6 +41,22 @@ def _get_prepare_config(parser: argparse.ArgumentParser):
             number of training threads working in parallel. by default 1
         --n-rollout-threads <int>
             number of parallel envs for training rollout. by default 4
+        --use-shared-memory
+            by default False, if set, parallel envs exchange observations/actions through shared memory instead of pipes.
+        --async-batch-size <int>
+            by default None. if set, training rollout only waits for the first `async-batch-size` ready envs at each step.
+        --autotune-vec-env
+            by default False, if set, number of processes and envs run in series by each of them are tuned at startup.
+        --vec-env-context <str>
+            multiprocessing start method of parallel envs, including `["fork", "spawn", "forkserver"]`. by default platform default.
+        --remote-env-addresses <str ...>
+            by default None. if set, training rollout envs run in remote env workers at these `host:port` addresses.
+        --remote-env-authkey <str>
+            secret shared with remote env workers. by default the REMOTE_ENV_AUTHKEY environment variable.
+        --use-lowlevel-server
+            by default False, if set, low-level policies of hierarchical tasks in all parallel envs run in one shared inference server.
+        --baseline-backend <str>
+            backend of baseline actors and low-level policies in envs, including `["torch", "torchscript", "numpy"]`. by default "torch".
         --n-render-rollout-threads <int>
             number of parallel envs for rendering, could only be set as 1 for some environments.
         --num-env-steps <float>
@@ -70,6 +87,28 @@ def _get_prepare_config(parser: argparse.ArgumentParser):
     # ADDED
     group.add_argument("--n-rollout-threads", type=int, default=1, # default=4
                        help="Number of parallel envs for training/evaluating rollout (default 4)")
+    group.add_argument("--use-shared-memory", action='store_true', default=False,
+                       help="By default False, if set, parallel envs exchange data through shared memory instead of pipes.")
+    group.add_argument("--async-batch-size", type=int, default=None,
+                       help="By default None. If set, training rollout only waits for the first `async-batch-size` ready envs at each step.")
+    group.add_argument("--autotune-vec-env", action='store_true', default=False,
+                       help="By default False, if set, number of processes and envs run in series by each of them are tuned at startup.")
+    group.add_argument("--vec-env-context", type=str, default=None, choices=["fork", "spawn", "forkserver"],
+                       help="Multiprocessing start method of parallel envs (default: platform default). "
+                            "'forkserver' imports heavy modules once for all workers.")
+    group.add_argument("--remote-env-addresses", type=str, nargs='+', default=None,
+                       help="By default None. If set, training rollout envs run in remote env workers listening at "
+                            "these `host:port` addresses (see scripts/train/remote_env_worker.py), "
+                            "`n-rollout-threads` must be their total number of envs.")
+    group.add_argument("--remote-env-authkey", type=str, default=os.environ.get("REMOTE_ENV_AUTHKEY"),
+                       help="Secret shared with remote env workers, which authenticate each other with it "
+                            "(default: REMOTE_ENV_AUTHKEY environment variable, which keeps it out of process lists).")
+    group.add_argument("--use-lowlevel-server", action='store_true', default=False,
+                       help="By default False, if set, low-level policies of hierarchical tasks in all parallel envs "
+                            "run in one shared inference server, which batches their requests.")
+    group.add_argument("--baseline-backend", type=str, default="torch", choices=["torch", "torchscript", "numpy"],
+                       help="By default 'torch', backend of baseline actors and low-level policies in envs. "
+                            "'numpy' runs them without importing torch in env workers.")
     group.add_argument("--num-env-steps", type=float, default=1e7,
                        help='Number of environment steps to train (default: 1e7)')
     group.add_argument("--model-dir", type=str, default=None,
@@ -96,6 +135,12 @@ def _get_replaybuffer_config(parser: argparse.ArgumentParser):
             by default, use generalized advantage estimation. If set, do not use gae.
         --gae-lambda <float>
             gae lambda parameter (default: 0.95)
+        --use-torch-buffer
+            by default False, if set, store rollouts in preallocated torch tensors on the training device.
+        --rnn-states-storage <str>
+            by default 'full', store rnn states of every step. 'chunk' only stores those of data chunk starts.
+        --rnn-states-dtype <str>
+            by default 'float32', dtype of stored rnn states, 'float16' halves their memory.
     """
     group = parser.add_argument_group("Replay Buffer parameters")
     group.add_argument("--gamma", type=float, default=0.99,
@@ -108,6 +153,16 @@ def _get_replaybuffer_config(parser: argparse.ArgumentParser):
                        help='Whether to use generalized advantage estimation')
     group.add_argument("--gae-lambda", type=float, default=0.95,
                        help='gae lambda parameter (default: 0.95)')
+    group.add_argument("--use-torch-buffer", action='store_true', default=False,
+                       help="By default False, if set, store rollouts in preallocated torch tensors on the training device, "
+                            "so that policy outputs are never copied back to numpy (JSBSimRunner only).")
+    group.add_argument("--rnn-states-storage", type=str, default='full', choices=['full', 'chunk'],
+                       help="By default 'full', store rnn states of every step. If 'chunk', only store rnn states at "
+                            "data chunk starts, which training consumes, and the latest step of each thread, "
+                            "which rollouts consume. Buffer size must be a multiple of --data-chunk-length.")
+    group.add_argument("--rnn-states-dtype", type=str, default='float32', choices=['float32', 'float16'],
+                       help="By default 'float32'. If 'float16', store rnn states in half precision, training then "
+                            "starts chunks from rounded states (and so do rollouts with 'full' storage).")
     return parser
 
 
@@ -196,6 +251,16 @@ def _get_ppo_config(parser: argparse.ArgumentParser):
             by default, use max norm of gradients. If set, do not use.
         --max-grad-norm <float>
             max norm of gradients (default: 0.5)
+        --use-torch-compile
+            by default False. If set, compile the ppo loss computation with torch.compile.
+        --use-bf16-autocast
+            by default False. If set, run the forward pass of ppo updates in bfloat16 autocast.
+        --use-fused-optimizer
+            by default False. If set, use fused Adam steps.
+        --use-async-learner
+            by default False. If set, train in a learner process while envs keep collecting the next batch.
+        --num-learners <int>
+            number of data-parallel learner processes of ppo updates (torch.distributed, gloo). by default 1
     """
     group = parser.add_argument_group("PPO parameters")
     group.add_argument("--ppo-epoch", type=int, default=10,
@@ -214,6 +279,22 @@ def _get_ppo_config(parser: argparse.ArgumentParser):
                        help="By default, use max norm of gradients. If set, do not use.")
     group.add_argument("--max-grad-norm", type=float, default=2,
                        help='max norm of gradients (default: 2)')
+    group.add_argument("--use-torch-compile", action='store_true', default=False,
+                       help="By default False. If set, compile the ppo loss computation (forward pass and losses) "
+                            "with torch.compile, the first updates are slower while compiling.")
+    group.add_argument("--use-bf16-autocast", action='store_true', default=False,
+                       help="By default False. If set, run the forward pass of ppo updates in bfloat16 autocast, "
+                            "losses are still computed in float32.")
+    group.add_argument("--use-fused-optimizer", action='store_true', default=False,
+                       help="By default False. If set, use fused Adam steps.")
+    group.add_argument("--use-async-learner", action='store_true', default=False,
+                       help="By default False. If set, ppo updates run in a learner process on the previous batch "
+                            "while envs keep collecting the next one with the latest published (one update stale at "
+                            "most) policy weights. Policy staleness is logged.")
+    group.add_argument("--num-learners", type=int, default=1,
+                       help="Number of data-parallel learner processes of ppo updates (default 1). If larger than 1, "
+                            "each learner trains on a shard of every minibatch on CPU, and gradients are all-reduced "
+                            "with torch.distributed (gloo).")
     return parser
 
 
@@ -228,6 +309,8 @@ def _get_selfplay_config(parser: argparse.ArgumentParser):
             number of different opponents chosen for rollout. (default 1)
         --init-elo <float>
             initial ELO for policy performance. (default 1000.0)
+        --policy-pool-mib <float>
+            memory budget of opponent weights cached in RAM, in MiB. (default 1024)
     """
     group = parser.add_argument_group("Selfplay parameters")
     group.add_argument("--use-selfplay", action='store_true', default=False,
@@ -238,6 +321,9 @@ def _get_selfplay_config(parser: argparse.ArgumentParser):
                        help="number of different opponents chosen for rollout. (default 1)")
     group.add_argument('--init-elo', type=float, default=1000.0,
                        help="initial ELO for policy performance. (default 1000.0)")
+    group.add_argument('--policy-pool-mib', type=float, default=1024,
+                       help="memory budget of opponent weights cached in RAM, in MiB, the least frequently and "
+                            "recently chosen ones are evicted and loaded again from checkpoints when chosen. (default 1024)")
     return parser
 
 
@@ -1,5 +1,6 @@
 import re
 import math
+import numpy as np
 from enum import Enum
 from collections import namedtuple
 from numpy.linalg import norm
@@ -525,6 +526,69 @@ class ExtraCatalog(Property, Enum):
     heading_check_time = Property("heading_check_time", "time to check whether current time reaches heading time", 0, 1000000)
 
 
+# ExtraCatalog properties which are a unit conversion of a JSBSim property: name -> (source name, scale)
+UNIT_CONVERSIONS = {
+    ExtraCatalog.position_h_sl_m.name_jsbsim: (JsbsimCatalog.position_h_sl_ft.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_v_north_mps.name_jsbsim: (JsbsimCatalog.velocities_v_north_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_v_east_mps.name_jsbsim: (JsbsimCatalog.velocities_v_east_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_v_down_mps.name_jsbsim: (JsbsimCatalog.velocities_v_down_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_vc_mps.name_jsbsim: (JsbsimCatalog.velocities_vc_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_u_mps.name_jsbsim: (JsbsimCatalog.velocities_u_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_v_mps.name_jsbsim: (JsbsimCatalog.velocities_v_fps.name_jsbsim, 0.3048),
+    ExtraCatalog.velocities_w_mps.name_jsbsim: (JsbsimCatalog.velocities_w_fps.name_jsbsim, 0.3048),
+}
+
+
+class PropertyReadPlan:
+    """
+    A compiled reader for a fixed list of properties, returning all their values as one array.
+
+    Unit-converted properties are read from their JSBSim source and scaled/clipped in a single
+    vectorized pass instead of running their update function (which writes the value back
+    into JSBSim). Other read-only properties still run their update function before reading.
+    """
+
+    def __init__(self, props):
+        self.props = tuple(props)
+        self.names = []
+        self.updates = []
+        scales, lows, highs = [], [], []
+        for prop in self.props:
+            if not isinstance(prop, Property):
+                raise ValueError(f"prop type unhandled: {type(prop)} ({prop})")
+            if prop.name_jsbsim in UNIT_CONVERSIONS:
+                name_jsbsim, scale = UNIT_CONVERSIONS[prop.name_jsbsim]
+                low, high = prop.min, prop.max
+            else:
+                if prop.access == "R" and prop.update:
+                    self.updates.append(prop.update)
+                name_jsbsim, scale = prop.name_jsbsim, 1.0
+                low, high = float("-inf"), float("+inf")
+            self.names.append(name_jsbsim)
+            scales.append(scale)
+            lows.append(low)
+            highs.append(high)
+        self.scales = np.array(scales)
+        self.lows = np.array(lows)
+        self.highs = np.array(highs)
+
+    def read(self, sim):
+        """Read the values of the planned properties from an AircraftSimulator
+
+        Args:
+            sim (AircraftSimulator): simulator to read from
+
+        Returns:
+            (np.ndarray): property values, in the order of `props`
+        """
+        for update in self.updates:
+            update(sim)
+        get_property_value = sim.jsbsim_exec.get_property_value
+        values = np.array([get_property_value(name) for name in self.names])
+        values *= self.scales
+        return np.clip(values, self.lows, self.highs, out=values)
+
+
 class MixedCatalog(dict):
     """
     A class to store both jsbsim & extra properties initiated and used during jsbsim simulation.
@@ -1,13 +1,12 @@
 import os
 import logging
 import numpy as np
-from collections import deque
 from abc import ABC, abstractmethod
-from typing import Literal, Union, List
+from typing import Literal, Union, List, Dict
 
 import jsbsim
-from .catalog import Property, Catalog
-from ..utils.utils import get_root_dir, LLA2NEU, NEU2LLA
+from .catalog import Property, Catalog, ExtraCatalog, PropertyReadPlan
+from ..utils.utils import get_root_dir, get_neu_converter
 
 TeamColors = Literal["Red", "Blue", "Green", "Violet", "Orange"]
 
@@ -94,13 +93,39 @@ class AircraftSimulator(BaseSimulator):
     CRASH = 1       # low altitude / extreme state / overload
     SHOTDOWN = 2    # missile attack
 
+    # (state property, initial condition property) pairs used to re-initialize the FDM state vector
+    STATE_IC_PROPS = [
+        ("position/lat-geod-rad", "ic/lat-geod-rad"),
+        ("position/long-gc-rad", "ic/long-gc-rad"),
+        ("position/h-sl-ft", "ic/h-sl-ft"),
+        ("attitude/phi-rad", "ic/phi-rad"),
+        ("attitude/theta-rad", "ic/theta-rad"),
+        ("attitude/psi-rad", "ic/psi-true-rad"),
+        ("velocities/u-fps", "ic/u-fps"),
+        ("velocities/v-fps", "ic/v-fps"),
+        ("velocities/w-fps", "ic/w-fps"),
+        ("velocities/p-rad_sec", "ic/p-rad_sec"),
+        ("velocities/q-rad_sec", "ic/q-rad_sec"),
+        ("velocities/r-rad_sec", "ic/r-rad_sec"),
+    ]
+    # compiled read plans shared by all aircraft, keyed by tuple of properties
+    _read_plans = {}  # type: Dict[tuple, PropertyReadPlan]
+    # writable properties which are commands/triggers rather than state, never restored
+    STATE_SKIP_PROPS = {
+        "propulsion/refuel",
+        "propulsion/fuel_dump",
+        "propulsion/total-fuel-lbs",
+        "propulsion/total-oxidizer-lbs",
+    }
+
     def __init__(self,
                  uid: str = "A0100",
                  color: TeamColors = "Red",
                  model: str = 'f16',
                  init_state: dict = {},
                  origin: tuple = (120.0, 60.0, 0.0),
-                 sim_freq: int = 60, **kwargs):
+                 sim_freq: int = 60,
+                 warm_reset: bool = False, **kwargs):
         """Constructor. Creates an instance of JSBSim, loads an aircraft and sets initial conditions.
 
         Args:
@@ -111,9 +136,15 @@ class AircraftSimulator(BaseSimulator):
             init_state (dict): dict mapping properties to their initial values. Input empty dict to use a default set of initial props.
             origin (tuple): origin point (longitude, latitude, altitude) of the Global Combat Field. Default = `(120.0, 60.0, 0.0)`
             sim_freq (int): JSBSim integration frequency. Default = `60`.
+            warm_reset (bool): reuse the loaded JSBSim FDM across reloads instead of rebuilding it. Default = `False`.
         """
         super().__init__(uid, color, 1 / sim_freq)
         self.model = model
+        self.warm_reset = warm_reset
+        self.jsbsim_exec = None
+        self._value_cache = {}   # type: Dict[Property, float]
+        self._values_cache = {}  # type: Dict[tuple, np.ndarray]
+        self._reset_defaults = {}  # type: Dict[str, float]
         self.init_state = init_state
         self.lon0, self.lat0, self.alt0 = origin
         self.bloods = 100
@@ -162,11 +193,18 @@ class AircraftSimulator(BaseSimulator):
         self.num_left_missiles = self.num_missiles
 
         # load JSBSim FDM
-        self.jsbsim_exec = jsbsim.FGFDMExec(os.path.join(get_root_dir(), 'data'))
-        self.jsbsim_exec.set_debug_level(0)
-        self.jsbsim_exec.load_model(self.model)
-        Catalog.add_jsbsim_props(self.jsbsim_exec.query_property_catalog(""))
-        self.jsbsim_exec.set_dt(self.dt)
+        warm = self.warm_reset and self.jsbsim_exec is not None
+        if warm:
+            self._restore_reset_defaults()
+        else:
+            self.jsbsim_exec = jsbsim.FGFDMExec(os.path.join(get_root_dir(), 'data'))
+            self.jsbsim_exec.set_debug_level(0)
+            self.jsbsim_exec.load_model(self.model)
+            jsbsim_props = self.jsbsim_exec.query_property_catalog("")
+            Catalog.add_jsbsim_props(jsbsim_props)
+            self.jsbsim_exec.set_dt(self.dt)
+            if self.warm_reset:
+                self._record_reset_defaults(jsbsim_props)
         self.clear_defalut_condition()
 
         # assign new properties
@@ -176,9 +214,13 @@ class AircraftSimulator(BaseSimulator):
             self.lon0, self.lat0, self.alt0 = new_origin
         for key, value in self.init_state.items():
             self.set_property_value(Catalog[key], value)
-        success = self.jsbsim_exec.run_ic()
-        if not success:
-            raise RuntimeError("JSBSim failed to init simulation conditions.")
+        if warm:
+            # re-initialize all models (sim-time, integrators, FCS) and run ic in place
+            self.jsbsim_exec.reset_to_initial_conditions(0)
+        else:
+            success = self.jsbsim_exec.run_ic()
+            if not success:
+                raise RuntimeError("JSBSim failed to init simulation conditions.")
 
         # propulsion init running
         propulsion = self.jsbsim_exec.get_propulsion()
@@ -187,8 +229,101 @@ class AircraftSimulator(BaseSimulator):
             propulsion.get_engine(j).init_running()
         propulsion.get_steady_state()
         # update inner property
+        self._clear_state_cache()
         self._update_properties()
 
+    def save_state(self) -> dict:
+        """Capture the simulator state, so that it can be restored later by `restore_state`.
+
+        The snapshot contains the FDM state vector, the writable flight-control and propulsion
+        properties (actuators, engines, fuel), the custom properties, the cached
+        position/posture/velocity arrays and the aircraft bookkeeping (bloods, status, missiles).
+
+        Returns:
+            (dict): simulator state
+        """
+        if self.jsbsim_exec is None:
+            raise RuntimeError("JSBSim FDM has been closed.")
+        properties = {}
+        for prop in self.jsbsim_exec.query_property_catalog(""):
+            if prop.strip() == "":
+                continue
+            name, access = prop.split(" ")
+            if name.startswith(("fcs/", "propulsion/")) and "W" in access and name not in self.STATE_SKIP_PROPS:
+                properties[name] = self.jsbsim_exec.get_property_value(name)
+        for prop in ExtraCatalog:
+            properties[prop.name_jsbsim] = self.jsbsim_exec.get_property_value(prop.name_jsbsim)
+        return {
+            "sim_time": self.jsbsim_exec.get_sim_time(),
+            "state_vector": [self.jsbsim_exec.get_property_value(name) for name, _ in self.STATE_IC_PROPS],
+            "properties": properties,
+            "geodetic": self._geodetic.copy(),
+            "position": self._position.copy(),
+            "posture": self._posture.copy(),
+            "velocity": self._velocity.copy(),
+            "origin": (self.lon0, self.lat0, self.alt0),
+            "bloods": self.bloods,
+            "status": self.__status,
+            "num_left_missiles": self.num_left_missiles,
+            "launch_missiles": list(self.launch_missiles),
+            "under_missiles": list(self.under_missiles),
+        }
+
+    def restore_state(self, state: dict):
+        """Restore the simulator to a state captured by `save_state`.
+
+        The FDM is re-initialized from the saved state vector in place (no model reloading),
+        so the integrator history is restarted and restored trajectories match the original
+        ones up to integration error.
+
+        Args:
+            state (dict): simulator state returned by `save_state`
+        """
+        if self.jsbsim_exec is None:
+            raise RuntimeError("JSBSim FDM has been closed.")
+        for name, value in state["properties"].items():
+            self.jsbsim_exec.set_property_value(name, value)
+        for (_, ic_name), value in zip(self.STATE_IC_PROPS, state["state_vector"]):
+            self.jsbsim_exec.set_property_value(ic_name, value)
+        success = self.jsbsim_exec.run_ic()
+        if not success:
+            raise RuntimeError("JSBSim failed to init simulation conditions.")
+        self.jsbsim_exec.set_sim_time(state["sim_time"])
+        # run_ic re-evaluates actuators and engines with dt=0, write their saved values back
+        for name, value in state["properties"].items():
+            self.jsbsim_exec.set_property_value(name, value)
+        self._clear_state_cache()
+        self._geodetic[:] = state["geodetic"]
+        self._position[:] = state["position"]
+        self._posture[:] = state["posture"]
+        self._velocity[:] = state["velocity"]
+        self.lon0, self.lat0, self.alt0 = state["origin"]
+        self.bloods = state["bloods"]
+        self.__status = state["status"]
+        self.num_left_missiles = state["num_left_missiles"]
+        self.launch_missiles[:] = state["launch_missiles"]
+        self.under_missiles[:] = state["under_missiles"]
+
+    def _record_reset_defaults(self, jsbsim_props: List[str]):
+        """Record the values that a freshly loaded FDM holds for the properties an episode can modify
+        but `reset_to_initial_conditions` does not re-initialize, i.e. writable flight-control
+        properties and the custom properties created by tasks (target_*, heading_check_time, ...).
+        """
+        self._reset_defaults = {}
+        for prop in jsbsim_props:
+            if prop.strip() == "":
+                continue
+            name, access = prop.split(" ")
+            if name.startswith("fcs/") and "W" in access:
+                self._reset_defaults[name] = self.jsbsim_exec.get_property_value(name)
+        for prop in ExtraCatalog:
+            if prop.name_jsbsim not in self._reset_defaults:
+                self._reset_defaults[prop.name_jsbsim] = 0.0
+
+    def _restore_reset_defaults(self):
+        for name, value in self._reset_defaults.items():
+            self.jsbsim_exec.set_property_value(name, value)
+
     def clear_defalut_condition(self):
         default_condition = {
             Catalog.ic_long_gc_deg: 120.0,  # geodesic longitude [deg]
@@ -223,6 +358,7 @@ class AircraftSimulator(BaseSimulator):
             result = self.jsbsim_exec.run()
             if not result:
                 raise RuntimeError("JSBSim failed.")
+            self._clear_state_cache()
             self._update_properties()
             return result
         else:
@@ -242,7 +378,7 @@ class AircraftSimulator(BaseSimulator):
             Catalog.position_lat_geod_deg,
             Catalog.position_h_sl_m
         ])
-        self._position[:] = LLA2NEU(*self._geodetic, self.lon0, self.lat0, self.alt0)
+        self._position[:] = get_neu_converter(self.lon0, self.lat0, self.alt0).lla2neu(self._geodetic)
         # update posture
         self._posture[:] = self.get_property_values([
             Catalog.attitude_roll_rad,
@@ -256,6 +392,11 @@ class AircraftSimulator(BaseSimulator):
             Catalog.velocities_v_down_mps,
         ])
 
+    def _clear_state_cache(self):
+        """Drop the property values cached since the last simulation step."""
+        self._value_cache.clear()
+        self._values_cache.clear()
+
     def get_sim_time(self):
         """ Gets the simulation time from JSBSim, a float. """
         return self.jsbsim_exec.get_sim_time()
@@ -265,9 +406,16 @@ class AircraftSimulator(BaseSimulator):
 
         :param props: list of Properties
 
-        : return: NamedTupl e with properties name and their values
+        :return: np.ndarray of property values, read through a cached `PropertyReadPlan`
         """
-        return [self.get_property_value(prop) for prop in props]
+        key = tuple(props)
+        values = self._values_cache.get(key)
+        if values is None:
+            plan = AircraftSimulator._read_plans.get(key)
+            if plan is None:
+                plan = AircraftSimulator._read_plans[key] = PropertyReadPlan(key)
+            values = self._values_cache[key] = plan.read(self)
+        return values.copy()
 
     def set_property_values(self, props, values):
         """Set the values of the specified properties
@@ -289,10 +437,13 @@ class AircraftSimulator(BaseSimulator):
         :return : float
         """
         if isinstance(prop, Property):
-            if prop.access == "R":
-                if prop.update:
-                    prop.update(self)
-            return self.jsbsim_exec.get_property_value(prop.name_jsbsim)
+            value = self._value_cache.get(prop)
+            if value is None:
+                if prop.access == "R":
+                    if prop.update:
+                        prop.update(self)
+                value = self._value_cache[prop] = self.jsbsim_exec.get_property_value(prop.name_jsbsim)
+            return value
         else:
             raise ValueError(f"prop type unhandled: {type(prop)} ({prop})")
 
@@ -315,6 +466,8 @@ class AircraftSimulator(BaseSimulator):
             if "W" in prop.access:
                 if prop.update:
                     prop.update(self)
+                # writable properties are inputs of the derived ones, drop values read in this step
+                self._clear_state_cache()
         else:
             raise ValueError(f"prop type unhandled: {type(prop)} ({prop})")
 
@@ -325,13 +478,69 @@ class AircraftSimulator(BaseSimulator):
         return None
 
 
+class _MissileField:
+    """Per-missile attribute stored in the missile's `MissileBatch` slot.
+
+    Vector fields return a view of the slot row, scalar fields return python scalars.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, missile, owner=None):
+        if missile is None:
+            return self
+        array = getattr(missile._batch, self.name)
+        return array[missile._slot] if array.ndim > 1 else array.item(missile._slot)
+
+    def __set__(self, missile, value):
+        getattr(missile._batch, self.name)[missile._slot] = value
+
+
 class MissileSimulator(BaseSimulator):
+    """Single missile, a thin view of one slot of a `MissileBatch`.
+
+    All of the missile state lives in the structure-of-arrays storage of its batch; a missile
+    created on its own has a private batch of size one, and moves into an environment's batch
+    once it is added to an environment.
+    """
 
     INACTIVE = -1
     LAUNCHED = 0
     HIT = 1
     MISS = 2
 
+    _geodetic = _MissileField("geodetic")
+    _position = _MissileField("position")
+    _posture = _MissileField("posture")
+    _velocity = _MissileField("velocity")
+    _dt = _MissileField("dt")
+    lon0 = _MissileField("lon0")
+    lat0 = _MissileField("lat0")
+    alt0 = _MissileField("alt0")
+    _status = _MissileField("status")
+    _t = _MissileField("t")
+    _m = _MissileField("m")
+    _dtheta = _MissileField("dtheta")
+    _dphi = _MissileField("dphi")
+    _distance_pre = _MissileField("distance_pre")
+    _num_increments = _MissileField("num_increments")
+    _max_increments = _MissileField("max_increments")
+    _left_t = _MissileField("left_t")
+    _g = _MissileField("g")
+    _t_max = _MissileField("t_max")
+    _t_thrust = _MissileField("t_thrust")
+    _Isp = _MissileField("Isp")
+    _Length = _MissileField("Length")
+    _Diameter = _MissileField("Diameter")
+    _cD = _MissileField("cD")
+    _m0 = _MissileField("m0")
+    _dm = _MissileField("dm")
+    _K = _MissileField("K")
+    _nyz_max = _MissileField("nyz_max")
+    _Rc = _MissileField("Rc")
+    _v_min = _MissileField("v_min")
+
     @classmethod
     def create(cls, parent: AircraftSimulator, target: AircraftSimulator, uid: str, missile_model: str = "AIM-9L"):
         assert parent.dt == target.dt, "integration timestep must be same!"
@@ -345,8 +554,12 @@ class MissileSimulator(BaseSimulator):
                  color="Red",
                  model="AIM-9L",
                  dt=1 / 12):
+        self._batch = None  # type: MissileBatch
+        self._slot = 0
+        MissileBatch(capacity=1).add(self)
         super().__init__(uid, color, dt)
-        self.__status = MissileSimulator.INACTIVE
+        self._dt = dt
+        self._status = MissileSimulator.INACTIVE
         self.model = model
         self.parent_aircraft = None  # type: AircraftSimulator
         self.target_aircraft = None  # type: AircraftSimulator
@@ -370,18 +583,18 @@ class MissileSimulator(BaseSimulator):
     @property
     def is_alive(self):
         """Missile is still flying"""
-        return self.__status == MissileSimulator.LAUNCHED
+        return self._status == MissileSimulator.LAUNCHED
 
     @property
     def is_success(self):
         """Missile has hit the target"""
-        return self.__status == MissileSimulator.HIT
+        return self._status == MissileSimulator.HIT
 
     @property
     def is_done(self):
         """Missile is already exploded"""
-        return self.__status == MissileSimulator.HIT \
-            or self.__status == MissileSimulator.MISS
+        return self._status == MissileSimulator.HIT \
+            or self._status == MissileSimulator.MISS
 
     @property
     def Isp(self):
@@ -435,28 +648,65 @@ class MissileSimulator(BaseSimulator):
         self._t = 0
         self._m = self._m0
         self._dtheta, self._dphi = 0, 0
-        self.__status = MissileSimulator.LAUNCHED
+        self._status = MissileSimulator.LAUNCHED
         self._distance_pre = np.inf
-        self._distance_increment = deque(maxlen=int(5 / self.dt))  # 5s of distance increment -- can't hit
+        self._num_increments = 0  # consecutive steps of distance increment
+        self._max_increments = int(5 / self.dt)  # 5s of distance increment -- can't hit
         self._left_t = int(1 / self.dt)  # remove missile 1s after its destroying
 
+    def save_state(self) -> dict:
+        """Capture the missile state, so that it can be restored later by `restore_state`.
+
+        Returns:
+            (dict): missile state
+        """
+        state = {
+            "geodetic": self._geodetic.copy(),
+            "position": self._position.copy(),
+            "posture": self._posture.copy(),
+            "velocity": self._velocity.copy(),
+            "status": self._status,
+            "render_explosion": self.render_explosion,
+        }
+        if self._status != MissileSimulator.INACTIVE:
+            state.update({
+                "t": self._t,
+                "m": self._m,
+                "dtheta": self._dtheta,
+                "dphi": self._dphi,
+                "distance_pre": self._distance_pre,
+                "num_increments": self._num_increments,
+                "left_t": self._left_t,
+            })
+        return state
+
+    def restore_state(self, state: dict):
+        """Restore the missile to a state captured by `save_state`.
+
+        Args:
+            state (dict): missile state returned by `save_state`
+        """
+        self._geodetic[:] = state["geodetic"]
+        self._position[:] = state["position"]
+        self._posture[:] = state["posture"]
+        self._velocity[:] = state["velocity"]
+        self._status = state["status"]
+        self.render_explosion = state["render_explosion"]
+        if self._status != MissileSimulator.INACTIVE:
+            self._t = state["t"]
+            self._m = state["m"]
+            self._dtheta = state["dtheta"]
+            self._dphi = state["dphi"]
+            self._distance_pre = state["distance_pre"]
+            self._num_increments = state["num_increments"]
+            self._left_t = state["left_t"]
+
     def target(self, target: AircraftSimulator):
         self.target_aircraft = target  # TODO: change target?
         self.target_aircraft.under_missiles.append(self)
 
     def run(self):
-        self._t += self.dt
-        action, distance = self._guidance()
-        self._distance_increment.append(distance > self._distance_pre)
-        self._distance_pre = distance
-        if distance < self._Rc and self.target_aircraft.is_alive:
-            self.__status = MissileSimulator.HIT
-            self.target_aircraft.shotdown()
-        elif (self._t > self._t_max) or (np.linalg.norm(self.get_velocity()) < self._v_min) \
-                or np.sum(self._distance_increment) >= self._distance_increment.maxlen or not self.target_aircraft.is_alive:
-            self.__status = MissileSimulator.MISS
-        else:
-            self._state_trans(action)
+        self._batch.run([self._slot])
 
     def log(self):
         if self.is_alive:
@@ -477,56 +727,224 @@ class MissileSimulator(BaseSimulator):
     def close(self):
         self.target_aircraft = None
 
-    def _guidance(self):
+
+class MissileBatch:
+    """Missile engine holding many missiles in structure-of-arrays form, so that guidance and
+    dynamics of all of them are advanced by one vectorized call of `run`.
+
+    Each `MissileSimulator` added to the batch becomes a view of one slot of the arrays below.
+    NOTE: moving a missile to another batch, or growing the batch beyond its capacity, reallocates
+    its state, so arrays returned by its getters (e.g. `get_velocity()`) before that no longer alias it.
+    """
+
+    # per-missile storage, name: (shape, dtype)
+    FIELDS = {
+        "geodetic": ((3,), np.float64),
+        "position": ((3,), np.float64),
+        "posture": ((3,), np.float64),
+        "velocity": ((3,), np.float64),
+        "lon0": ((), np.float64),
+        "lat0": ((), np.float64),
+        "alt0": ((), np.float64),
+        "dt": ((), np.float64),
+        "status": ((), np.int64),
+        "t": ((), np.float64),
+        "m": ((), np.float64),
+        "dtheta": ((), np.float64),
+        "dphi": ((), np.float64),
+        "distance_pre": ((), np.float64),
+        "num_increments": ((), np.int64),
+        "max_increments": ((), np.int64),
+        "left_t": ((), np.int64),
+        # missile parameters
+        "g": ((), np.float64),
+        "t_max": ((), np.float64),
+        "t_thrust": ((), np.float64),
+        "Isp": ((), np.float64),
+        "Length": ((), np.float64),
+        "Diameter": ((), np.float64),
+        "cD": ((), np.float64),
+        "m0": ((), np.float64),
+        "dm": ((), np.float64),
+        "K": ((), np.float64),
+        "nyz_max": ((), np.float64),
+        "Rc": ((), np.float64),
+        "v_min": ((), np.float64),
+    }
+
+    def __init__(self, capacity: int = 16):
+        self._missiles = []  # type: List[MissileSimulator]
+        self._allocate(capacity)
+
+    def __len__(self):
+        return len(self._missiles)
+
+    def __contains__(self, missile):
+        return getattr(missile, "_batch", None) is self
+
+    @property
+    def missiles(self) -> List[MissileSimulator]:
+        return self._missiles
+
+    def _allocate(self, capacity: int):
+        size = len(self._missiles)
+        for name, (shape, dtype) in self.FIELDS.items():
+            array = np.zeros((capacity, *shape), dtype=dtype)
+            if size > 0:
+                array[:size] = getattr(self, name)[:size]
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def add(self, missile: MissileSimulator):
+        """Move a missile into this batch, its state is carried over from its previous batch."""
+        if missile in self:
+            return
+        if len(self._missiles) == self._capacity:
+            self._allocate(2 * self._capacity)
+        slot = len(self._missiles)
+        previous = missile._batch
+        if previous is not None:
+            assert previous._missiles[-1] is missile, "only the last missile of a batch can be moved!"
+            for name in self.FIELDS:
+                getattr(self, name)[slot] = getattr(previous, name)[missile._slot]
+            previous._missiles.pop()
+        missile._batch, missile._slot = self, slot
+        self._missiles.append(missile)
+
+    def sync(self, missiles: List[MissileSimulator]):
+        """Make the batch hold exactly `missiles`, in order.
+
+        Missiles of the longest common prefix keep their slots (and views of their state stay valid),
+        the other ones of the batch are moved out into private batches, keeping their state.
+        """
+        missiles = list(missiles)
+        size = 0
+        while size < min(len(missiles), len(self._missiles)) and missiles[size] is self._missiles[size]:
+            size += 1
+        while len(self._missiles) > size:
+            MissileBatch(capacity=1).add(self._missiles[-1])
+        for missile in missiles[size:]:
+            self.add(missile)
+
+    def clear(self):
+        """Move all the missiles out of the batch, each one keeps its state in a private batch."""
+        self.sync([])
+
+    def run(self, slots=None):
+        """Advance the missiles by one timestep, which is equivalent to running each of them in slot order.
+
+        Args:
+            slots (list of int): slots to advance. Default = all the missiles of the batch
+        """
+        if slots is None:
+            idx = slice(0, len(self._missiles))
+            missiles = self._missiles
+        else:
+            idx = np.asarray(slots, dtype=np.int64)
+            missiles = [self._missiles[slot] for slot in idx]
+        num = len(missiles)
+        if num == 0:
+            return
+        self.t[idx] += self.dt[idx]
+        ny, nz, distance, v_m, target_alive, target_index = self._guidance(idx, missiles)
+        increment = distance > self.distance_pre[idx]
+        self.num_increments[idx] = np.where(increment, self.num_increments[idx] + 1, 0)
+        self.distance_pre[idx] = distance
+        hit = (distance < self.Rc[idx]) & target_alive
+        # a missile hitting the target shoots it down for the missiles following it in this step
+        killed = np.zeros(num, dtype=bool)
+        for i in np.flatnonzero(hit):
+            if killed[i]:
+                hit[i] = False
+                continue
+            missiles[i].target_aircraft.shotdown()
+            killed |= (target_index == target_index[i]) & (np.arange(num) > i)
+        miss = ~hit & ((self.t[idx] > self.t_max[idx]) | (v_m < self.v_min[idx])
+                       | (self.num_increments[idx] >= self.max_increments[idx]) | ~(target_alive & ~killed))
+        status = self.status[idx]
+        status[hit] = MissileSimulator.HIT
+        status[miss] = MissileSimulator.MISS
+        self.status[idx] = status
+        trans = ~(hit | miss)
+        if np.all(trans):
+            self._state_trans(idx, ny, nz, v_m)
+        elif np.any(trans):
+            idx = np.arange(len(self._missiles))[idx][trans]
+            self._state_trans(idx, ny[trans], nz[trans], v_m[trans])
+
+    def _guidance(self, idx, missiles):
         """
         Guidance law, proportional navigation
         """
-        x_m, y_m, z_m = self.get_position()
-        dx_m, dy_m, dz_m = self.get_velocity()
-        v_m = np.linalg.norm([dx_m, dy_m, dz_m])
+        aircrafts = {}
+        target_index = np.array([aircrafts.setdefault(missile.target_aircraft, len(aircrafts)) for missile in missiles])
+        target_position = np.array([aircraft.get_position() for aircraft in aircrafts])[target_index]
+        target_velocity = np.array([aircraft.get_velocity() for aircraft in aircrafts])[target_index]
+        target_alive = np.array([aircraft.is_alive for aircraft in aircrafts])[target_index]
+
+        x_m, y_m, z_m = self.position[idx].T
+        dx_m, dy_m, dz_m = self.velocity[idx].T
+        v_m = np.sqrt(dx_m**2 + dy_m**2 + dz_m**2)
         theta_m = np.arcsin(dz_m / v_m)
-        x_t, y_t, z_t = self.target_aircraft.get_position()
-        dx_t, dy_t, dz_t = self.target_aircraft.get_velocity()
-        Rxy = np.linalg.norm([x_m - x_t, y_m - y_t])  # distance from missile to target project to X-Y plane
-        Rxyz = np.linalg.norm([x_m - x_t, y_m - y_t, z_t - z_m])  # distance from missile to target
-        # calculate beta & eps, but no need actually...
-        # beta = np.arctan2(y_m - y_t, x_m - x_t)  # relative yaw
-        # eps = np.arctan2(z_m - z_t, np.linalg.norm([x_m - x_t, y_m - y_t]))  # relative pitch
+        x_t, y_t, z_t = target_position.T
+        dx_t, dy_t, dz_t = target_velocity.T
+        Rxy = np.sqrt((x_m - x_t)**2 + (y_m - y_t)**2)  # distance from missile to target project to X-Y plane
+        Rxyz = np.sqrt((x_m - x_t)**2 + (y_m - y_t)**2 + (z_t - z_m)**2)  # distance from missile to target
         dbeta = ((dy_t - dy_m) * (x_t - x_m) - (dx_t - dx_m) * (y_t - y_m)) / Rxy**2
         deps = ((dz_t - dz_m) * Rxy**2 - (z_t - z_m) * (
             (x_t - x_m) * (dx_t - dx_m) + (y_t - y_m) * (dy_t - dy_m))) / (Rxyz**2 * Rxy)
-        ny = self.K * v_m / self._g * np.cos(theta_m) * dbeta
-        nz = self.K * v_m / self._g * deps + np.cos(theta_m)
-        return np.clip([ny, nz], -self._nyz_max, self._nyz_max), Rxyz
-
-    def _state_trans(self, action):
+        t_max = self.t_max[idx]
+        K = np.maximum(self.K[idx] * (t_max - self.t[idx]) / t_max, 0)  # proportional guidance coefficient
+        g, nyz_max = self.g[idx], self.nyz_max[idx]
+        ny = np.minimum(np.maximum(K * v_m / g * np.cos(theta_m) * dbeta, -nyz_max), nyz_max)
+        nz = np.minimum(np.maximum(K * v_m / g * deps + np.cos(theta_m), -nyz_max), nyz_max)
+        return ny, nz, Rxyz, v_m, target_alive, target_index
+
+    def _state_trans(self, idx, ny, nz, v):
         """
         State transition function
         """
+        dt, g, t = self.dt[idx], self.g[idx], self.t[idx]
         # update position & geodetic
-        self._position[:] += self.dt * self.get_velocity()
-        self._geodetic[:] = NEU2LLA(*self.get_position(), self.lon0, self.lat0, self.alt0)
+        position = self.position[idx] + dt[:, None] * self.velocity[idx]
+        self.position[idx] = position
+        lon0, lat0, alt0 = self.lon0[idx], self.lat0[idx], self.alt0[idx]
+        todo = (lon0 != lon0[0]) | (lat0 != lat0[0]) | (alt0 != alt0[0])
+        if not np.any(todo):  # missiles of an env share the same battle field center
+            self.geodetic[idx] = get_neu_converter(lon0[0], lat0[0], alt0[0]).neu2lla(position)
+        else:
+            idx = np.arange(len(self._missiles))[idx]
+            todo[:] = True
+            while np.any(todo):
+                i = np.argmax(todo)
+                same = todo & (lon0 == lon0[i]) & (lat0 == lat0[i]) & (alt0 == alt0[i])
+                self.geodetic[idx[same]] = get_neu_converter(lon0[i], lat0[i], alt0[i]).neu2lla(position[same])
+                todo &= ~same
         # update velocity & posture
-        v = np.linalg.norm(self.get_velocity())
-        theta, phi = self.get_rpy()[1:]
-        T = self._g * self.Isp * self._dm
-        D = 0.5 * self._cD * self.S * self.rho * v**2
-        nx = (T - D) / (self._m * self._g)
-        ny, nz = action
-
-        dv = self._g * (nx - np.sin(theta))
-        self._dphi = self._g / v * (ny / np.cos(theta))
-        self._dtheta = self._g / v * (nz - np.cos(theta))
-
-        v += self.dt * dv
-        phi += self.dt * self._dphi
-        theta += self.dt * self._dtheta
-        self._velocity[:] = np.array([
-            v * np.cos(theta) * np.cos(phi),
-            v * np.cos(theta) * np.sin(phi),
-            v * np.sin(theta)
-        ])
-        self._posture[:] = np.array([0, theta, phi])
+        theta, phi = self.posture[idx, 1], self.posture[idx, 2]
+        Isp = np.where(t < self.t_thrust[idx], self.Isp[idx], 0)
+        T = g * Isp * self.dm[idx]
+        Diameter = self.Diameter[idx]
+        S = np.pi * (Diameter / 2)**2 \
+            + np.sqrt(np.sin(self.dtheta[idx])**2 + np.sin(self.dphi[idx])**2) * Diameter * self.Length[idx]
+        rho = 1.225 * np.exp(-self.geodetic[idx, 2] / 9300)
+        D = 0.5 * self.cD[idx] * S * rho * v**2
+        m = self.m[idx]
+        nx = (T - D) / (m * g)
+
+        dv = g * (nx - np.sin(theta))
+        dphi = g / v * (ny / np.cos(theta))
+        dtheta = g / v * (nz - np.cos(theta))
+        self.dphi[idx], self.dtheta[idx] = dphi, dtheta
+
+        v = v + dt * dv
+        phi = phi + dt * dphi
+        theta = theta + dt * dtheta
+        self.velocity[idx, 0] = v * np.cos(theta) * np.cos(phi)
+        self.velocity[idx, 1] = v * np.cos(theta) * np.sin(phi)
+        self.velocity[idx, 2] = v * np.sin(theta)
+        self.posture[idx, 0] = 0
+        self.posture[idx, 1] = theta
+        self.posture[idx, 2] = phi
         # update mass
-        if self._t < self._t_thrust:
-            self._m = self._m - self.dt * self._dm
+        self.m[idx] = np.where(t < self.t_thrust[idx], m - dt * self.dm[idx], m)
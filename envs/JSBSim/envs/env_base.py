@@ -1,8 +1,9 @@
 import gym
+import copy
 from gym.utils import seeding
 import numpy as np
-from typing import Dict, Any, Tuple
-from ..core.simulatior import AircraftSimulator, BaseSimulator
+from typing import Dict, Any, List, Tuple
+from ..core.simulatior import AircraftSimulator, BaseSimulator, MissileSimulator, MissileBatch
 from ..tasks.task_base import BaseTask
 from ..utils.utils import parse_config
 
@@ -68,6 +69,7 @@ class BaseEnv(gym.Env):
                 init_state=config.get("init_state"),
                 origin=getattr(self.config, 'battle_field_center', (120.0, 60.0, 0.0)),
                 sim_freq=self.sim_freq,
+                warm_reset=getattr(self.config, 'warm_reset', False),
                 num_missiles=config.get("missile", 0))
         # Different teams have different uid[0]
         _default_team_uid = list(self._jsbsims.keys())[0][0]
@@ -85,9 +87,11 @@ class BaseEnv(gym.Env):
                     sim.enemies.append(s)
 
         self._tempsims = {}    # type: Dict[str, BaseSimulator]
+        self._missile_batch = MissileBatch()
 
     def add_temp_simulator(self, sim: BaseSimulator):
         self._tempsims[sim.uid] = sim
+        self.sync_missile_batch()
 
     def reset(self) -> np.ndarray:
         """Resets the state of the environment and returns an initial observation.
@@ -124,17 +128,18 @@ class BaseEnv(gym.Env):
         self.current_step += 1
         info = {"current_step": self.current_step}
         # apply actions
-        action = self._unpack(action)
+        action = self.task.normalize_actions(self, self._unpack(action))
         for agent_id in self.agents.keys():
-            a_action = self.task.normalize_action(self, agent_id, action[agent_id])
-            self.agents[agent_id].set_property_values(self.task.action_var, a_action)
+            self.agents[agent_id].set_property_values(self.task.action_var, action[agent_id])
         # run simulation
+        tempsims = self.sync_missile_batch()
         for _ in range(self.agent_interaction_steps):
             # aircraft simulations
             for sim in self._jsbsims.values():
                 sim.run()
             # missile simulations
-            for sim in self._tempsims.values():
+            self._missile_batch.run()
+            for sim in tempsims:
                 sim.run()
         self.task.step(self)
 
@@ -152,6 +157,53 @@ class BaseEnv(gym.Env):
 
         return self._pack(obs), self._pack(rewards), self._pack(dones), info
 
+    def sync_missile_batch(self) -> List[BaseSimulator]:
+        """Make the env's `MissileBatch` hold the missiles among the temporary simulators,
+        so that they are advanced by one vectorized call per simulation step.
+
+        Returns:
+            (list): the other temporary simulators, which still run one by one
+        """
+        self._missile_batch.sync([sim for sim in self._tempsims.values() if isinstance(sim, MissileSimulator)])
+        return [sim for sim in self._tempsims.values() if sim not in self._missile_batch]
+
+    def save_state(self) -> Dict[str, Any]:
+        """Capture the full environment state (simulators, missiles, task bookkeeping and random generator),
+        so that the episode can be resumed or branched from here by `restore_state`.
+
+        Returns:
+            state (dict): environment state
+        """
+        return {
+            "current_step": self.current_step,
+            "np_random": copy.deepcopy(self.np_random),
+            "jsbsims": {uid: sim.save_state() for uid, sim in self._jsbsims.items()},
+            "tempsims": {uid: (sim, sim.save_state()) for uid, sim in self._tempsims.items()},
+            "task": self.task.save_state(),
+        }
+
+    def restore_state(self, state: Dict[str, Any]) -> np.ndarray:
+        """Restore the environment to a state captured by `save_state`.
+        The same state can be restored any number of times.
+
+        Args:
+            state (dict): environment state returned by `save_state`
+
+        Returns:
+            obs (np.ndarray): observation of the restored state
+        """
+        self.current_step = state["current_step"]
+        self.np_random = copy.deepcopy(state["np_random"])
+        for uid, sim_state in state["jsbsims"].items():
+            self._jsbsims[uid].restore_state(sim_state)
+        self._tempsims.clear()
+        for uid, (sim, sim_state) in state["tempsims"].items():
+            sim.restore_state(sim_state)
+            self._tempsims[uid] = sim
+        self.task.restore_state(state["task"])
+        obs = self.get_obs()
+        return self._pack(obs)
+
     def get_obs(self):
         """Returns all agent observations in a list.
 
@@ -180,6 +232,7 @@ class BaseEnv(gym.Env):
             sim.close()
         self._jsbsims.clear()
         self._tempsims.clear()
+        self._missile_batch.clear()
 
     def render(self, mode="txt", filepath='./JSBSimRecording.txt.acmi'):
         """Renders the environment.
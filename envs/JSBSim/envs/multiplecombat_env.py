@@ -42,6 +42,17 @@ class MultipleCombatEnv(BaseEnv):
         share_obs = self.get_state()
         return self._pack(obs), self._pack(share_obs)
 
+    def restore_state(self, state: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Restore the environment to a state captured by `save_state`.
+
+        Returns:
+            obs (dict): {agent_id: restored observation}
+            share_obs (dict): {agent_id: restored state}
+        """
+        obs = super().restore_state(state)
+        share_obs = self.get_state()
+        return obs, self._pack(share_obs)
+
     def reset_simulators(self):
         # Assign new initial condition here!
         for sim in self._jsbsims.values():
@@ -69,15 +80,16 @@ class MultipleCombatEnv(BaseEnv):
         info = {"current_step": self.current_step}
 
         # apply actions
-        action = self._unpack(action)
+        action = self.task.normalize_actions(self, self._unpack(action))
         for agent_id in self.agents.keys():
-            a_action = self.task.normalize_action(self, agent_id, action[agent_id])
-            self.agents[agent_id].set_property_values(self.task.action_var, a_action)
+            self.agents[agent_id].set_property_values(self.task.action_var, action[agent_id])
         # run simulation
+        tempsims = self.sync_missile_batch()
         for _ in range(self.agent_interaction_steps):
             for sim in self._jsbsims.values():
                 sim.run()
-            for sim in self._tempsims.values():
+            self._missile_batch.run()
+            for sim in tempsims:
                 sim.run()
         self.task.step(self)
         obs = self.get_obs()
@@ -27,6 +27,15 @@ class SingleControlEnv(BaseEnv):
         obs = self.get_obs()
         return self._pack(obs)
 
+    def save_state(self):
+        state = super().save_state()
+        state["heading_turn_counts"] = self.heading_turn_counts
+        return state
+
+    def restore_state(self, state):
+        self.heading_turn_counts = state["heading_turn_counts"]
+        return super().restore_state(state)
+
     def reset_simulators(self):
         if self.init_states is None:
             self.init_states = [sim.init_state.copy() for sim in self.agents.values()]
@@ -1,7 +1,9 @@
+import os
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
+from ..utils.utils import get_root_dir
 
 
 def check(input):
@@ -108,3 +110,63 @@ class BaselineActor(nn.Module):
         x, h_s = self.rnn(x, h_s)
         actions = self.act(x)
         return actions, h_s
+
+
+def export_torchscript(actor: BaselineActor, path=None) -> torch.jit.ScriptModule:
+    """Compile `actor` to a frozen TorchScript module with the same forward on tensors, and save it to `path` if given.
+    """
+    actor.eval()
+    input_dim = actor.base.mlp.fc[0].in_features
+    example = (torch.zeros((1, input_dim)), torch.zeros((1, 1, 128)))
+    with torch.no_grad():
+        module = torch.jit.freeze(torch.jit.trace(actor, example))
+    if path is not None:
+        torch.jit.save(module, path)
+    return module
+
+
+def export_numpy(actor: BaselineActor, path: str):
+    """Save `actor` weights as a `.npz` file loadable by `NumpyBaselineActor` without torch."""
+    np.savez(path, **{key: value.detach().cpu().numpy() for key, value in actor.state_dict().items()})
+
+
+def export_numpy_checkpoint(model_path: str, path: str):
+    """Save the weights of checkpoint `model_path` as a `.npz` file loadable by `NumpyBaselineActor` without torch.
+
+    The file is written under a temporary name first, so that concurrent env workers never load a partial file.
+    """
+    state_dict = torch.load(model_path, map_location=torch.device('cpu'))
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **{key: value.numpy() for key, value in state_dict.items()})
+    os.replace(tmp_path, path)
+
+
+class TorchBaselineActor:
+    """`BaselineActor` (or its TorchScript export) called on numpy arrays without autograd, like `NumpyBaselineActor`.
+    """
+    def __init__(self, module):
+        self.module = module
+
+    def __deepcopy__(self, memo):
+        # weights are never modified, share them with copies (e.g. in task snapshots)
+        return self
+
+    @classmethod
+    def load(cls, model_path, input_dim=12, use_mlp_actlayer=False, torchscript=False) -> "TorchBaselineActor":
+        actor = BaselineActor(input_dim, use_mlp_actlayer)
+        actor.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+        actor.eval()
+        return cls(export_torchscript(actor) if torchscript else actor)
+
+    @torch.no_grad()
+    def __call__(self, obs, rnn_states):
+        actions, rnn_states = self.module(torch.as_tensor(obs, dtype=torch.float32),
+                                          torch.as_tensor(rnn_states, dtype=torch.float32))
+        return actions.numpy(), rnn_states.numpy()
+
+
+if __name__ == "__main__":
+    # export the baseline models for the 'numpy' backend ahead of use: python -m envs.JSBSim.model.baseline_actor
+    for model_name in ['baseline_model', 'dodge_missile_model']:
+        model_path = os.path.join(get_root_dir(), 'model', model_name)
+        export_numpy_checkpoint(model_path + '.pt', model_path + '.npz')
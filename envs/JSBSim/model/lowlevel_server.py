@@ -0,0 +1,225 @@
+import os
+import queue
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from .numpy_actor import load_baseline_actor, get_baseline_backend
+
+
+_lowlevel_server = None  # type: LowLevelPolicyClient
+
+
+def set_lowlevel_server(client):
+    """Make hierarchical tasks created in current process use the low-level policy server of `client`
+    (see `load_lowlevel_policy`). Set None to load a private policy again."""
+    global _lowlevel_server
+    _lowlevel_server = client
+
+
+def load_lowlevel_policy():
+    """Low-level policy of hierarchical tasks: the client of the low-level policy server set in current process,
+    or else a private baseline actor loaded from `baseline_model` (see `load_baseline_actor`)."""
+    if _lowlevel_server is not None:
+        return _lowlevel_server
+    return load_baseline_actor('baseline_model')
+
+
+class _SlotBuffers:
+    """Shared-memory request slots: low-level inputs, rnn states and actions of up to `max_agents` agents per slot."""
+    OBS_DIM, RNN_DIM, ACT_DIM = 12, 128, 4
+
+    def __init__(self, shm: SharedMemory, num_slots: int, max_agents: int):
+        self.shm = shm
+        shapes = [(num_slots, max_agents, self.OBS_DIM), (num_slots, max_agents, self.RNN_DIM),
+                  (num_slots, max_agents, self.ACT_DIM)]
+        offset = 0
+        self.obs, self.rnn_states, self.actions = [], [], []
+        for name, shape in zip(["obs", "rnn_states", "actions"], shapes):
+            setattr(self, name, np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=offset))
+            offset += int(np.prod(shape)) * 4
+
+    @classmethod
+    def nbytes(cls, num_slots: int, max_agents: int) -> int:
+        return num_slots * max_agents * (cls.OBS_DIM + cls.RNN_DIM + cls.ACT_DIM) * 4
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether process `pid` is running (zombies, i.e. exited but not joined yet, are not)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+    except OSError:  # no procfs
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+
+def _serve(shm_name, num_slots, max_agents, requests, replies, backend, num_threads, running):
+    """Server loop: wait for a request, gather all requests ready meanwhile, run them in one forward pass."""
+    try:
+        _serve_requests(shm_name, num_slots, max_agents, requests, replies, backend, num_threads)
+    finally:
+        running.value = 0
+
+
+def _serve_requests(shm_name, num_slots, max_agents, requests, replies, backend, num_threads):
+    if backend != "numpy":
+        import torch
+        torch.set_num_threads(num_threads)
+    policy = load_baseline_actor('baseline_model', backend=backend)
+    buffers = _SlotBuffers(SharedMemory(name=shm_name), num_slots, max_agents)
+    running = True
+    while running:
+        batch = [requests.get()]
+        while True:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        if None in batch:  # closing, still reply to pending requests
+            running = False
+            batch = [request for request in batch if request is not None]
+        if len(batch) == 0:
+            continue
+        obs = np.concatenate([buffers.obs[slot, :n] for slot, n in batch])
+        rnn_states = np.concatenate([buffers.rnn_states[slot, :n] for slot, n in batch])
+        actions, rnn_states = policy(obs, rnn_states[:, None, :])
+        rnn_states = rnn_states[:, 0, :]
+        start = 0
+        for slot, n in batch:
+            buffers.actions[slot, :n] = actions[start:start + n]
+            buffers.rnn_states[slot, :n] = rnn_states[start:start + n]
+            start += n
+            replies[slot].release()
+    del buffers
+    requests.cancel_join_thread()
+
+
+class LowLevelPolicyClient:
+    """Callable like a baseline actor (see `load_baseline_actor`), which runs the low-level policy in the server.
+
+    Each process calling it takes a request slot of the server on first use, which is reused by another process
+    once it has exited.
+    NOTE: it holds multiprocessing synchronization primitives, so it can only be passed to subprocesses
+    when they are started, e.g. through the env functions of a vectorized env.
+    """
+    def __init__(self, shm_name, num_slots, max_agents, requests, replies, slot_pids, server_pid, running):
+        self.shm_name = shm_name
+        self.num_slots = num_slots
+        self.max_agents = max_agents
+        self.requests = requests
+        self.replies = replies
+        self.slot_pids = slot_pids
+        self.server_pid = server_pid
+        self.running = running
+        self._pid, self._slot, self._buffers = None, None, None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_pid=None, _slot=None, _buffers=None)
+        return state
+
+    def __deepcopy__(self, memo):
+        # handle of a shared service (e.g. in task snapshots), never copied
+        return self
+
+    def _attach(self):
+        pid = os.getpid()
+        with self.slot_pids.get_lock():
+            free_slots = (slot for slot, slot_pid in enumerate(self.slot_pids)
+                          if slot_pid == 0 or slot_pid == pid or not _pid_alive(slot_pid))
+            self._slot = next(free_slots, None)
+            if self._slot is None:
+                raise RuntimeError(f"Low-level policy server has no free request slot ({self.num_slots} slots)")
+            self.slot_pids[self._slot] = pid
+        # drop the reply to a request of a former owner of the slot, which exited while waiting for it
+        while self.replies[self._slot].acquire(block=False):
+            pass
+        self._buffers = _SlotBuffers(SharedMemory(name=self.shm_name), self.num_slots, self.max_agents)
+        self._pid = pid
+
+    def _wait_reply(self):
+        while not self.replies[self._slot].acquire(timeout=1):
+            if not self.running.value or not _pid_alive(self.server_pid):
+                raise RuntimeError("Low-level policy server exited while processing a request")
+
+    def __call__(self, obs, rnn_states):
+        """
+        Args:
+            obs (np.ndarray): low-level inputs, shape (N, 12)
+            rnn_states (np.ndarray): rnn states, shape (N, 1, 128)
+
+        Returns:
+            (actions, rnn_states): np.ndarray of shape (N, 4) and (N, 1, 128)
+        """
+        if self._pid != os.getpid():
+            self._attach()
+        n = len(obs)
+        assert n <= self.max_agents, f"Low-level policy server handles at most {self.max_agents} agents per request"
+        self._buffers.obs[self._slot, :n] = obs
+        self._buffers.rnn_states[self._slot, :n] = np.asarray(rnn_states).reshape(n, -1)
+        self.requests.put((self._slot, n))
+        self._wait_reply()
+        actions = self._buffers.actions[self._slot, :n].astype(np.int64)
+        rnn_states = self._buffers.rnn_states[self._slot, :n, None].copy()
+        return actions, rnn_states
+
+
+class LowLevelPolicyServer:
+    """A local process running the low-level baseline actor of hierarchical tasks for all environment workers,
+    which batches their concurrent requests into one forward pass.
+
+    Requests go through shared memory, only (slot, num_agents) tuples are sent through a queue.
+
+    Usage:
+        server = LowLevelPolicyServer()
+        client = server.client()
+        # in each env function, before creating the env
+        set_lowlevel_server(client)
+        ...
+        server.close()
+    """
+    def __init__(self, num_slots=256, max_agents=4, num_threads=1, backend=None, context=None):
+        """
+        Args:
+            num_slots (int, optional): max number of client processes running at the same time. Defaults to 256.
+            max_agents (int, optional): max number of agents of a request, i.e. of an env. Defaults to 4.
+            num_threads (int, optional): number of torch threads of the server. Defaults to 1.
+            backend (str, optional): baseline actor backend of the server. Defaults to the backend of current process.
+            context (str, optional): multiprocessing start method. Defaults to the platform default start method.
+        """
+        ctx = mp.get_context(context)
+        backend = backend or get_baseline_backend()
+        # client processes must share the resource tracker of the main process (see ShmemVecEnv)
+        resource_tracker.ensure_running()
+        self.shm = SharedMemory(create=True, size=_SlotBuffers.nbytes(num_slots, max_agents))
+        self.requests = ctx.Queue()
+        self.replies = [ctx.Semaphore(0) for _ in range(num_slots)]
+        self.slot_pids = ctx.Array('i', num_slots)
+        self.running = ctx.Value('b', 1)
+        self.process = ctx.Process(target=_serve, args=(self.shm.name, num_slots, max_agents, self.requests,
+                                                        self.replies, backend, num_threads, self.running))
+        self.process.daemon = True
+        self.process.start()
+        self._client = LowLevelPolicyClient(self.shm.name, num_slots, max_agents, self.requests, self.replies,
+                                            self.slot_pids, self.process.pid, self.running)
+        self.closed = False
+
+    def client(self) -> LowLevelPolicyClient:
+        return self._client
+
+    def close(self):
+        if self.closed:
+            return
+        self.requests.put(None)
+        self.process.join()
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
@@ -0,0 +1,130 @@
+import os
+import numpy as np
+from ..utils.utils import get_root_dir
+
+# NOTE: this module must not import torch, so that envs using the numpy backend run in torch-free processes.
+
+BASELINE_BACKENDS = ["torch", "torchscript", "numpy"]
+_baseline_backend = "torch"
+
+
+def set_baseline_backend(backend: str):
+    """Set the backend of the baseline actors loaded in current process (see `load_baseline_actor`)."""
+    assert backend in BASELINE_BACKENDS, f"Unknown baseline backend {backend}, choose from {BASELINE_BACKENDS}"
+    global _baseline_backend
+    _baseline_backend = backend
+
+
+def get_baseline_backend() -> str:
+    return _baseline_backend
+
+
+def load_baseline_actor(model_name: str, input_dim=12, use_mlp_actlayer=False, backend=None):
+    """Load baseline actor `model/<model_name>` as a callable `(obs, rnn_states) => (actions, rnn_states)`
+    on numpy arrays, of shape (N, input_dim), (N, 1, 128) => (N, 4), (N, 1, 128).
+
+    Args:
+        model_name (str): model file name without extension, e.g. 'baseline_model'.
+        backend (str, optional): one of `BASELINE_BACKENDS`:
+            'torch' runs the `BaselineActor` loaded from `<model_name>.pt`,
+            'torchscript' runs it compiled to a frozen TorchScript module,
+            'numpy' runs `NumpyBaselineActor` loaded from `<model_name>.npz` without importing torch
+                (see `numpy_weights_path`).
+            Defaults to the backend set by `set_baseline_backend` ('torch').
+    """
+    backend = backend or _baseline_backend
+    model_path = os.path.join(get_root_dir(), 'model', model_name)
+    if backend == "numpy":
+        return NumpyBaselineActor.load(numpy_weights_path(model_name))
+    elif backend in ["torch", "torchscript"]:
+        from .baseline_actor import TorchBaselineActor
+        return TorchBaselineActor.load(model_path + '.pt', input_dim, use_mlp_actlayer,
+                                       torchscript=(backend == "torchscript"))
+    else:
+        raise NotImplementedError(f"Unknown baseline backend {backend}, choose from {BASELINE_BACKENDS}")
+
+
+def numpy_weights_path(model_name: str) -> str:
+    """Path of the `.npz` weights of baseline model `model/<model_name>.pt`, which are exported from the checkpoint
+    on first use, or when it is newer. Exporting imports torch once, e.g. in the main process loading the envs."""
+    model_path = os.path.join(get_root_dir(), 'model', model_name)
+    npz_path = model_path + '.npz'
+    if not os.path.exists(npz_path) or os.path.getmtime(npz_path) < os.path.getmtime(model_path + '.pt'):
+        from .baseline_actor import export_numpy_checkpoint
+        export_numpy_checkpoint(model_path + '.pt', npz_path)
+    return npz_path
+
+
+def _sigmoid(x):
+    return 1. / (1. + np.exp(-x))
+
+
+class NumpyBaselineActor:
+    """NumPy evaluator of `BaselineActor` (MLP => GRU => [MLP] => argmax of categorical heads), in float32.
+
+    Parameters are the `BaselineActor` state dict, exported by `export_numpy` of `baseline_actor.py`.
+    """
+    def __init__(self, params: dict):
+        self.base = self._mlp(params, 'base.mlp.fc')
+        self.act_mlp = self._mlp(params, 'act.mlp.fc')
+        self.w_ih, self.b_ih = params['rnn.gru.weight_ih_l0'].T, params['rnn.gru.bias_ih_l0']
+        self.w_hh, self.b_hh = params['rnn.gru.weight_hh_l0'].T, params['rnn.gru.bias_hh_l0']
+        self.rnn_norm = (params['rnn.norm.weight'], params['rnn.norm.bias'])
+        self.action_outs = []
+        while f'act.action_outs.{len(self.action_outs)}.logits_net.weight' in params:
+            prefix = f'act.action_outs.{len(self.action_outs)}.logits_net'
+            self.action_outs.append((params[prefix + '.weight'].T, params[prefix + '.bias']))
+
+    def __deepcopy__(self, memo):
+        # weights are never modified, share them with copies (e.g. in task snapshots)
+        return self
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyBaselineActor":
+        with np.load(path) as data:
+            return cls({key: data[key].astype(np.float32) for key in data.files})
+
+    @staticmethod
+    def _mlp(params, prefix):
+        # nn.Sequential of [Linear, ReLU, LayerNorm] * n, i.e. Linear at 3j and LayerNorm at 3j+2
+        layers = []
+        while f'{prefix}.{3 * len(layers)}.weight' in params:
+            j = 3 * len(layers)
+            layers.append((params[f'{prefix}.{j}.weight'].T, params[f'{prefix}.{j}.bias'],
+                           params[f'{prefix}.{j + 2}.weight'], params[f'{prefix}.{j + 2}.bias']))
+        return layers
+
+    @staticmethod
+    def _layer_norm(x, weight, bias, eps=1e-5):
+        mean = x.mean(axis=-1, keepdims=True)
+        var = x.var(axis=-1, keepdims=True)
+        return (x - mean) / np.sqrt(var + eps) * weight + bias
+
+    def _forward_mlp(self, x, layers):
+        for weight, bias, norm_weight, norm_bias in layers:
+            x = self._layer_norm(np.maximum(x @ weight + bias, 0), norm_weight, norm_bias)
+        return x
+
+    def __call__(self, obs, rnn_states):
+        """
+        Args:
+            obs (np.ndarray): shape (N, input_dim)
+            rnn_states (np.ndarray): shape (N, 1, 128)
+
+        Returns:
+            (actions, rnn_states): np.ndarray of shape (N, 4) (int64) and (N, 1, 128) (float32)
+        """
+        x = self._forward_mlp(np.asarray(obs, dtype=np.float32), self.base)
+        h = np.asarray(rnn_states, dtype=np.float32)[:, 0, :]
+        # GRU cell, gates ordered as (reset, update, new) like torch.nn.GRU
+        gi = x @ self.w_ih + self.b_ih
+        gh = h @ self.w_hh + self.b_hh
+        hidden_size = h.shape[-1]
+        r = _sigmoid(gi[:, :hidden_size] + gh[:, :hidden_size])
+        z = _sigmoid(gi[:, hidden_size:2 * hidden_size] + gh[:, hidden_size:2 * hidden_size])
+        n = np.tanh(gi[:, 2 * hidden_size:] + r * gh[:, 2 * hidden_size:])
+        h = (1 - z) * n + z * h
+        x = self._layer_norm(h, *self.rnn_norm)
+        x = self._forward_mlp(x, self.act_mlp)
+        actions = np.stack([np.argmax(x @ weight + bias, axis=-1) for weight, bias in self.action_outs], axis=-1)
+        return actions, h[:, None, :]
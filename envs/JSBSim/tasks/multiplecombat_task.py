@@ -1,15 +1,14 @@
 import numpy as np
 from gym import spaces
 from typing import Tuple
-import torch
 
-from ..tasks import SingleCombatTask
+from ..tasks import SingleCombatTask, HierarchicalSingleCombatTask
 from ..core.catalog import Catalog as c
 from ..core.simulatior import MissileSimulator
 from ..reward_functions import AltitudeReward, PostureReward, EventDrivenReward, MissilePostureReward
 from ..termination_conditions import ExtremeState, LowAltitude, Overload, Timeout, SafeReturn
-from ..utils.utils import get_AO_TA_R, LLA2NEU, get_root_dir
-from ..model.baseline_actor import BaselineActor
+from ..utils.utils import get_AO_TA_R
+from ..model.lowlevel_server import load_lowlevel_policy
 
 
 class MultipleCombatTask(SingleCombatTask):
@@ -81,7 +80,7 @@ class MultipleCombatTask(SingleCombatTask):
         norm_obs = np.zeros(self.obs_length)
         # (1) ego info normalization
         ego_state = np.array(env.agents[agent_id].get_property_values(self.state_var))
-        ego_cur_ned = LLA2NEU(*ego_state[:3], env.center_lon, env.center_lat, env.center_alt)
+        ego_cur_ned = env.agents[agent_id].get_position()
         ego_feature = np.array([*ego_cur_ned, *(ego_state[6:9])])
         norm_obs[0] = ego_state[2] / 5000            # 0. ego altitude   (unit: 5km)
         norm_obs[1] = np.sin(ego_state[3])           # 1. ego_roll_sin
@@ -96,7 +95,7 @@ class MultipleCombatTask(SingleCombatTask):
         offset = 8
         for sim in env.agents[agent_id].partners + env.agents[agent_id].enemies:
             state = np.array(sim.get_property_values(self.state_var))
-            cur_ned = LLA2NEU(*state[:3], env.center_lon, env.center_lat, env.center_alt)
+            cur_ned = sim.get_position()
             feature = np.array([*cur_ned, *(state[6:9])])
             AO, TA, R, side_flag = get_AO_TA_R(ego_feature, feature, return_side=True)
             norm_obs[offset+1] = (state[9] - ego_state[9]) / 340
@@ -130,9 +129,7 @@ class HierarchicalMultipleCombatTask(MultipleCombatTask):
     
     def __init__(self, config: str):
         super().__init__(config)
-        self.lowlevel_policy = BaselineActor()
-        self.lowlevel_policy.load_state_dict(torch.load(get_root_dir() + '/model/baseline_model.pt', map_location=torch.device('cpu')))
-        self.lowlevel_policy.eval()
+        self.lowlevel_policy = load_lowlevel_policy()
         self.norm_delta_altitude = np.array([0.1, 0, -0.1])
         self.norm_delta_heading = np.array([-np.pi / 6, -np.pi / 12, 0, np.pi / 12, np.pi / 6])
         self.norm_delta_velocity = np.array([0.05, 0, -0.05])
@@ -143,32 +140,21 @@ class HierarchicalMultipleCombatTask(MultipleCombatTask):
     def normalize_action(self, env, agent_id, action):
         """Convert high-level action into low-level action.
         """
-        # generate low-level input_obs
-        raw_obs = self.get_obs(env, agent_id)
-        input_obs = np.zeros(12)
-        # (1) delta altitude/heading/velocity
-        input_obs[0] = self.norm_delta_altitude[action[0]]
-        input_obs[1] = self.norm_delta_heading[action[1]]
-        input_obs[2] = self.norm_delta_velocity[action[2]]
-        # (2) ego info
-        input_obs[3:12] = raw_obs[:9]
-        input_obs = np.expand_dims(input_obs, axis=0)
-        # output low-level action
-        _action, _rnn_states = self.lowlevel_policy(input_obs, self._inner_rnn_states[agent_id])
-        action = _action.detach().cpu().numpy().squeeze(0)
-        self._inner_rnn_states[agent_id] = _rnn_states.detach().cpu().numpy()
-        # normalize low-level action
-        norm_act = np.zeros(4)
-        norm_act[0] = action[0] / 20 - 1.
-        norm_act[1] = action[1] / 20 - 1.
-        norm_act[2] = action[2] / 20 - 1.
-        norm_act[3] = action[3] / 58 + 0.4
-        return norm_act
+        return HierarchicalSingleCombatTask.normalize_action(self, env, agent_id, action)
+
+    def normalize_actions(self, env, actions: dict) -> dict:
+        return HierarchicalSingleCombatTask.normalize_actions(self, env, actions)
+
+    def lowlevel_forward(self, agent_ids, input_obs: np.ndarray) -> np.ndarray:
+        return HierarchicalSingleCombatTask.lowlevel_forward(self, agent_ids, input_obs)
+
+    def reset_lowlevel(self, env):
+        return HierarchicalSingleCombatTask.reset_lowlevel(self, env)
 
     def reset(self, env):
         """Task-specific reset, include reward function reset.
         """
-        self._inner_rnn_states = {agent_id: np.zeros((1, 1, 128)) for agent_id in env.agents.keys()}
+        self.reset_lowlevel(env)
         return super().reset(env)
 
 
@@ -199,7 +185,7 @@ class HierarchicalMultipleCombatShootTask(HierarchicalMultipleCombatTask):
         norm_obs = np.zeros(self.obs_length)
         # (1) ego info normalization
         ego_state = np.array(env.agents[agent_id].get_property_values(self.state_var))
-        ego_cur_ned = LLA2NEU(*ego_state[:3], env.center_lon, env.center_lat, env.center_alt)
+        ego_cur_ned = env.agents[agent_id].get_position()
         ego_feature = np.array([*ego_cur_ned, *(ego_state[6:9])])
         norm_obs[0] = ego_state[2] / 5000            # 0. ego altitude   (unit: 5km)
         norm_obs[1] = np.sin(ego_state[3])           # 1. ego_roll_sin
@@ -214,7 +200,7 @@ class HierarchicalMultipleCombatShootTask(HierarchicalMultipleCombatTask):
         offset = 8
         for sim in env.agents[agent_id].partners + env.agents[agent_id].enemies:
             state = np.array(sim.get_property_values(self.state_var))
-            cur_ned = LLA2NEU(*state[:3], env.center_lon, env.center_lat, env.center_alt)
+            cur_ned = sim.get_position()
             feature = np.array([*cur_ned, *(state[6:9])])
             AO, TA, R, side_flag = get_AO_TA_R(ego_feature, feature, return_side=True)
             norm_obs[offset+1] = (state[9] - ego_state[9]) / 340
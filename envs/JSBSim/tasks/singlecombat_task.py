@@ -1,4 +1,3 @@
-import torch
 import numpy as np
 from gym import spaces
 from typing import Literal
@@ -7,8 +6,9 @@ from ..core.simulatior import AircraftSimulator
 from ..core.catalog import Catalog as c
 from ..termination_conditions import ExtremeState, LowAltitude, Overload, Timeout, SafeReturn
 from ..reward_functions import AltitudeReward, PostureReward, EventDrivenReward
-from ..utils.utils import get_AO_TA_R, get2d_AO_TA_R, in_range_rad, LLA2NEU, get_root_dir
-from ..model.baseline_actor import BaselineActor
+from ..utils.utils import get_AO_TA_R, get2d_AO_TA_R, in_range_rad, LLA2NEU
+from ..model.numpy_actor import load_baseline_actor
+from ..model.lowlevel_server import load_lowlevel_policy
 
 
 class SingleCombatTask(BaseTask):
@@ -106,8 +106,8 @@ class SingleCombatTask(BaseTask):
         ego_obs_list = np.array(env.agents[agent_id].get_property_values(self.state_var))
         enm_obs_list = np.array(env.agents[agent_id].enemies[0].get_property_values(self.state_var))
         # (0) extract feature: [north(km), east(km), down(km), v_n(mh), v_e(mh), v_d(mh)]
-        ego_cur_ned = LLA2NEU(*ego_obs_list[:3], env.center_lon, env.center_lat, env.center_alt)
-        enm_cur_ned = LLA2NEU(*enm_obs_list[:3], env.center_lon, env.center_lat, env.center_alt)
+        ego_cur_ned = env.agents[agent_id].get_position()
+        enm_cur_ned = env.agents[agent_id].enemies[0].get_position()
         ego_feature = np.array([*ego_cur_ned, *(ego_obs_list[6:9])])
         enm_feature = np.array([*enm_cur_ned, *(enm_obs_list[6:9])])
         # (1) ego info normalization
@@ -203,9 +203,7 @@ class HierarchicalSingleCombatTask(SingleCombatTask):
 
     def __init__(self, config: str):
         super().__init__(config)
-        self.lowlevel_policy = BaselineActor()
-        self.lowlevel_policy.load_state_dict(torch.load(get_root_dir() + '/model/baseline_model.pt', map_location=torch.device('cpu')))
-        self.lowlevel_policy.eval()
+        self.lowlevel_policy = load_lowlevel_policy()
         self.norm_delta_altitude = np.array([0.1, 0, -0.1])
         self.norm_delta_heading = np.array([-np.pi / 6, -np.pi / 12, 0, np.pi / 12, np.pi / 6])
         self.norm_delta_velocity = np.array([0.05, 0, -0.05])
@@ -215,6 +213,9 @@ class HierarchicalSingleCombatTask(SingleCombatTask):
 
     def normalize_action(self, env, agent_id, action):
         """Convert high-level action into low-level action.
+
+        Within `normalize_actions`, the low-level policy is not run here: the returned array is filled in place
+        by a single forward pass over all agents.
         """
         if self.use_baseline and agent_id in env.enm_ids:
             action = self.baseline_agent.get_action(env.agents[agent_id])
@@ -229,23 +230,56 @@ class HierarchicalSingleCombatTask(SingleCombatTask):
             input_obs[2] = self.norm_delta_velocity[action[2]]
             # (2) ego info
             input_obs[3:12] = raw_obs[:9]
-            input_obs = np.expand_dims(input_obs, axis=0)
-            # output low-level action
-            _action, _rnn_states = self.lowlevel_policy(input_obs, self._inner_rnn_states[agent_id])
-            action = _action.detach().cpu().numpy().squeeze(0)
-            self._inner_rnn_states[agent_id] = _rnn_states.detach().cpu().numpy()
-            # normalize low-level action
             norm_act = np.zeros(4)
-            norm_act[0] = action[0] / 20 - 1.
-            norm_act[1] = action[1] / 20 - 1.
-            norm_act[2] = action[2] / 20 - 1.
-            norm_act[3] = action[3] / 58 + 0.4
+            if self._lowlevel_batch is not None:
+                self._lowlevel_batch.append((agent_id, input_obs, norm_act))
+            else:
+                norm_act[:] = self.lowlevel_forward([agent_id], np.expand_dims(input_obs, axis=0))[0]
             return norm_act
 
+    def normalize_actions(self, env, actions: dict) -> dict:
+        """Convert high-level actions of all agents into low-level actions, with one low-level policy forward pass.
+        """
+        self._lowlevel_batch = []
+        try:
+            norm_acts = BaseTask.normalize_actions(self, env, actions)
+            if len(self._lowlevel_batch) > 0:
+                agent_ids, input_obs, outputs = zip(*self._lowlevel_batch)
+                norm_act = self.lowlevel_forward(agent_ids, np.array(input_obs))
+                for output, act in zip(outputs, norm_act):
+                    output[:] = act
+        finally:
+            self._lowlevel_batch = None
+        return norm_acts
+
+    def lowlevel_forward(self, agent_ids, input_obs: np.ndarray) -> np.ndarray:
+        """Run the low-level policy on agents `agent_ids`, and update their `_inner_rnn_states`.
+
+        Args:
+            agent_ids (list): agents whose low-level inputs are stacked in `input_obs`
+            input_obs (np.ndarray): low-level inputs, shape (len(agent_ids), 12)
+
+        Returns:
+            (np.ndarray): normalized low-level actions, shape (len(agent_ids), 4)
+        """
+        index = [self._inner_rnn_index[agent_id] for agent_id in agent_ids]
+        action, self._inner_rnn_states[index] = self.lowlevel_policy(input_obs, self._inner_rnn_states[index])
+        # normalize low-level action
+        norm_act = np.zeros((len(index), 4))
+        norm_act[:, :3] = action[:, :3] / 20 - 1.
+        norm_act[:, 3] = action[:, 3] / 58 + 0.4
+        return norm_act
+
+    def reset_lowlevel(self, env):
+        """Reset low-level policy rnn states, stored as one array of shape (num_agents, 1, 128)."""
+        self._inner_rnn_index = {agent_id: index for index, agent_id in enumerate(env.agents.keys())}
+        self._inner_rnn_states = np.zeros((len(env.agents), 1, 128), dtype=np.float32)
+        self._lowlevel_batch = None
+
     def reset(self, env):
         """Task-specific reset, include reward function reset.
         """
-        self._inner_rnn_states = {agent_id: np.zeros((1, 1, 128)) for agent_id in env.agents.keys()}
+        self.reset_lowlevel(env)
         return super().reset(env)
 
 
@@ -269,10 +303,7 @@ class StraightFlyAgent:
 
 class BaselineAgent:
     def __init__(self) -> None:
-        self.model_path = get_root_dir() + '/model/baseline_model.pt'
-        self.actor = BaselineActor()
-        self.actor.load_state_dict(torch.load(self.model_path, map_location=torch.device('cpu')))
-        self.actor.eval()
+        self.actor = load_baseline_actor('baseline_model')
         self.state_var = [
             c.delta_altitude,                   #  0. delta_h   (unit: m)
             c.delta_heading,                    #  1. delta_heading  (unit: °)
@@ -322,8 +353,9 @@ class BaselineAgent:
     def get_action(self, sim: AircraftSimulator):
         delta_value = self.set_delta_value(sim)
         observation = self.get_observation(sim, delta_value)
-        _action, self.rnn_states = self.actor(observation, self.rnn_states)
-        action = _action.detach().cpu().numpy().squeeze()
+        _action, _rnn_states = self.actor(observation, self.rnn_states)
+        action = _action.squeeze()
+        self.rnn_states = _rnn_states
         return self.normalize_action(action)
 
 
@@ -396,9 +428,7 @@ class ManeuverAgent(BaselineAgent):
 
 class DodgeMissileAgent:
     def __init__(self) -> None:
-        self.model_path = get_root_dir() + '/model/dodge_missile_model.pt'
-        self.actor = BaselineActor(input_dim=21, use_mlp_actlayer=True)
-        self.actor.load_state_dict(torch.load(self.model_path, map_location=torch.device('cpu')))
+        self.actor = load_baseline_actor('dodge_missile_model', input_dim=21, use_mlp_actlayer=True)
         self.state_var = [
             c.position_long_gc_deg,             # 0. lontitude  (unit: °)
             c.position_lat_geod_deg,            # 1. latitude   (unit: °)
@@ -462,8 +492,9 @@ class DodgeMissileAgent:
 
     def get_action(self, sim: AircraftSimulator):
         obs = self.get_observation(sim)
-        _action, self.rnn_states = self.actor(obs, self.rnn_states)
-        action = _action.squeeze().detach().cpu().numpy().squeeze()
+        _action, _rnn_states = self.actor(obs, self.rnn_states)
+        action = _action.squeeze()
+        self.rnn_states = _rnn_states
         return action
 
     def reset(self):
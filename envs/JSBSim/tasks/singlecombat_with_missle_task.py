@@ -5,7 +5,7 @@ from collections import deque
 from .singlecombat_task import SingleCombatTask, HierarchicalSingleCombatTask
 from ..reward_functions import AltitudeReward, PostureReward, MissilePostureReward, EventDrivenReward, ShootPenaltyReward
 from ..core.simulatior import MissileSimulator
-from ..utils.utils import LLA2NEU, get_AO_TA_R
+from ..utils.utils import get_AO_TA_R
 
 
 class SingleCombatDodgeMissileTask(SingleCombatTask):
@@ -62,8 +62,8 @@ class SingleCombatDodgeMissileTask(SingleCombatTask):
         ego_obs_list = np.array(env.agents[agent_id].get_property_values(self.state_var))
         enm_obs_list = np.array(env.agents[agent_id].enemies[0].get_property_values(self.state_var))
         # (0) extract feature: [north(km), east(km), down(km), v_n(mh), v_e(mh), v_d(mh)]
-        ego_cur_ned = LLA2NEU(*ego_obs_list[:3], env.center_lon, env.center_lat, env.center_alt)
-        enm_cur_ned = LLA2NEU(*enm_obs_list[:3], env.center_lon, env.center_lat, env.center_alt)
+        ego_cur_ned = env.agents[agent_id].get_position()
+        enm_cur_ned = env.agents[agent_id].enemies[0].get_position()
         ego_feature = np.array([*ego_cur_ned, *ego_obs_list[6:9]])
         enm_feature = np.array([*enm_cur_ned, *enm_obs_list[6:9]])
         # (1) ego info normalization
@@ -151,7 +151,7 @@ class HierarchicalSingleCombatDodgeMissileTask(HierarchicalSingleCombatTask, Sin
         return HierarchicalSingleCombatTask.normalize_action(self, env, agent_id, action)
 
     def reset(self, env):
-        self._inner_rnn_states = {agent_id: np.zeros((1, 1, 128)) for agent_id in env.agents.keys()}
+        self.reset_lowlevel(env)
         return SingleCombatDodgeMissileTask.reset(self, env)
 
     def step(self, env):
@@ -227,7 +227,7 @@ class HierarchicalSingleCombatShootTask(HierarchicalSingleCombatTask, SingleComb
         return HierarchicalSingleCombatTask.normalize_action(self, env, agent_id, action[:-1].astype(np.int32))
 
     def reset(self, env):
-        self._inner_rnn_states = {agent_id: np.zeros((1, 1, 128)) for agent_id in env.agents.keys()}
+        self.reset_lowlevel(env)
         SingleCombatShootMissileTask.reset(self, env)
 
     def step(self, env):
@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 from gym import spaces
 from typing import List, Tuple
@@ -60,6 +61,33 @@ class BaseTask(ABC):
         for reward_function in self.reward_functions:
             reward_function.reset(self, env)
 
+    def save_state(self) -> dict:
+        """Capture the task bookkeeping, including reward functions and termination conditions.
+
+        Config, spaces and baseline actors (whose `__deepcopy__` returns themselves) are shared with the snapshot
+        instead of copied.
+
+        Returns:
+            (dict): task state
+        """
+        return copy.deepcopy(self.__dict__, self._shared_memo())
+
+    def restore_state(self, state: dict):
+        """Restore the task bookkeeping captured by `save_state`.
+
+        Args:
+            state (dict): task state returned by `save_state`
+        """
+        self.__dict__.update(copy.deepcopy(state, self._shared_memo()))
+
+    def _shared_memo(self) -> dict:
+        shared = [self.config]
+        for value in self.__dict__.values():
+            for obj in [value, *getattr(value, '__dict__', {}).values()]:
+                if isinstance(obj, spaces.Space):
+                    shared.append(obj)
+        return {id(obj): obj for obj in shared}
+
     def step(self, env):
         """ Task-specific step
 
@@ -120,3 +148,11 @@ class BaseTask(ABC):
         """Normalize action to be consistent with action space.
         """
         return np.array(action)
+
+    def normalize_actions(self, env, actions: dict) -> dict:
+        """Normalize actions of all agents, see `normalize_action`.
+
+        Args:
+            actions (dict): the agents' actions, each key corresponds to an agent_id
+        """
+        return {agent_id: self.normalize_action(env, agent_id, actions[agent_id]) for agent_id in env.agents.keys()}
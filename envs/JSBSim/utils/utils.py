@@ -1,7 +1,8 @@
 import os
+import math
 import yaml
-import pymap3d
 import numpy as np
+from functools import lru_cache
 
 
 def parse_config(filename):
@@ -26,6 +27,176 @@ def get_root_dir():
     return os.path.join(os.path.split(os.path.realpath(__file__))[0], '..')
 
 
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+WGS84_EP2 = (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+
+
+def geodetic2ecef(lla):
+    """Convert geodetic coordinates to ECEF.
+
+    Args:
+        lla (np.ndarray): (3,) or (N, 3) array of lontitude(°), latitude(°), altitude(m)
+
+    Returns:
+        (np.ndarray): (3,) or (N, 3) array of ECEF (x, y, z), unit: m
+    """
+    lla = np.asarray(lla, dtype=np.float64)
+    lon, lat, alt = lla.T
+    lon, lat = np.radians(lon), np.radians(lat)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    ecef = np.empty(lla.shape)
+    ecef[..., 0] = (N + alt) * cos_lat * np.cos(lon)
+    ecef[..., 1] = (N + alt) * cos_lat * np.sin(lon)
+    ecef[..., 2] = (N * (1 - WGS84_E2) + alt) * sin_lat
+    return ecef
+
+
+def ecef2geodetic(ecef):
+    """Convert ECEF to geodetic coordinates with the closed-form solution of Heikkinen (1982).
+
+    Args:
+        ecef (np.ndarray): (3,) or (N, 3) array of ECEF (x, y, z), unit: m
+
+    Returns:
+        (np.ndarray): (3,) or (N, 3) array of lontitude(°), latitude(°), altitude(m)
+    """
+    ecef = np.asarray(ecef, dtype=np.float64)
+    x, y, z = ecef.T
+    a2, b2, e4 = WGS84_A ** 2, WGS84_B ** 2, WGS84_E2 ** 2
+    p2 = x ** 2 + y ** 2
+    p = np.sqrt(p2)
+    z2 = z ** 2
+    F = 54 * b2 * z2
+    G = p2 + (1 - WGS84_E2) * z2 - WGS84_E2 * (a2 - b2)
+    c = e4 * F * p2 / G ** 3
+    s = np.cbrt(1 + c + np.sqrt(c ** 2 + 2 * c))
+    k = s + 1 + 1 / s
+    P = F / (3 * k ** 2 * G ** 2)
+    Q = np.sqrt(1 + 2 * e4 * P)
+    r0 = -P * WGS84_E2 * p / (1 + Q) \
+        + np.sqrt(np.maximum(0.5 * a2 * (1 + 1 / Q) - P * (1 - WGS84_E2) * z2 / (Q * (1 + Q)) - 0.5 * P * p2, 0))
+    U = np.sqrt((p - WGS84_E2 * r0) ** 2 + z2)
+    V = np.sqrt((p - WGS84_E2 * r0) ** 2 + (1 - WGS84_E2) * z2)
+    z0 = b2 * z / (WGS84_A * V)
+    alt = U * (1 - b2 / (WGS84_A * V))
+    lla = np.empty(ecef.shape)
+    lla[..., 0] = np.degrees(np.arctan2(y, x))
+    lla[..., 1] = np.degrees(np.arctan2(z + WGS84_EP2 * z0, p))
+    lla[..., 2] = alt
+    return lla
+
+
+def _geodetic2ecef_scalar(lon, lat, alt):
+    # `math` twin of geodetic2ecef: NumPy ufuncs cost ~1us each on scalars, which dominates single-point calls
+    lon, lat = math.radians(lon), math.radians(lat)
+    sin_lat, cos_lat = math.sin(lat), math.cos(lat)
+    N = WGS84_A / math.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    return (N + alt) * cos_lat * math.cos(lon), (N + alt) * cos_lat * math.sin(lon), (N * (1 - WGS84_E2) + alt) * sin_lat
+
+
+def _ecef2geodetic_scalar(x, y, z):
+    # `math` twin of ecef2geodetic
+    a2, b2, e4 = WGS84_A ** 2, WGS84_B ** 2, WGS84_E2 ** 2
+    p2 = x ** 2 + y ** 2
+    p = math.sqrt(p2)
+    z2 = z ** 2
+    F = 54 * b2 * z2
+    G = p2 + (1 - WGS84_E2) * z2 - WGS84_E2 * (a2 - b2)
+    c = e4 * F * p2 / G ** 3
+    s = (1 + c + math.sqrt(c ** 2 + 2 * c)) ** (1 / 3)
+    k = s + 1 + 1 / s
+    P = F / (3 * k ** 2 * G ** 2)
+    Q = math.sqrt(1 + 2 * e4 * P)
+    r0 = -P * WGS84_E2 * p / (1 + Q) \
+        + math.sqrt(max(0.5 * a2 * (1 + 1 / Q) - P * (1 - WGS84_E2) * z2 / (Q * (1 + Q)) - 0.5 * P * p2, 0))
+    U = math.sqrt((p - WGS84_E2 * r0) ** 2 + z2)
+    V = math.sqrt((p - WGS84_E2 * r0) ** 2 + (1 - WGS84_E2) * z2)
+    z0 = b2 * z / (WGS84_A * V)
+    alt = U * (1 - b2 / (WGS84_A * V))
+    return math.degrees(math.atan2(y, x)), math.degrees(math.atan2(z + WGS84_EP2 * z0, p)), alt
+
+
+class NEUConverter:
+    """Vectorized conversion between Geodetic and NEU Coordinate System w.r.t. a fixed observer.
+
+    The observer's ECEF position and the ECEF->NEU rotation matrix are computed once,
+    so every conversion is a closed-form, batched NumPy evaluation over (N, 3) arrays.
+    Single (3,) points and small batches take a `math` scalar path, where NumPy's per-call overhead dominates.
+
+    Args:
+        lon0, lat0, alt0 (float): observer geodetic lontitude(°), latitude(°), altitude(m)
+    """
+
+    SMALL_BATCH = 4
+
+    def __init__(self, lon0=120.0, lat0=60.0, alt0=0.0):
+        self.origin = (lon0, lat0, alt0)
+        self.ecef0 = geodetic2ecef(self.origin)
+        lon0, lat0 = np.radians(lon0), np.radians(lat0)
+        sin_lon, cos_lon, sin_lat, cos_lat = np.sin(lon0), np.cos(lon0), np.sin(lat0), np.cos(lat0)
+        # rows are the North, East, Up unit vectors expressed in ECEF
+        self.rotation = np.array([
+            [-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat],
+            [-sin_lon, cos_lon, 0.0],
+            [cos_lat * cos_lon, cos_lat * sin_lon, sin_lat],
+        ])
+        # python float copies for the scalar path
+        self._ecef0 = self.ecef0.tolist()
+        self._rotation = self.rotation.tolist()
+
+    def _lla2neu_scalar(self, lon, lat, alt):
+        x, y, z = _geodetic2ecef_scalar(lon, lat, alt)
+        dx, dy, dz = x - self._ecef0[0], y - self._ecef0[1], z - self._ecef0[2]
+        return [r[0] * dx + r[1] * dy + r[2] * dz for r in self._rotation]
+
+    def _neu2lla_scalar(self, n, e, u):
+        (rn0, rn1, rn2), (re0, re1, re2), (ru0, ru1, ru2) = self._rotation
+        return _ecef2geodetic_scalar(n * rn0 + e * re0 + u * ru0 + self._ecef0[0],
+                                     n * rn1 + e * re1 + u * ru1 + self._ecef0[1],
+                                     n * rn2 + e * re2 + u * ru2 + self._ecef0[2])
+
+    def lla2neu(self, lla):
+        """
+        Args:
+            lla (np.ndarray): (3,) or (N, 3) array of lontitude(°), latitude(°), altitude(m)
+
+        Returns:
+            (np.ndarray): (3,) or (N, 3) array of (North, East, Up), unit: m
+        """
+        lla = np.asarray(lla, dtype=np.float64)
+        if lla.ndim == 1:
+            return np.array(self._lla2neu_scalar(*lla.tolist()))
+        if len(lla) <= self.SMALL_BATCH:
+            return np.array([self._lla2neu_scalar(*point) for point in lla.tolist()]).reshape(lla.shape)
+        return (geodetic2ecef(lla) - self.ecef0) @ self.rotation.T
+
+    def neu2lla(self, neu):
+        """
+        Args:
+            neu (np.ndarray): (3,) or (N, 3) array of (North, East, Up), unit: m
+
+        Returns:
+            (np.ndarray): (3,) or (N, 3) array of lontitude(°), latitude(°), altitude(m)
+        """
+        neu = np.asarray(neu, dtype=np.float64)
+        if neu.ndim == 1:
+            return np.array(self._neu2lla_scalar(*neu.tolist()))
+        if len(neu) <= self.SMALL_BATCH:
+            return np.array([self._neu2lla_scalar(*point) for point in neu.tolist()]).reshape(neu.shape)
+        return ecef2geodetic(neu @ self.rotation + self.ecef0)
+
+
+@lru_cache(maxsize=16)
+def get_neu_converter(lon0=120.0, lat0=60.0, alt0=0.0):
+    """Get the (cached) NEUConverter of a battle field center."""
+    return NEUConverter(lon0, lat0, alt0)
+
+
 def LLA2NEU(lon, lat, alt, lon0=120.0, lat0=60.0, alt0=0):
     """Convert from Geodetic Coordinate System to NEU Coordinate System.
 
@@ -36,8 +207,9 @@ def LLA2NEU(lon, lat, alt, lon0=120.0, lat0=60.0, alt0=0):
     Returns:
         (np.array): (North, East, Up), unit: m
     """
-    n, e, d = pymap3d.geodetic2ned(lat, lon, alt, lat0, lon0, alt0)
-    return np.array([n, e, -d])
+    if np.ndim(lon) == 0 and np.ndim(lat) == 0 and np.ndim(alt) == 0:
+        return get_neu_converter(lon0, lat0, alt0).lla2neu(np.array([lon, lat, alt], dtype=np.float64))
+    return get_neu_converter(lon0, lat0, alt0).lla2neu(np.stack(np.broadcast_arrays(lon, lat, alt), axis=-1)).T
 
 
 def NEU2LLA(n, e, u, lon0=120.0, lat0=60.0, alt0=0):
@@ -50,8 +222,9 @@ def NEU2LLA(n, e, u, lon0=120.0, lat0=60.0, alt0=0):
     Returns:
         (np.array): (lon, lat, alt), unit: °, °, m
     """
-    lat, lon, h = pymap3d.ned2geodetic(n, e, -u, lat0, lon0, alt0)
-    return np.array([lon, lat, h])
+    if np.ndim(n) == 0 and np.ndim(e) == 0 and np.ndim(u) == 0:
+        return get_neu_converter(lon0, lat0, alt0).neu2lla(np.array([n, e, u], dtype=np.float64))
+    return get_neu_converter(lon0, lat0, alt0).neu2lla(np.stack(np.broadcast_arrays(n, e, u), axis=-1)).T
 
 
 def get_AO_TA_R(ego_feature, enm_feature, return_side=False):
@@ -2,11 +2,15 @@
 A simplified version from OpenAI Baselines code to work with gym.env parallelization.
 """
 import os
+import time
+import logging
 import contextlib
 import numpy as np
 from abc import ABC, abstractmethod
-from multiprocessing import Pipe, Process
-from multiprocessing.connection import Connection
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
 
 
 class CloudpickleWrapper(object):
@@ -45,6 +49,22 @@ def clear_mpi_env_vars():
         os.environ.update(removed_environment)
 
 
+# heavy modules imported once by the 'forkserver' server, workers forked from it do not import them again
+FORKSERVER_PRELOAD = ['numpy', 'torch', 'gym', 'jsbsim', 'envs.JSBSim.envs']
+
+
+def get_context(context=None):
+    """Get the multiprocessing context of start method `context` ('fork', 'spawn' or 'forkserver').
+    Defaults to the platform default start method.
+
+    The 'forkserver' server preloads `FORKSERVER_PRELOAD` when it is started (by the first vectorized env using it).
+    """
+    ctx = mp.get_context(context)
+    if ctx.get_start_method() == 'forkserver':
+        ctx.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return ctx
+
+
 class VecEnv(ABC):
     """
     An abstract asynchronous, vectorized environment.
@@ -228,19 +248,77 @@ def worker(remote: Connection, parent_remote: Connection, env_fn_wrappers):
             env.close()
 
 
+def autotune_in_series(vecenv_cls, env_fns, num_cpus=None, num_steps=20, batch_size=None, context=None):
+    """Pick the number of environments to run in series in a single process, which maximizes the throughput
+    of a vectorized env on the current machine, and log the chosen layout.
+
+    A single env is stepped in current process to measure the per-env step cost `t_env`, and in a probe
+    subprocess to measure the cost of a step round trip, whose IPC part (messages of real step data) is `t_ipc`.
+    Then the time of a vectorized step running `in_series` envs per process is
+    modelled as `max(in_series, num_envs / num_cpus) * t_env + num_envs / in_series * t_ipc`.
+
+    Args:
+        vecenv_cls (type): subprocess vectorized env class to tune.
+        env_fns: functions that create environments, as passed to `vecenv_cls`.
+        num_cpus (int, optional): number of available CPUs. Defaults to the CPU affinity of current process.
+        num_steps (int, optional): number of timed steps of the local and probe envs. Defaults to 20.
+        batch_size (int, optional): if set, `in_series` must also divide it (see AsyncSubprocVecEnv).
+        context (str, optional): multiprocessing start method of the probe subprocess.
+
+    Returns:
+        in_series (int)
+    """
+    nenvs = len(env_fns)
+    num_cpus = num_cpus or len(os.sched_getaffinity(0))
+    probe = vecenv_cls(env_fns[:1], context=context)
+    probe.reset()
+    actions = np.array([[probe.action_space.sample() for _ in range(probe.num_agents)]])
+    step_times = []
+    for _ in range(num_steps):
+        start = time.perf_counter()
+        probe.step(actions)
+        step_times.append(time.perf_counter() - start)
+    probe.close()
+    env = env_fns[0]()
+    env.reset()
+    env_times = []
+    for _ in range(num_steps):
+        start = time.perf_counter()
+        done = env.step(actions[0])[-2]
+        env_times.append(time.perf_counter() - start)
+        if np.all(list(done.values()) if isinstance(done, dict) else done):
+            env.reset()
+    env.close()
+    t_env = np.median(env_times)
+    t_ipc = max(np.median(step_times) - t_env, 0.)
+
+    candidates = [k for k in range(1, nenvs + 1) if nenvs % k == 0 and (batch_size is None or batch_size % k == 0)]
+    durations = [max(k, nenvs / num_cpus) * t_env + nenvs / k * t_ipc for k in candidates]
+    # fewer processes on ties, e.g. when IPC is too cheap to be measured
+    in_series = min(zip(durations, candidates), key=lambda x: (x[0], -x[1]))[1]
+    logging.info(f"{vecenv_cls.__name__} layout: {nenvs // in_series} processes x {in_series} envs in series "
+                 f"(env step {t_env * 1e3:.3f} ms, IPC round-trip {t_ipc * 1e3:.3f} ms, {num_cpus} CPUs, "
+                 f"estimated {nenvs / np.min(durations):.1f} env steps/s)")
+    return in_series
+
+
 class SubprocVecEnv(VecEnv):
     """
     VecEnv that runs multiple environments in parallel in subproceses and communicates with them via pipes.
     Recommended to use when num_envs > 1 and step() can be a bottleneck.
     """
-    def __init__(self, env_fns, context='spawn', in_series=1):
+    def __init__(self, env_fns, context=None, in_series=1):
         """
         Args:
             env_fns: iterable of callables - functions that create environments to run in subprocesses. Need to be cloud-pickleable
-            context (str, optional): Defaults to 'spawn'.
-            in_series (int, optional): number of environments to run in series in a single process. Defaults to 1.
+            context (str, optional): multiprocessing start method, 'fork', 'spawn' or 'forkserver' (see `get_context`).
+                Defaults to the platform default start method.
+            in_series (int or 'auto', optional): number of environments to run in series in a single process. Defaults to 1.
                 (e.g. when len(env_fns) == 12 and in_series == 3, it will run 4 processes, each running 3 envs in series)
+                If 'auto', it is picked by `autotune_in_series` to maximize throughput on current machine.
         """
+        if in_series == 'auto':
+            in_series = autotune_in_series(type(self), env_fns, context=context)
         self.waiting = False
         self.closed = False
         self.in_series = in_series
@@ -248,23 +326,49 @@ class SubprocVecEnv(VecEnv):
         assert nenvs % in_series == 0, "Number of envs must be divisible by number of envs to run in series"
         self.nremotes = nenvs // in_series
         env_fns = np.array_split(env_fns, self.nremotes)
+        self._start_workers(worker, env_fns, context)
+
+        self.remotes[0].send(('get_spaces', None))
+        observation_space, action_space = self.remotes[0].recv().x
+        super().__init__(nenvs, observation_space, action_space)
+
+        self.remotes[0].send(('get_num_agents', None))
+        self.num_agents = self.remotes[0].recv().x
+
+    def _start_workers(self, target, env_fns, context, worker_args=None):
+        """Start a subprocess running `target` for each group of `env_fns`, and wait for all of them to be ready.
+        Per-worker startup time (from process start to environments built) is stored in `self.startup_times`.
+        """
+        ctx = get_context(context)
+        worker_args = worker_args or [()] * self.nremotes
         # create Pipe connections to send/recv data from subprocesses,
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(self.nremotes)])
-        self.ps = [Process(target=worker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(self.nremotes)])
+        self.ps = [ctx.Process(target=target, args=(work_remote, remote, CloudpickleWrapper(env_fn), *args))
+                   for (work_remote, remote, env_fn, args) in zip(self.work_remotes, self.remotes, env_fns, worker_args)]
+        start = time.perf_counter()
+        launch_times = []
         for p in self.ps:
             p.daemon = True  # if the main process crashes, we should not cause things to hang
+            launch_times.append(time.perf_counter())
             with clear_mpi_env_vars():
                 p.start()
         for remote in self.work_remotes:
             remote.close()
 
-        self.remotes[0].send(('get_spaces', None))
-        observation_space, action_space = self.remotes[0].recv().x
-        super().__init__(nenvs, observation_space, action_space)
-
-        self.remotes[0].send(('get_num_agents', None))
-        self.num_agents = self.remotes[0].recv().x
+        # workers reply once their environments are built
+        for remote in self.remotes:
+            remote.send(('get_num_agents', None))
+        self.startup_times = np.zeros(self.nremotes)
+        remote_ids = {remote: remote_id for remote_id, remote in enumerate(self.remotes)}
+        pending = list(self.remotes)
+        while pending:
+            for remote in wait(pending):
+                remote.recv()
+                self.startup_times[remote_ids[remote]] = time.perf_counter() - launch_times[remote_ids[remote]]
+                pending.remove(remote)
+        logging.info(f"{type(self).__name__}: started {self.nremotes} workers ({ctx.get_start_method()}) "
+                     f"in {time.perf_counter() - start:.2f} s, worker startup min {self.startup_times.min():.2f} s, "
+                     f"mean {self.startup_times.mean():.2f} s, max {self.startup_times.max():.2f} s")
 
     def step_async(self, actions):
         self._assert_not_closed()
@@ -320,6 +424,89 @@ class SubprocVecEnv(VecEnv):
         return [v__ for v_ in v for v__ in v_]
 
 
+class AsyncSubprocVecEnv(SubprocVecEnv):
+    """
+    VecEnv that runs multiple environments in parallel in subproceses like SubprocVecEnv, but `step_wait` only
+    waits for the first `batch_size` environments to be ready (EnvPool-style), and returns their env ids,
+    so that slow resets or straggler steps of some environments do not stall the whole batch.
+
+    Usage:
+        obss = envs.reset()                         # synchronous, all environments
+        env_ids = np.arange(envs.num_envs)
+        while True:
+            actions = ...                           # actions of environments `env_ids` only
+            envs.step_async(actions, env_ids)
+            obss, rewards, dones, infos, env_ids = envs.step_wait()
+    """
+    def __init__(self, env_fns, batch_size=None, context=None, in_series=1):
+        """
+        Args:
+            env_fns: iterable of callables - functions that create environments to run in subprocesses. Need to be cloud-pickleable
+            batch_size (int, optional): number of environments returned by `step_wait`. Defaults to len(env_fns).
+                Must be a multiple of `in_series`, as environments of a subprocess are stepped together.
+            context (str, optional): multiprocessing start method, 'fork', 'spawn' or 'forkserver' (see `get_context`).
+                Defaults to the platform default start method.
+            in_series (int or 'auto', optional): number of environments to run in series in a single process. Defaults to 1.
+        """
+        if in_series == 'auto':
+            in_series = autotune_in_series(type(self), env_fns, batch_size=batch_size, context=context)
+        super().__init__(env_fns, context, in_series)
+        self.batch_size = self.num_envs if batch_size is None else batch_size
+        assert 0 < self.batch_size <= self.num_envs and self.batch_size % in_series == 0, \
+            "Batch size must be a multiple of number of envs to run in series, and no more than number of envs"
+        self.remote_ids = {remote: remote_id for remote_id, remote in enumerate(self.remotes)}
+        self.pending = np.zeros(self.nremotes, dtype=bool)
+
+    def step_async(self, actions, env_ids=None):
+        """Send actions to the environments `env_ids` (all environments by default), which must not be stepping."""
+        self._assert_not_closed()
+        env_ids = np.arange(self.num_envs) if env_ids is None else np.asarray(env_ids)
+        remote_ids = env_ids[::self.in_series] // self.in_series
+        assert len(env_ids) == len(remote_ids) * self.in_series and not np.any(self.pending[remote_ids]), \
+            "Envs of a subprocess must be stepped together, and only once their previous step is received"
+        for remote_id, action in zip(remote_ids, np.array_split(actions, len(remote_ids))):
+            self.remotes[remote_id].send(('step', action))
+        self.pending[remote_ids] = True
+        self.waiting = True
+
+    def step_wait(self):
+        """Return the results of the first `batch_size` (or all the stepping if fewer) environments to be ready,
+        as (obss, rewards, dones, infos, env_ids)."""
+        self._assert_not_closed()
+        num_remotes = min(self.batch_size // self.in_series, int(np.sum(self.pending)))
+        remote_ids, results = [], []
+        while len(remote_ids) < num_remotes:
+            for remote in wait([self.remotes[remote_id] for remote_id in np.flatnonzero(self.pending)]):
+                if len(remote_ids) == num_remotes:
+                    break
+                remote_ids.append(self.remote_ids[remote])
+                results.append(remote.recv())
+                self.pending[remote_ids[-1]] = False
+        self.waiting = bool(np.any(self.pending))
+        # keep env ids sorted, so that results do not depend on the order envs get ready in
+        order = np.argsort(remote_ids)
+        remote_ids, results = np.array(remote_ids)[order], [results[i] for i in order]
+        results = self._flatten_series(results)  # [[tuple] * in_series] * nremotes => [tuple] * nenvs
+        obss, rewards, dones, infos = zip(*results)
+        env_ids = (remote_ids[:, None] * self.in_series + np.arange(self.in_series)).reshape(-1)
+        return self._flatten(obss), self._flatten(rewards), self._flatten(dones), np.array(infos), env_ids
+
+    def reset(self):
+        self._drain()
+        return super().reset()
+
+    def close_extras(self):
+        self._drain()
+        super().close_extras()
+
+    def _drain(self):
+        """Discard results of environments still stepping."""
+        for remote_id in np.flatnonzero(self.pending):
+            self.remotes[remote_id].recv()
+        self.pending[:] = False
+        self.waiting = False
+
+
 class ShareVecEnv(VecEnv):
     """
     Multi-agent version of VevEnv, that is, support `share_observation_space` interface.
@@ -418,7 +605,9 @@ def shareworker(remote: Connection, parent_remote: Connection, env_fn_wrappers):
 
 
 class ShareSubprocVecEnv(SubprocVecEnv, ShareVecEnv):
-    def __init__(self, env_fns, context='spawn', in_series=1):
+    def __init__(self, env_fns, context=None, in_series=1):
+        if in_series == 'auto':
+            in_series = autotune_in_series(type(self), env_fns, context=context)
         self.waiting = False
         self.closed = False
         self.in_series = in_series
@@ -426,16 +615,7 @@ class ShareSubprocVecEnv(SubprocVecEnv, ShareVecEnv):
         assert nenvs % in_series == 0, "Number of envs must be divisible by number of envs to run in series"
         self.nremotes = nenvs // in_series
         env_fns = np.array_split(env_fns, self.nremotes)
-        # create Pipe connections to send/recv data from subprocesses,
-        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(self.nremotes)])
-        self.ps = [Process(target=shareworker, args=(work_remote, remote, CloudpickleWrapper(env_fn)))
-                   for (work_remote, remote, env_fn) in zip(self.work_remotes, self.remotes, env_fns)]
-        for p in self.ps:
-            p.daemon = True  # if the main process crashes, we should not cause things to hang
-            with clear_mpi_env_vars():
-                p.start()
-        for remote in self.work_remotes:
-            remote.close()
+        self._start_workers(shareworker, env_fns, context)
 
         self.remotes[0].send(('get_spaces', None))
         observation_space, share_observation_space, action_space = self.remotes[0].recv().x
@@ -460,3 +640,212 @@ class ShareSubprocVecEnv(SubprocVecEnv, ShareVecEnv):
         results = self._flatten_series(results)
         obs, share_obs = zip(*results)
         return self._flatten(obs), self._flatten(share_obs)
+
+
+def shmemworker(remote: Connection, parent_remote: Connection, env_fn_wrappers, start: int):
+    """Maintain environment instances in subprocess, exchanging data with parent-process
+    through shared memory. Only commands (and the small info dicts) go through multiprocessing.Pipe.
+
+    Args:
+        remote (Connection): used for current subprocess to send/receive data.
+        parent_remote (Connection): used for mainprocess to send/receive data. [Need to be closed in subprocess!]
+        env_fn_wrappers (method): functions to create gym.Env instance.
+        start (int): index of the first env of this subprocess in the shared buffers.
+    """
+    def write_obs(i, obs):
+        if 'share_obs' in buffers:
+            obs, share_obs = obs
+            buffers['share_obs'][i] = share_obs
+        buffers['obs'][i] = obs
+
+    def step_env(i, env, action):
+        results = env.step(action)
+        reward, done, info = results[-3:]
+        buffers['rewards'][i] = reward
+        buffers['dones'][i] = done
+        if 'bool' in done.__class__.__name__:
+            done = bool(done)
+        elif isinstance(done, (list, tuple, np.ndarray)):
+            done = np.all(done)
+        elif isinstance(done, dict):
+            done = np.all(list(done.values()))
+        else:
+            raise NotImplementedError("Unexpected type of done!")
+        write_obs(i, env.reset() if done else results[:-3] if len(results) > 4 else results[0])
+        return info
+
+    parent_remote.close()
+    envs = [env_fn_wrapper() for env_fn_wrapper in env_fn_wrappers.x]
+    shms, buffers = {}, {}
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                actions = buffers['actions']
+                remote.send([step_env(i, env, actions[i].copy()) for i, env in enumerate(envs)])
+            elif cmd == 'reset':
+                for i, env in enumerate(envs):
+                    write_obs(i, env.reset())
+                remote.send(None)
+            elif cmd == 'attach':
+                for key, (name, shape, dtype) in data.items():
+                    buffers.pop(key, None)
+                    if key in shms:
+                        shms.pop(key).close()
+                    shms[key] = SharedMemory(name=name)
+                    buffers[key] = np.ndarray(shape, dtype=dtype, buffer=shms[key].buf)[start:start + len(envs)]
+                remote.send(None)
+            elif cmd == 'close':
+                remote.close()
+                break
+            elif cmd == 'get_spaces':
+                remote.send(CloudpickleWrapper((envs[0].observation_space,
+                                                getattr(envs[0], "share_observation_space", None),
+                                                envs[0].action_space)))
+            elif cmd == 'get_num_agents':
+                remote.send(CloudpickleWrapper((getattr(envs[0], "num_agents", 1))))
+            else:
+                raise NotImplementedError
+    except KeyboardInterrupt:
+        print('ShmemVecEnv worker: got KeyboardInterrupt')
+    finally:
+        for env in envs:
+            env.close()
+        buffers.clear()
+        for shm in shms.values():
+            shm.close()
+
+
+class ShmemVecEnv(SubprocVecEnv):
+    """
+    VecEnv that runs multiple environments in parallel in subproceses, like SubprocVecEnv, but exchanges
+    actions/observations/rewards/dones through preallocated shared memory instead of pickling them through pipes.
+
+    NOTE: arrays returned by `reset` and `step_wait` are views of the shared buffers (zero-copy),
+    they are overwritten by the next `reset`/`step` call, copy them if they need to outlive it.
+    Buffers follow the multi-agent layout of JSBSim envs: obs (num_envs, num_agents, *obs_shape),
+    rewards & dones (num_envs, num_agents, 1).
+    """
+    worker = staticmethod(shmemworker)
+
+    def __init__(self, env_fns, context=None, in_series=1):
+        """
+        Args:
+            env_fns: iterable of callables - functions that create environments to run in subprocesses. Need to be cloud-pickleable
+            context (str, optional): multiprocessing start method, 'fork', 'spawn' or 'forkserver' (see `get_context`).
+                Defaults to the platform default start method.
+            in_series (int or 'auto', optional): number of environments to run in series in a single process. Defaults to 1.
+                (e.g. when len(env_fns) == 12 and in_series == 3, it will run 4 processes, each running 3 envs in series)
+                If 'auto', it is picked by `autotune_in_series` to maximize throughput on current machine.
+        """
+        if in_series == 'auto':
+            in_series = autotune_in_series(type(self), env_fns, context=context)
+        self.waiting = False
+        self.closed = False
+        self.in_series = in_series
+        nenvs = len(env_fns)
+        assert nenvs % in_series == 0, "Number of envs must be divisible by number of envs to run in series"
+        self.nremotes = nenvs // in_series
+        env_fns = np.array_split(env_fns, self.nremotes)
+        starts = np.cumsum([0] + [len(env_fn) for env_fn in env_fns[:-1]])
+        # subprocesses must share the resource tracker of the main process, otherwise each of them
+        # would unlink the shared buffers it attached to when exiting
+        resource_tracker.ensure_running()
+        self._start_workers(self.worker, env_fns, context, [(int(start),) for start in starts])
+
+        self.remotes[0].send(('get_spaces', None))
+        observation_space, share_observation_space, action_space = self.remotes[0].recv().x
+        self._init_spaces(nenvs, observation_space, share_observation_space, action_space)
+
+        self.remotes[0].send(('get_num_agents', None))
+        self.num_agents = self.remotes[0].recv().x
+
+        self._shms, self._buffers = {}, {}
+        self._attach({key: ((nenvs, self.num_agents, *shape), dtype) for key, (shape, dtype) in self._buffer_specs().items()})
+
+    def _init_spaces(self, nenvs, observation_space, share_observation_space, action_space):
+        VecEnv.__init__(self, nenvs, observation_space, action_space)
+
+    def _buffer_specs(self):
+        return {
+            'obs': (self.observation_space.shape, np.float64),
+            'rewards': ((1,), np.float64),
+            'dones': ((1,), np.bool_),
+        }
+
+    def _attach(self, specs):
+        """(Re)allocate shared buffers and attach the subprocesses to them."""
+        for key, (shape, dtype) in specs.items():
+            self._release(key)
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            self._shms[key] = SharedMemory(create=True, size=size)
+            self._buffers[key] = np.ndarray(shape, dtype=dtype, buffer=self._shms[key].buf)
+        data = {key: (self._shms[key].name, shape, dtype) for key, (shape, dtype) in specs.items()}
+        for remote in self.remotes:
+            remote.send(('attach', data))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _release(self, key):
+        self._buffers.pop(key, None)
+        shm = self._shms.pop(key, None)
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # arrays handed out to the caller still map the segment, it is freed along with them
+            shm.unlink()
+
+    def step_async(self, actions):
+        self._assert_not_closed()
+        actions = np.asarray(actions)
+        buffer = self._buffers.get('actions')
+        if buffer is None or buffer.shape != actions.shape or buffer.dtype != actions.dtype:
+            self._attach({'actions': (actions.shape, actions.dtype)})
+        self._buffers['actions'][:] = actions
+        for remote in self.remotes:
+            remote.send(('step', None))
+        self.waiting = True
+
+    def step_wait(self):
+        self._assert_not_closed()
+        infos = self._flatten_series([remote.recv() for remote in self.remotes])
+        self.waiting = False
+        return self._buffers['obs'], self._buffers['rewards'], self._buffers['dones'], np.array(infos)
+
+    def reset(self):
+        self._assert_not_closed()
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for remote in self.remotes:
+            remote.recv()
+        return self._buffers['obs']
+
+    def close_extras(self):
+        super().close_extras()
+        for key in list(self._shms.keys()):
+            self._release(key)
+
+
+class ShareShmemVecEnv(ShmemVecEnv, ShareVecEnv):
+    """
+    Multi-agent version of ShmemVecEnv, that is, support `share_observation_space` interface.
+    """
+
+    def _init_spaces(self, nenvs, observation_space, share_observation_space, action_space):
+        ShareVecEnv.__init__(self, nenvs, observation_space, share_observation_space, action_space)
+
+    def _buffer_specs(self):
+        specs = super()._buffer_specs()
+        specs['share_obs'] = (self.share_observation_space.shape, np.float64)
+        return specs
+
+    def step_wait(self):
+        self._assert_not_closed()
+        infos = self._flatten_series([remote.recv() for remote in self.remotes])
+        self.waiting = False
+        return self._buffers['obs'], self._buffers['share_obs'], self._buffers['rewards'], self._buffers['dones'], \
+            np.array(infos)
+
+    def reset(self):
+        return super().reset(), self._buffers['share_obs']
@@ -0,0 +1,348 @@
+"""
+Vectorized envs stepped by remote env workers over TCP, to spread rollout threads over several hosts.
+
+Each worker host serves a local vectorized env (see `RemoteEnvServer` and `scripts/train/remote_env_worker.py`),
+and `RemoteVecEnv` concatenates the envs of all workers. A step sends one message with the actions of all envs
+of a worker, and receives one message with all their results.
+
+Connections start with a mutual HMAC challenge over a shared secret `authkey` (see `authenticate`), and the
+server only decodes array frames of clients, so that a peer without the key can neither step envs nor make
+the worker unpickle data.
+
+Message layout (network byte order):
+    header: version (uint8), command (uint8), number of frames (uint16), payload size (uint64)
+    frame:  kind (uint8), data size (uint64), then for arrays:
+            dtype string size (uint8), dtype string (e.g. b'<f4'), ndim (uint8), shape (uint32 * ndim), data
+            and for objects (e.g. infos, spaces): pickled data
+"""
+import os
+import time
+import hmac
+import pickle
+import contextlib
+import socket
+import struct
+import logging
+import traceback
+import numpy as np
+from multiprocessing.connection import wait
+from typing import List, Tuple
+from .env_wrappers import VecEnv, DummyVecEnv, CloudpickleWrapper, get_context
+
+PROTOCOL_VERSION = 1
+_HEADER = struct.Struct("!BBHQ")
+_FRAME = struct.Struct("!BQ")
+_ARRAY, _OBJECT = 0, 1
+# commands, and reply status
+STEP, RESET, GET_SPACES, CLOSE = 1, 2, 3, 4
+OK, ERROR = 0, 255
+_CHALLENGE_SIZE = 32
+_AUTH_TIMEOUT = 10.
+
+
+def pack_message(command: int, frames: list) -> bytes:
+    """Encode `frames` (numpy arrays of non-object dtype are sent raw, anything else is pickled)."""
+    parts = []
+    for frame in frames:
+        if isinstance(frame, np.ndarray) and frame.dtype != object:
+            frame = np.require(frame, requirements="C")
+            dtype = frame.dtype.str.encode()
+            parts += [_FRAME.pack(_ARRAY, frame.nbytes), struct.pack(f"!B{len(dtype)}sB", len(dtype), dtype, frame.ndim),
+                      struct.pack(f"!{frame.ndim}I", *frame.shape), frame.data]
+        else:
+            data = pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+            parts += [_FRAME.pack(_OBJECT, len(data)), data]
+    payload = b"".join(parts)
+    return _HEADER.pack(PROTOCOL_VERSION, command, len(frames), len(payload)) + payload
+
+
+def unpack_payload(num_frames: int, payload: memoryview, allow_objects=True) -> list:
+    """Decode the frames of a message payload, arrays are views of `payload`.
+    Object frames raise a ValueError (before being unpickled) unless `allow_objects`."""
+    frames, offset = [], 0
+    for _ in range(num_frames):
+        kind, size = _FRAME.unpack_from(payload, offset)
+        offset += _FRAME.size
+        if kind != _ARRAY and not allow_objects:
+            raise ValueError("Remote env message contains an object frame, only array frames are accepted")
+        if kind == _ARRAY:
+            dtype_size = payload[offset]
+            dtype = bytes(payload[offset + 1:offset + 1 + dtype_size]).decode()
+            ndim = payload[offset + 1 + dtype_size]
+            offset += 2 + dtype_size
+            shape = struct.unpack_from(f"!{ndim}I", payload, offset)
+            offset += 4 * ndim
+            frames.append(np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape))
+        else:
+            frames.append(pickle.loads(payload[offset:offset + size]))
+        offset += size
+    return frames
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> memoryview:
+    buffer = memoryview(bytearray(size))
+    received = 0
+    while received < size:
+        n = sock.recv_into(buffer[received:])
+        if n == 0:
+            raise ConnectionError("Connection closed by remote env peer")
+        received += n
+    return buffer
+
+
+def send_message(sock: socket.socket, command: int, frames: list):
+    sock.sendall(pack_message(command, frames))
+
+
+def recv_message(sock: socket.socket, allow_objects=True) -> Tuple[int, list]:
+    version, command, num_frames, size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if version != PROTOCOL_VERSION:
+        raise ConnectionError(f"Remote env protocol version {version} does not match version {PROTOCOL_VERSION}")
+    return command, unpack_payload(num_frames, _recv_exactly(sock, size), allow_objects)
+
+
+def _digest(authkey: bytes, challenge: bytes) -> bytes:
+    return hmac.new(authkey, challenge, "sha256").digest()
+
+
+def authenticate(sock: socket.socket, authkey: bytes, server: bool):
+    """Mutual challenge-response over `authkey`: each peer proves it knows the key with an HMAC of a random
+    challenge of the other one. Raises a ConnectionError if the peer fails."""
+    assert authkey, "Remote envs need a non-empty authkey"
+    challenge = os.urandom(_CHALLENGE_SIZE)
+    if server:
+        sock.sendall(challenge)
+        response = _recv_exactly(sock, 2 * _CHALLENGE_SIZE)
+        if not hmac.compare_digest(bytes(response[:_CHALLENGE_SIZE]), _digest(authkey, challenge)):
+            raise ConnectionError("Remote env client failed authentication")
+        sock.sendall(_digest(authkey, bytes(response[_CHALLENGE_SIZE:])))
+    else:
+        peer_challenge = bytes(_recv_exactly(sock, _CHALLENGE_SIZE))
+        sock.sendall(_digest(authkey, peer_challenge) + challenge)
+        if not hmac.compare_digest(bytes(_recv_exactly(sock, _CHALLENGE_SIZE)), _digest(authkey, challenge)):
+            raise ConnectionError("Remote env worker failed authentication")
+
+
+class RemoteEnvServer:
+    """Serve a local vectorized env to a `RemoteVecEnv` client over TCP.
+
+    Requests of the client are served one at a time, and the client sends a step only once the previous one
+    is replied, so that a slow worker holds back its client through TCP flow control instead of queueing steps.
+    Clients must authenticate with `authkey`, and messages with object frames are rejected.
+
+    Usage:
+        server = RemoteEnvServer(envs, authkey, host="127.0.0.1", port=5555)
+        server.serve()  # until the client closes it
+        envs.close()
+    """
+    def __init__(self, envs: VecEnv, authkey: bytes, host="127.0.0.1", port=0):
+        """
+        Args:
+            envs (VecEnv): local vectorized env to serve.
+            authkey (bytes): secret shared with the client.
+            host (str, optional): interface to listen on. Defaults to loopback only.
+            port (int, optional): port to listen on. Defaults to 0, a free port (see `self.address`).
+        """
+        self.envs = envs
+        self.authkey = authkey
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()[:2]
+
+    def serve(self):
+        """Serve one authenticated client until it closes the envs, or disconnects."""
+        while True:
+            conn, client_address = self.server.accept()
+            try:
+                # a silent peer must not block the worker
+                conn.settimeout(_AUTH_TIMEOUT)
+                authenticate(conn, self.authkey, server=True)
+                conn.settimeout(None)
+                break
+            except (ConnectionError, OSError) as e:
+                logging.warning(f"RemoteEnvServer {self.address}: rejected client {client_address}: {e}")
+                conn.close()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logging.info(f"RemoteEnvServer {self.address}: serving {self.envs.num_envs} envs to {client_address}")
+        with conn:
+            while True:
+                try:
+                    command, frames = recv_message(conn, allow_objects=False)
+                except ConnectionError:
+                    logging.warning(f"RemoteEnvServer {self.address}: client {client_address} disconnected")
+                    break
+                except ValueError:
+                    send_message(conn, ERROR, [traceback.format_exc()])
+                    continue
+                try:
+                    if command == STEP:
+                        *arrays, infos = self.envs.step(frames[0])
+                        reply = [*arrays, infos]
+                    elif command == RESET:
+                        obs = self.envs.reset()
+                        reply = list(obs) if isinstance(obs, tuple) else [obs]
+                    elif command == GET_SPACES:
+                        reply = [{"num_envs": self.envs.num_envs,
+                                  "observation_space": self.envs.observation_space,
+                                  "share_observation_space": getattr(self.envs, "share_observation_space", None),
+                                  "action_space": self.envs.action_space,
+                                  "num_agents": getattr(self.envs, "num_agents", 1)}]
+                    elif command == CLOSE:
+                        send_message(conn, OK, [])
+                        break
+                    else:
+                        raise NotImplementedError(f"Unknown remote env command {command}")
+                except Exception:
+                    send_message(conn, ERROR, [traceback.format_exc()])
+                    continue
+                send_message(conn, OK, reply)
+        self.server.close()
+
+
+class RemoteVecEnv(VecEnv):
+    """
+    VecEnv whose environments run in remote env workers (see `RemoteEnvServer`), reached over TCP.
+    Environments are ordered by worker, in the order of `addresses`.
+
+    Each step sends the actions of all envs of a worker in one message (and receives their results in one),
+    and at most one step per worker is in flight.
+    Envs with a shared observation space (e.g. MultipleCombat) return (obs, share_obs, ...) like ShareSubprocVecEnv.
+    """
+    def __init__(self, addresses: List[Tuple[str, int]], authkey: bytes, connect_timeout=60.):
+        """
+        Args:
+            addresses: (host, port) of the remote env workers.
+            authkey (bytes): secret shared with the remote env workers.
+            connect_timeout (float, optional): seconds to wait for workers to accept connections, as they may
+                be started after the client. Defaults to 60.
+        """
+        self.addresses = [(host, int(port)) for host, port in addresses]
+        self.socks = [self._connect(address, authkey, connect_timeout) for address in self.addresses]
+        self.waiting = False
+        self.closed = False
+        specs = self._request_all(GET_SPACES, [[] for _ in self.socks])
+        specs = [frames[0] for frames in specs]
+        for spec in specs[1:]:
+            assert spec["observation_space"] == specs[0]["observation_space"] \
+                and spec["action_space"] == specs[0]["action_space"], "Remote env workers run different envs"
+        self.worker_num_envs = [spec["num_envs"] for spec in specs]
+        super().__init__(sum(self.worker_num_envs), specs[0]["observation_space"], specs[0]["action_space"])
+        self.num_agents = specs[0]["num_agents"]
+        if specs[0]["share_observation_space"] is not None:
+            self.share_observation_space = specs[0]["share_observation_space"]
+        logging.info(f"RemoteVecEnv: connected to {len(self.socks)} workers running "
+                     f"{self.worker_num_envs} envs")
+
+    @staticmethod
+    def _connect(address, authkey, timeout) -> socket.socket:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sock = socket.create_connection(address, timeout=timeout)
+                break
+            except (ConnectionRefusedError, socket.timeout):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        try:
+            authenticate(sock, authkey, server=False)
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _send_all(self, command, frames_list):
+        for sock, frames in zip(self.socks, frames_list):
+            send_message(sock, command, frames)
+
+    def _recv_all(self) -> List[list]:
+        """Receive a reply of each worker, in whichever order they arrive.
+        Errors of workers are raised once all replies are received, so that workers can still be used."""
+        replies, errors = [None] * len(self.socks), []
+        worker_ids = {sock: worker_id for worker_id, sock in enumerate(self.socks)}
+        pending = list(self.socks)
+        while pending:
+            for sock in wait(pending):
+                status, frames = recv_message(sock)
+                worker_id = worker_ids[sock]
+                if status == ERROR:
+                    errors.append(f"Remote env worker {self.addresses[worker_id]} failed:\n{frames[0]}")
+                replies[worker_id] = frames
+                pending.remove(sock)
+        if errors:
+            raise RuntimeError("\n".join(errors))
+        return replies
+
+    def _request_all(self, command, frames_list) -> List[list]:
+        self._send_all(command, frames_list)
+        return self._recv_all()
+
+    @staticmethod
+    def _concat(replies: List[list]) -> list:
+        return [np.concatenate([frames[i] for frames in replies]) for i in range(len(replies[0]))]
+
+    def step_async(self, actions):
+        self._assert_not_closed()
+        assert not self.waiting, "Step the envs only once their previous step is received"
+        actions = np.split(np.asarray(actions), np.cumsum(self.worker_num_envs)[:-1])
+        self._send_all(STEP, [[action] for action in actions])
+        self.waiting = True
+
+    def step_wait(self):
+        self._assert_not_closed()
+        try:
+            replies = self._recv_all()
+        finally:
+            self.waiting = False
+        *arrays, infos = self._concat(replies)
+        return (*arrays, infos)
+
+    def reset(self):
+        self._assert_not_closed()
+        if self.waiting:
+            self.step_wait()
+        arrays = self._concat(self._request_all(RESET, [[] for _ in self.socks]))
+        return arrays[0] if len(arrays) == 1 else tuple(arrays)
+
+    def close_extras(self):
+        if self.waiting:
+            with contextlib.suppress(RuntimeError):
+                self._recv_all()
+        self._request_all(CLOSE, [[] for _ in self.socks])
+        for sock in self.socks:
+            sock.close()
+
+    def _assert_not_closed(self):
+        assert not self.closed, "Trying to operate on a RemoteVecEnv after calling close()"
+
+
+def _loopback_worker(env_fn_wrappers, vecenv_cls, authkey, address_queue):
+    envs = vecenv_cls(env_fn_wrappers.x)
+    server = RemoteEnvServer(envs, authkey, host="127.0.0.1")
+    address_queue.put(server.address)
+    try:
+        server.serve()
+    finally:
+        envs.close()
+
+
+def start_loopback_workers(env_fns, num_workers, authkey: bytes, vecenv_cls=DummyVecEnv, context=None):
+    """Start `num_workers` remote env workers on this machine, each serving its share of `env_fns`
+    in a `vecenv_cls` (envs in series by default, use ShareDummyVecEnv for envs with shared observations),
+    to clients with `authkey`.
+
+    Returns:
+        (processes, addresses): worker processes, and their (host, port) to pass to `RemoteVecEnv`.
+    """
+    ctx = get_context(context)
+    address_queue = ctx.Queue()
+    processes, addresses = [], []
+    for worker_env_fns in np.array_split(env_fns, num_workers):
+        p = ctx.Process(target=_loopback_worker, args=(CloudpickleWrapper(list(worker_env_fns)), vecenv_cls, authkey,
+                                                       address_queue))
+        p.daemon = True
+        p.start()
+        processes.append(p)
+        addresses.append(address_queue.get())
+    return processes, addresses
@@ -0,0 +1,188 @@
+import queue
+import numpy as np
+import torch
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Tuple
+
+
+class _SharedArrays:
+    """Named numpy arrays in one shared-memory block, described by `specs` {name: (shape, dtype)}."""
+
+    def __init__(self, specs: Dict[str, Tuple[tuple, np.dtype]], name=None):
+        sizes = [int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in specs.values()]
+        self.specs = specs
+        self.shm = SharedMemory(name=name, create=name is None, size=max(sum(sizes), 1) if name is None else 0)
+        self.arrays = {}
+        offset = 0
+        for (key, (shape, dtype)), size in zip(specs.items(), sizes):
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += size
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _policy_state(policy) -> Dict[str, torch.Tensor]:
+    state = {f"actor.{k}": v for k, v in policy.actor.state_dict().items()}
+    state.update({f"critic.{k}": v for k, v in policy.critic.state_dict().items()})
+    return state
+
+
+def _load_policy_state(policy, weights: Dict[str, np.ndarray]):
+    for prefix, module in [("actor.", policy.actor), ("critic.", policy.critic)]:
+        module.load_state_dict({k[len(prefix):]: torch.from_numpy(v) for k, v in weights.items() if k.startswith(prefix)})
+
+
+def _learn(all_args, obs_space, act_space, num_agents, batch_specs, batch_name, weight_specs, weight_name,
+           batches, results, version, lock):
+    """Learner loop: wait for a batch, compute its returns and train on it, then publish the new weights."""
+    from algorithms.ppo.ppo_policy import PPOPolicy
+    from algorithms.ppo.ppo_trainer import PPOTrainer
+    from algorithms.utils.buffer import ReplayBuffer
+    torch.set_num_threads(all_args.n_training_threads)
+    device = torch.device("cuda:0") if all_args.cuda and torch.cuda.is_available() else torch.device("cpu")
+    batch = _SharedArrays(batch_specs, batch_name)
+    weights = _SharedArrays(weight_specs, weight_name)
+    policy = PPOPolicy(all_args, obs_space, act_space, device=device)
+    trainer = PPOTrainer(all_args, device=device)
+    _load_policy_state(policy, weights.arrays)
+    # rollout data are read from shared memory in place, returns are private to the learner
+    buffer = ReplayBuffer(all_args, num_agents, obs_space, act_space)
+    for name, array in batch.arrays.items():
+        setattr(buffer, name, array)
+
+    while True:
+        behaviour_versions = batches.get()
+        if behaviour_versions is None:
+            break
+        # staleness: number of updates between the policies that collected the batch and the trained one
+        train_version = version.value
+        staleness = {"policy_staleness": train_version - behaviour_versions[0],
+                     "max_policy_staleness": train_version - behaviour_versions[1]}
+
+        policy.prep_rollout()
+        with torch.no_grad():
+            flat = lambda x: x.reshape(-1, *x.shape[2:])
+            next_values = policy.get_values(flat(buffer.obs[-1]), flat(buffer.rnn_states_critic[-1]),
+                                            flat(buffer.masks[-1]))
+        buffer.compute_returns(next_values.reshape(buffer.n_rollout_threads, -1, 1).cpu().numpy())
+        policy.prep_training()
+        train_infos = trainer.train(policy, buffer)
+
+        with lock:
+            for key, value in _policy_state(policy).items():
+                weights.arrays[key][...] = value.detach().cpu().numpy()
+            version.value = train_version + 1
+        train_infos = {k: float(v) for k, v in train_infos.items()}
+        train_infos.update(staleness)
+        results.put(train_infos)
+    del buffer
+    batch.close()
+    weights.close()
+
+
+class AsyncLearner:
+    """A learner process which trains a copy of the rollout policy on batches of rollouts, while the runner
+    keeps collecting the next batch with its (slightly stale) policy.
+
+    Batches go through a shared-memory copy of the buffer, and the learner publishes its weights into shared
+    memory after each update, with a version number (the number of updates).
+
+    Usage:
+        learner = AsyncLearner(all_args, policy, buffer)
+        # at each env step
+        learner.sync(policy)
+        # after each rollout
+        train_infos = learner.wait()  # result of the previous batch, if any
+        learner.submit(buffer, behaviour_versions)
+        ...
+        learner.close()
+    """
+    def __init__(self, all_args, policy, buffer, context="spawn"):
+        """
+        Args:
+            all_args: arguments of the runner, the learner builds its policy, trainer and buffer from them.
+            policy (PPOPolicy): rollout policy, its weights are the initial weights of the learner.
+            buffer (ReplayBuffer): rollout buffer, with numpy arrays.
+            context (str, optional): multiprocessing start method. Defaults to 'spawn', as the runner has
+                already started torch threads.
+        """
+        ctx = mp.get_context(context)
+        self._fields = [name for name in buffer._fields if name != "returns"]
+        assert all(isinstance(getattr(buffer, name), np.ndarray) for name in self._fields), \
+            "AsyncLearner needs a buffer of numpy arrays"
+        # the learner process must share the resource tracker of the main process (see ShmemVecEnv)
+        resource_tracker.ensure_running()
+        self.batch = _SharedArrays({name: (getattr(buffer, name).shape, getattr(buffer, name).dtype)
+                                    for name in self._fields})
+        state = _policy_state(policy)
+        self.weights = _SharedArrays({k: (tuple(v.shape), v.detach().cpu().numpy().dtype) for k, v in state.items()})
+        for key, value in state.items():
+            self.weights.arrays[key][...] = value.detach().cpu().numpy()
+        self.version = 0
+        self.shared_version = ctx.Value('i', 0, lock=False)
+        self.lock = ctx.Lock()
+        self.batches = ctx.Queue()
+        self.results = ctx.Queue()
+        self.pending = False
+        self.process = ctx.Process(target=_learn, args=(
+            all_args, policy.obs_space, policy.act_space, buffer.num_agents,
+            self.batch.specs, self.batch.shm.name, self.weights.specs, self.weights.shm.name,
+            self.batches, self.results, self.shared_version, self.lock))
+        self.process.daemon = True
+        self.process.start()
+        self.closed = False
+
+    def sync(self, policy) -> bool:
+        """Load the latest published weights into `policy` if they are newer than its version `self.version`."""
+        if self.shared_version.value == self.version:
+            return False
+        with self.lock:
+            _load_policy_state(policy, self.weights.arrays)
+            self.version = self.shared_version.value
+        return True
+
+    def submit(self, buffer, behaviour_versions: np.ndarray):
+        """Send the rollouts of `buffer` to the learner. The previous batch must have been trained (see `wait`).
+
+        Args:
+            buffer (ReplayBuffer): filled rollout buffer.
+            behaviour_versions (np.ndarray): version of the policy which collected each step of the batch.
+        """
+        assert not self.pending, "the previous batch is still being trained"
+        for name in self._fields:
+            np.copyto(self.batch.arrays[name], getattr(buffer, name))
+        self.batches.put((float(np.mean(behaviour_versions)), int(np.min(behaviour_versions))))
+        self.pending = True
+
+    def wait(self) -> Dict[str, float]:
+        """Wait for the train infos of the submitted batch, or return None if no batch is pending."""
+        if not self.pending:
+            return None
+        while True:
+            try:
+                train_infos = self.results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError(f"Learner process exited with code {self.process.exitcode}")
+        self.pending = False
+        return train_infos
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.process.is_alive():
+                self.wait()
+                self.batches.put(None)
+                self.process.join()
+        finally:
+            self.batch.close(unlink=True)
+            self.weights.close(unlink=True)
+            self.closed = True
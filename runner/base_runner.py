@@ -5,6 +5,7 @@ import torch
 import numpy as np
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from algorithms.utils.buffer import ReplayBuffer
+from .distributed_learners import DistributedLearners
 
 
 def _t2n(x):
@@ -46,6 +47,7 @@ class Runner(object):
             if not os.path.exists(self.save_dir):
                 os.makedirs(self.save_dir)
 
+        self.learners = None  # type: DistributedLearners
         self.load()
 
     def load(self):
@@ -84,14 +86,26 @@ class Runner(object):
     @torch.no_grad()
     def compute(self):
         self.policy.prep_rollout()
-        next_values = self.policy.get_values(np.concatenate(self.buffer.obs[-1]),
-                                             np.concatenate(self.buffer.rnn_states_critic[-1]),
-                                             np.concatenate(self.buffer.masks[-1]))
-        next_values = np.array(np.split(_t2n(next_values), self.buffer.n_rollout_threads))
+        # parallel data [N, M, shape] => [N*M, shape], numpy arrays or tensors of a TorchReplayBuffer
+        flat = lambda x: x.reshape(-1, *x.shape[2:])
+        next_values = self.policy.get_values(flat(self.buffer.obs[-1]),
+                                             flat(self.buffer.rnn_states_critic[-1]),
+                                             flat(self.buffer.masks[-1]))
+        next_values = next_values.reshape(self.buffer.n_rollout_threads, -1, *next_values.shape[1:])
+        if isinstance(self.buffer.returns, np.ndarray):
+            next_values = _t2n(next_values)
         self.buffer.compute_returns(next_values)
 
+    def start_learners(self, policy_args: tuple, buffer_args: tuple):
+        """Start data-parallel learners of ppo updates if `num_learners` > 1 (see DistributedLearners)."""
+        if self.all_args.num_learners > 1:
+            self.learners = DistributedLearners(self.all_args, self.policy, self.trainer, self.buffer,
+                                                policy_args, buffer_args)
+
     def train(self):
         self.policy.prep_training()
+        if self.learners is not None:
+            self.learners.sync(self.policy, self.buffer)
         train_infos = self.trainer.train(self.policy, self.buffer)
         self.buffer.after_update()
         return train_infos
@@ -102,6 +116,10 @@ class Runner(object):
         policy_critic = self.policy.critic
         torch.save(policy_critic.state_dict(), str(self.save_dir) + "/critic_latest.pt")
 
+    def close(self):
+        if self.learners is not None:
+            self.learners.close()
+
     def restore(self):
         policy_actor_state_dict = torch.load(str(self.model_dir) + '/actor_latest.pt')
         self.policy.actor.load_state_dict(policy_actor_state_dict)
@@ -0,0 +1,109 @@
+import socket
+import numpy as np
+import torch
+import torch.distributed as dist
+import multiprocessing as mp
+from typing import List
+
+# commands broadcast by rank 0 to the other learners
+_STOP, _TRAIN = 0, 1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _broadcast_state(policy):
+    """Broadcast weights of rank 0 to all learners, so that all of them start updates from the same weights."""
+    for module in [policy.actor, policy.critic]:
+        for tensor in module.state_dict().values():
+            dist.broadcast(tensor, src=0)
+
+
+def _broadcast_buffer(buffer, fields: List[str]):
+    """Broadcast the buffer arrays of rank 0 to all learners, in place."""
+    for name in fields:
+        dist.broadcast(torch.from_numpy(getattr(buffer, name)), src=0)
+
+
+def _learn(rank, world_size, init_method, all_args, policy_cls, policy_args, trainer_cls, buffer_cls, buffer_args,
+           fields):
+    """Loop of learners of rank > 0: train on the batches of rank 0 together with it, until it stops."""
+    torch.set_num_threads(all_args.n_training_threads)
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    device = torch.device("cpu")
+    policy = policy_cls(all_args, *policy_args, device=device)
+    trainer = trainer_cls(all_args, device=device)
+    buffer = buffer_cls(all_args, *buffer_args)
+    command = torch.zeros(1, dtype=torch.int64)
+    while True:
+        dist.broadcast(command, src=0)
+        if command.item() == _STOP:
+            break
+        _broadcast_state(policy)
+        _broadcast_buffer(buffer, fields)
+        policy.prep_training()
+        trainer.train(policy, buffer)
+    dist.destroy_process_group()
+
+
+class DistributedLearners:
+    """Data-parallel ppo updates over `num_learners` CPU processes (torch.distributed with gloo backend).
+
+    The runner process is the learner of rank 0, the others are started here. Before each update, rank 0
+    broadcasts its weights and its buffer, then all learners run the trainer together: each one trains on its
+    shard of every minibatch (see `ReplayBuffer.recurrent_generator`), and gradients are all-reduced, so that
+    weights of all learners stay the same.
+
+    Usage:
+        learners = DistributedLearners(all_args, policy, trainer, buffer, policy_args, buffer_args)
+        # before each trainer.train(policy, buffer)
+        learners.sync(policy, buffer)
+        ...
+        learners.close()
+    """
+    def __init__(self, all_args, policy, trainer, buffer, policy_args: tuple, buffer_args: tuple, context="spawn"):
+        """
+        Args:
+            all_args: arguments of the runner.
+            policy, trainer, buffer: policy, trainer and numpy buffer of the runner, the other learners build
+                the same ones.
+            policy_args (tuple): arguments of the policy class after `args`, e.g. (obs_space, act_space).
+            buffer_args (tuple): arguments of the buffer class after `args`, e.g. (num_agents, obs_space, act_space).
+            context (str, optional): multiprocessing start method. Defaults to 'spawn', as the runner has
+                already started torch threads.
+        """
+        self.world_size = all_args.num_learners
+        assert self.world_size > 1, "DistributedLearners needs at least 2 learners"
+        assert policy.device.type == "cpu", "DistributedLearners train on CPU"
+        self.fields = list(buffer._fields)
+        assert all(isinstance(getattr(buffer, name), np.ndarray) for name in self.fields), \
+            "DistributedLearners need a buffer of numpy arrays"
+        ctx = mp.get_context(context)
+        init_method = f"tcp://127.0.0.1:{_free_port()}"
+        self.processes = []
+        for rank in range(1, self.world_size):
+            p = ctx.Process(target=_learn, args=(rank, self.world_size, init_method, all_args, type(policy),
+                                                 policy_args, type(trainer), type(buffer), buffer_args, self.fields))
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+        dist.init_process_group("gloo", init_method=init_method, rank=0, world_size=self.world_size)
+        self.closed = False
+
+    def sync(self, policy, buffer):
+        """Send weights and batch of rank 0 to all learners, which then train together with it."""
+        dist.broadcast(torch.tensor([_TRAIN]), src=0)
+        _broadcast_state(policy)
+        _broadcast_buffer(buffer, self.fields)
+
+    def close(self):
+        if self.closed:
+            return
+        dist.broadcast(torch.tensor([_STOP]), src=0)
+        for p in self.processes:
+            p.join()
+        dist.destroy_process_group()
+        self.closed = True
@@ -4,6 +4,9 @@ import logging
 import numpy as np
 from typing import List
 from .base_runner import Runner, ReplayBuffer
+from algorithms.utils.buffer import TorchReplayBuffer
+from .async_learner import AsyncLearner
+from envs.env_wrappers import AsyncSubprocVecEnv
 
 
 def _t2n(x):
@@ -17,6 +20,9 @@ class JSBSimRunner(Runner):
         self.act_space = self.envs.action_space
         self.num_agents = self.envs.num_agents
         self.use_selfplay = self.all_args.use_selfplay
+        self.use_async_envs = isinstance(self.envs, AsyncSubprocVecEnv)
+        self.use_torch_buffer = self.all_args.use_torch_buffer
+        self.use_async_learner = self.all_args.use_async_learner
 
         # policy & algorithm
         if self.algorithm_name == "ppo":
@@ -28,11 +34,24 @@ class JSBSimRunner(Runner):
         self.trainer = Trainer(self.all_args, device=self.device)
 
         # buffer
-        self.buffer = ReplayBuffer(self.all_args, self.num_agents, self.obs_space, self.act_space)
+        if self.use_torch_buffer:
+            self.buffer = TorchReplayBuffer(self.all_args, self.num_agents, self.obs_space, self.act_space,
+                                            device=self.device)
+        else:
+            self.buffer = ReplayBuffer(self.all_args, self.num_agents, self.obs_space, self.act_space)
 
         if self.model_dir is not None:
             self.restore()
 
+        # learner processes, started from restored weights
+        self.start_learners((self.obs_space, self.act_space), (self.num_agents, self.obs_space, self.act_space))
+        if self.use_async_learner:
+            assert self.all_args.num_learners == 1, "async learner does not support multiple learners"
+            assert not self.use_torch_buffer, "async learner needs a numpy replay buffer"
+            self.learner = AsyncLearner(self.all_args, self.policy, self.buffer)
+            # version of the policy which collected each step of the buffer
+            self.policy_versions = np.zeros((self.buffer_size, self.n_rollout_threads), dtype=int)
+
     def run(self):
         self.warmup()
 
@@ -42,28 +61,34 @@ class JSBSimRunner(Runner):
 
         for episode in range(episodes):
 
-            heading_turns_list = []
+            if self.use_async_envs or self.use_torch_buffer or self.use_async_learner:
+                heading_turns_list = self.rollout()
+            else:
+                heading_turns_list = []
 
-            for step in range(self.buffer_size):
-                # Sample actions
-                values, actions, action_log_probs, rnn_states_actor, rnn_states_critic = self.collect(step)
+                for step in range(self.buffer_size):
+                    # Sample actions
+                    values, actions, action_log_probs, rnn_states_actor, rnn_states_critic = self.collect(step)
 
-                # Obser reward and next obs
-                obs, rewards, dones, infos = self.envs.step(actions)
+                    # Obser reward and next obs
+                    obs, rewards, dones, infos = self.envs.step(actions)
 
-                # Extra recorded information
-                for info in infos:
-                    if 'heading_turn_counts' in info:
-                        heading_turns_list.append(info['heading_turn_counts'])
+                    # Extra recorded information
+                    for info in infos:
+                        if 'heading_turn_counts' in info:
+                            heading_turns_list.append(info['heading_turn_counts'])
 
-                data = obs, actions, rewards, dones, action_log_probs, values, rnn_states_actor, rnn_states_critic
+                    data = obs, actions, rewards, dones, action_log_probs, values, rnn_states_actor, rnn_states_critic
 
-                # insert data into buffer
-                self.insert(data)
+                    # insert data into buffer
+                    self.insert(data)
 
             # compute return and update network
-            self.compute()
-            train_infos = self.train()
+            if self.use_async_learner:
+                train_infos = self.async_train()
+            else:
+                self.compute()
+                train_infos = self.train()
 
             # post process
             self.total_num_steps = (episode + 1) * self.buffer_size * self.n_rollout_threads
@@ -81,9 +106,13 @@ class JSBSimRunner(Runner):
                                      self.num_env_steps,
                                      int(self.total_num_steps / (end - start))))
 
-                train_infos["average_episode_rewards"] = self.buffer.rewards.sum() / (self.buffer.masks == False).sum()
+                train_infos["average_episode_rewards"] = float(self.buffer.rewards.sum() / (self.buffer.masks == False).sum())
                 logging.info("average episode rewards is {}".format(train_infos["average_episode_rewards"]))
 
+                if "policy_staleness" in train_infos:
+                    logging.info("policy staleness is {} updates (max {})".format(
+                        train_infos["policy_staleness"], train_infos["max_policy_staleness"]))
+
                 if len(heading_turns_list):
                     train_infos["average_heading_turns"] = np.mean(heading_turns_list)
                     logging.info("average heading turns is {}".format(train_infos["average_heading_turns"]))
@@ -97,11 +126,35 @@ class JSBSimRunner(Runner):
             if (episode % self.save_interval == 0) or (episode == episodes - 1):
                 self.save(episode)
 
+        if self.use_async_learner:
+            # train on the last batch, and save the final weights
+            self.learner.wait()
+            self.learner.sync(self.policy)
+            self.learner.close()
+            self.save(episodes - 1)
+
+    def close(self):
+        # also stops the learner process if `run` did not end normally
+        if self.use_async_learner:
+            self.learner.close()
+        super().close()
+
+    def async_train(self):
+        """Hand the buffer over to the learner process, which trains on it while the next batch is collected.
+
+        Returns:
+            train infos of the previous batch (empty for the first one), with the staleness of its policies.
+        """
+        train_infos = self.learner.wait() or {}
+        self.learner.submit(self.buffer, self.policy_versions)
+        self.buffer.after_update()
+        return train_infos
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
         self.buffer.step = 0
-        self.buffer.obs[0] = obs.copy()
+        self.buffer.obs[0] = self.to_buffer(obs)
 
     @torch.no_grad()
     def collect(self, step):
@@ -132,6 +185,102 @@ class JSBSimRunner(Runner):
 
         self.buffer.insert(obs, actions, rewards, masks, action_log_probs, values, rnn_states_actor, rnn_states_critic)
 
+    def rollout(self):
+        """Fill the buffer through an AsyncSubprocVecEnv, consuming the partial batches of whichever envs are ready first.
+
+        Each env advances through its own buffer column at its own pace, envs which have collected
+        `buffer_size` steps wait for the others, so that the buffer layout is the same as a synchronous rollout.
+
+        With synchronous envs, all envs step together. Policy outputs are written into the buffer in place
+        (a TorchReplayBuffer keeps them on device), only actions are sent to envs.
+        """
+        if not self.use_async_envs:
+            return self.sync_rollout()
+        heading_turns_list = []
+        env_steps = np.zeros(self.n_rollout_threads, dtype=int)
+        env_ids = np.arange(self.n_rollout_threads)
+        while True:
+            env_ids = env_ids[env_steps[env_ids] < self.buffer_size]
+            if len(env_ids) > 0:
+                actions = self.collect_envs(env_ids, env_steps[env_ids])
+                self.envs.step_async(actions, env_ids)
+            if not self.envs.waiting:
+                break
+            obs, rewards, dones, infos, env_ids = self.envs.step_wait()
+
+            # Extra recorded information
+            for info in infos:
+                if 'heading_turn_counts' in info:
+                    heading_turns_list.append(info['heading_turn_counts'])
+
+            self.insert_envs(env_ids, env_steps[env_ids], obs, rewards, dones)
+            env_steps[env_ids] += 1
+        self.buffer.step = 0
+        return heading_turns_list
+
+    def sync_rollout(self):
+        heading_turns_list = []
+        env_ids = np.arange(self.n_rollout_threads)
+        for step in range(self.buffer_size):
+            steps = np.full(self.n_rollout_threads, step)
+            actions = self.collect_envs(env_ids, steps)
+            obs, rewards, dones, infos = self.envs.step(actions)
+
+            # Extra recorded information
+            for info in infos:
+                if 'heading_turn_counts' in info:
+                    heading_turns_list.append(info['heading_turn_counts'])
+
+            self.insert_envs(env_ids, steps, obs, rewards, dones)
+        self.buffer.step = 0
+        return heading_turns_list
+
+    def to_buffer(self, x):
+        """Convert numpy data or policy outputs to the array type of buffer."""
+        if self.use_torch_buffer:
+            return torch.as_tensor(x, dtype=torch.float32, device=self.device)
+        return _t2n(x) if isinstance(x, torch.Tensor) else x
+
+    @staticmethod
+    def _flat(x):
+        # parallel data [N, M, shape] => [N*M, shape]
+        return x.reshape(-1, *x.shape[2:])
+
+    @torch.no_grad()
+    def collect_envs(self, env_ids: np.ndarray, steps: np.ndarray):
+        """Sample actions of envs `env_ids` at their own buffer steps `steps`, and store policy outputs into buffer."""
+        if self.use_async_learner:
+            self.learner.sync(self.policy)
+            self.policy_versions[steps, env_ids] = self.learner.version
+        self.policy.prep_rollout()
+        values, actions, action_log_probs, rnn_states_actor, rnn_states_critic \
+            = self.policy.get_actions(self._flat(self.buffer.obs[steps, env_ids]),
+                                      self._flat(self.buffer.rnn_states_actor[steps, env_ids]),
+                                      self._flat(self.buffer.rnn_states_critic[steps, env_ids]),
+                                      self._flat(self.buffer.masks[steps, env_ids]))
+        # split parallel data [N*M, shape] => [N, M, shape]
+        split = lambda x: x.reshape(len(env_ids), -1, *x.shape[1:])
+        actions = split(actions)
+        self.buffer.actions[steps, env_ids] = self.to_buffer(actions)
+        self.buffer.value_preds[steps, env_ids] = self.to_buffer(split(values))
+        self.buffer.action_log_probs[steps, env_ids] = self.to_buffer(split(action_log_probs))
+        self.buffer.rnn_states_actor[steps + 1, env_ids] = self.to_buffer(split(rnn_states_actor))
+        self.buffer.rnn_states_critic[steps + 1, env_ids] = self.to_buffer(split(rnn_states_critic))
+        return _t2n(actions)
+
+    def insert_envs(self, env_ids: np.ndarray, steps: np.ndarray, obs, rewards, dones):
+        """Insert env outputs of envs `env_ids` at their own buffer steps `steps`."""
+        dones_env = np.all(dones.squeeze(axis=-1), axis=-1)
+
+        masks = np.ones((len(env_ids), self.num_agents, 1), dtype=np.float32)
+        masks[dones_env == True] = np.zeros(((dones_env == True).sum(), self.num_agents, 1), dtype=np.float32)
+
+        self.buffer.obs[steps + 1, env_ids] = self.to_buffer(obs)
+        self.buffer.rewards[steps, env_ids] = self.to_buffer(rewards)
+        self.buffer.masks[steps + 1, env_ids] = self.to_buffer(masks)
+        self.buffer.rnn_states_actor[steps[dones_env] + 1, env_ids[dones_env]] = 0
+        self.buffer.rnn_states_critic[steps[dones_env] + 1, env_ids[dones_env]] = 0
+
     @torch.no_grad()
     def eval(self, total_num_steps):
         logging.info("\nStart evaluation...")
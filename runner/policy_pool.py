@@ -0,0 +1,133 @@
+import os
+import threading
+import torch
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable
+
+
+class PolicyPool:
+    """In-memory pool of opponent actor weights, which are saved as `actor_{key}.pt` checkpoints in `save_dir`.
+
+    State dicts are kept in RAM (on CPU) within a byte budget. Weights which are both the least frequently and
+    least recently sampled are evicted first: each `get` of a key adds to its score a weight which doubles every
+    `half_life` samples, and the weights of the lowest score are evicted (the least recently used on ties).
+    Weights that are not in memory are loaded from their checkpoint, in a background thread if they are
+    prefetched, so that choosing opponents does not stall on storage.
+
+    Usage:
+        pool = PolicyPool(save_dir, max_bytes=2 ** 30)
+        pool.add(key, policy.actor.state_dict())  # after saving actor_{key}.pt
+        pool.prefetch(keys)  # as soon as the next opponents are known
+        opponent_policy.actor.load_state_dict(pool.get(key))
+        logging.info(pool.stats())
+        pool.close()
+    """
+    def __init__(self, save_dir, max_bytes: int, num_workers=1, half_life=100):
+        """
+        Args:
+            save_dir: directory of the `actor_{key}.pt` checkpoints.
+            max_bytes (int): memory budget of cached weights, in bytes.
+            num_workers (int, optional): number of threads loading checkpoints in the background. Defaults to 1.
+            half_life (float, optional): number of samples after which a former sample weighs half as much as
+                a new one in eviction scores, i.e. pure LRU when close to 0 and LFU when infinite. Defaults to 100.
+        """
+        self.save_dir = str(save_dir)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits, self.misses, self.waits, self.evictions = 0, 0, 0, 0
+        self._cache = OrderedDict()  # type: OrderedDict[str, Dict[str, torch.Tensor]]
+        # sampling scores of all keys, kept across evictions
+        self._scores = {}  # type: Dict[str, float]
+        self._growth = 2 ** (1 / half_life)
+        self._boost = 1.
+        self._pending = {}  # type: Dict[str, Future]
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="PolicyPool")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.save_dir, f"actor_{key}.pt")
+
+    def add(self, key: str, state_dict: Dict[str, torch.Tensor]):
+        """Cache a copy of `state_dict` as the weights of `key` (e.g. just saved), replacing any former ones."""
+        state_dict = {k: v.detach().to("cpu", copy=True) for k, v in state_dict.items()}
+        with self._lock:
+            self._insert(str(key), state_dict)
+
+    def prefetch(self, keys: Iterable[str]):
+        """Load the weights of `keys` which are not in memory in the background."""
+        with self._lock:
+            for key in map(str, keys):
+                if key not in self._cache and key not in self._pending:
+                    self._pending[key] = self._executor.submit(self._load, key)
+
+    def get(self, key: str) -> Dict[str, torch.Tensor]:
+        """Weights of `key`, from memory if cached or prefetched in time (a hit), else from its checkpoint:
+        waiting for its prefetch still in progress (a wait), or loading it (a miss)."""
+        key = str(key)
+        with self._lock:
+            self._sample(key)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            future = self._pending.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._pending[key] = self._executor.submit(self._load, key)
+            elif future.done():
+                self.hits += 1
+            else:
+                self.waits += 1
+        return future.result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"policy_pool_hits": self.hits, "policy_pool_misses": self.misses,
+                    "policy_pool_waits": self.waits, "policy_pool_evictions": self.evictions,
+                    "policy_pool_size": len(self._cache), "policy_pool_mib": self.nbytes / 2 ** 20}
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _load(self, key: str) -> Dict[str, torch.Tensor]:
+        try:
+            state_dict = torch.load(self.path(key), map_location="cpu")
+            with self._lock:
+                # not cached if added meanwhile, as `add` holds newer weights
+                if key not in self._cache:
+                    self._insert(key, state_dict)
+            return state_dict
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _sample(self, key: str):
+        """Add the weight of a new sample to the score of `key` (with the lock held)."""
+        self._scores[key] = self._scores.get(key, 0.) + self._boost
+        self._boost *= self._growth
+        if self._boost > 2 ** 512:
+            # rescale before overflowing, eviction only compares scores
+            self._scores = {k: v / self._boost for k, v in self._scores.items()}
+            self._boost = 1.
+
+    def _insert(self, key: str, state_dict: Dict[str, torch.Tensor]):
+        """Cache `state_dict` and evict the lowest scored weights to fit in the budget (with the lock held).
+        New weights score at least as much as a new sample, so that they are not evicted before being sampled."""
+        if key in self._cache:
+            self.nbytes -= _nbytes(self._cache.pop(key))
+        nbytes = _nbytes(state_dict)
+        if nbytes > self.max_bytes:
+            return
+        while self.nbytes + nbytes > self.max_bytes:
+            # least recently used first on ties
+            evicted_key = min(self._cache, key=lambda k: self._scores.get(k, 0.))
+            self.nbytes -= _nbytes(self._cache.pop(evicted_key))
+            self.evictions += 1
+        self._scores[key] = max(self._scores.get(key, 0.), self._boost)
+        self._cache[key] = state_dict
+        self.nbytes += nbytes
+
+
+def _nbytes(state_dict: Dict[str, torch.Tensor]) -> int:
+    return sum(v.numel() * v.element_size() for v in state_dict.values())
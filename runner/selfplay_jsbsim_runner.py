@@ -4,6 +4,8 @@ import numpy as np
 from typing import List
 from .base_runner import Runner, ReplayBuffer
 from .jsbsim_runner import JSBSimRunner
+from .policy_pool import PolicyPool
+from envs.env_wrappers import AsyncSubprocVecEnv
 
 
 def _t2n(x):
@@ -15,6 +17,12 @@ class SelfplayJSBSimRunner(JSBSimRunner):
     def load(self):
         self.use_selfplay = self.all_args.use_selfplay 
         assert self.use_selfplay == True, "Only selfplay can use SelfplayRunner"
+        self.use_async_envs = isinstance(self.envs, AsyncSubprocVecEnv)
+        assert not self.use_async_envs, "SelfplayRunner does not support async envs"
+        self.use_torch_buffer = self.all_args.use_torch_buffer
+        assert not self.use_torch_buffer, "SelfplayRunner does not support torch buffer"
+        self.use_async_learner = self.all_args.use_async_learner
+        assert not self.use_async_learner, "SelfplayRunner does not support async learner"
         self.obs_space = self.envs.observation_space
         self.act_space = self.envs.action_space
         self.num_agents = self.envs.num_agents
@@ -44,6 +52,8 @@ class SelfplayJSBSimRunner(JSBSimRunner):
             "Number of different opponents({}) must less than or equal to number of training threads({})!" \
             .format(self.num_opponents, self.n_rollout_threads)
         self.policy_pool = {}  # type: dict[str, float]
+        # [Selfplay] weights of saved policies, cached in RAM
+        self.policy_weights = PolicyPool(self.save_dir, int(self.all_args.policy_pool_mib * 2 ** 20))
         self.opponent_policy = [
             Policy(self.all_args, self.obs_space, self.act_space, device=self.device)
             for _ in range(self.num_opponents)]
@@ -53,7 +63,10 @@ class SelfplayJSBSimRunner(JSBSimRunner):
         self.opponent_masks = np.ones_like(self.buffer.masks[0])
 
         if self.use_eval:
-            self.eval_opponent_policy = Policy(self.all_args, self.obs_space, self.act_space, device=self.device)
+            # [Selfplay] opponents evaluated concurrently, each one on its slice of eval envs
+            self.eval_opponent_policy = [
+                Policy(self.all_args, self.obs_space, self.act_space, device=self.device)
+                for _ in range(min(self.num_opponents, self.n_eval_rollout_threads))]
 
         logging.info("\n Load selfplay opponents: Algo {}, num_opponents {}.\n"
                         .format(self.all_args.selfplay_algorithm, self.num_opponents))
@@ -61,6 +74,8 @@ class SelfplayJSBSimRunner(JSBSimRunner):
         if self.model_dir is not None:
             self.restore()
 
+        self.start_learners((self.obs_space, self.act_space), (self.buffer.num_agents, self.obs_space, self.act_space))
+
     def warmup(self):
         # reset env
         obs = self.envs.reset()
@@ -126,89 +141,27 @@ class SelfplayJSBSimRunner(JSBSimRunner):
     def eval(self, total_num_steps):
         logging.info("\nStart evaluation...")
         self.policy.prep_rollout()
-        total_episodes = 0
-        episode_rewards, opponent_episode_rewards = [], []
-        cumulative_rewards = np.zeros((self.n_eval_rollout_threads, *self.buffer.rewards.shape[2:]), dtype=np.float32)
-        opponent_cumulative_rewards= np.zeros_like(cumulative_rewards)
 
         # [Selfplay] Choose opponent policy for evaluation
         eval_choose_opponents = [self.selfplay_algo.choose(self.policy_pool) for _ in range(self.num_opponents)]
         eval_each_episodes = self.eval_episodes // self.num_opponents
         logging.info(f" Choose opponents {eval_choose_opponents} for evaluation")
-
-        eval_cur_opponent_idx = 0
-        while total_episodes < self.eval_episodes:
-
-            # [Selfplay] Load opponent policy
-            if total_episodes >= eval_cur_opponent_idx * eval_each_episodes:
-                policy_idx = eval_choose_opponents[eval_cur_opponent_idx]
-                self.eval_opponent_policy.actor.load_state_dict(torch.load(str(self.save_dir) + f'/actor_{policy_idx}.pt'))
-                self.eval_opponent_policy.prep_rollout()
-                eval_cur_opponent_idx += 1
-                logging.info(f" Load opponent {policy_idx} for evaluation ({total_episodes}/{self.eval_episodes})")
-
-                # reset obs/rnn/mask
-                obs = self.eval_envs.reset()
-                masks = np.ones((self.n_eval_rollout_threads, *self.buffer.masks.shape[2:]), dtype=np.float32)
-                rnn_states = np.zeros((self.n_eval_rollout_threads, *self.buffer.rnn_states_actor.shape[2:]), dtype=np.float32)
-                opponent_obs = obs[:, self.num_agents // 2:, ...]
-                obs = obs[:, :self.num_agents // 2, ...]
-                opponent_masks = np.ones_like(masks, dtype=np.float32)
-                opponent_rnn_states = np.zeros_like(rnn_states, dtype=np.float32)
-
-            # [Selfplay] get actions
-            actions, rnn_states = self.policy.act(np.concatenate(obs),
-                                                    np.concatenate(rnn_states),
-                                                    np.concatenate(masks), deterministic=True)
-            actions = np.array(np.split(_t2n(actions), self.n_eval_rollout_threads))
-            rnn_states = np.array(np.split(_t2n(rnn_states), self.n_eval_rollout_threads))
-
-            opponent_actions, opponent_rnn_states \
-                = self.eval_opponent_policy.act(np.concatenate(opponent_obs),
-                                                np.concatenate(opponent_rnn_states),
-                                                np.concatenate(opponent_masks), deterministic=True)
-            opponent_rnn_states = np.array(np.split(_t2n(opponent_rnn_states), self.n_eval_rollout_threads))
-            opponent_actions = np.array(np.split(_t2n(opponent_actions), self.n_eval_rollout_threads))
-            actions = np.concatenate((actions, opponent_actions), axis=1)
-
-            # Obser reward and next obs
-            obs, eval_rewards, dones, eval_infos = self.eval_envs.step(actions)
-            dones_env = np.all(dones.squeeze(axis=-1), axis=-1)
-            total_episodes += np.sum(dones_env)
-
-            # [Selfplay] Reset obs, masks, rnn_states
-            opponent_obs = obs[:, self.num_agents // 2:, ...]
-            obs = obs[:, :self.num_agents // 2, ...]
-            masks[dones_env == True] = np.zeros(((dones_env == True).sum(), *masks.shape[1:]), dtype=np.float32)
-            rnn_states[dones_env == True] = np.zeros(((dones_env == True).sum(), *rnn_states.shape[1:]), dtype=np.float32)
-
-            opponent_masks[dones_env == True] = \
-                np.zeros(((dones_env == True).sum(), *opponent_masks.shape[1:]), dtype=np.float32)
-            opponent_rnn_states[dones_env == True] = \
-                np.zeros(((dones_env == True).sum(), *opponent_rnn_states.shape[1:]), dtype=np.float32)
-
-            # [Selfplay] Get rewards
-            opponent_rewards = eval_rewards[:, self.num_agents//2:, ...]
-            opponent_cumulative_rewards += opponent_rewards
-            opponent_episode_rewards.append(opponent_cumulative_rewards[dones_env == True])
-            opponent_cumulative_rewards[dones_env == True] = 0
-
-            eval_rewards = eval_rewards[:, :self.num_agents // 2, ...]
-            cumulative_rewards += eval_rewards
-            episode_rewards.append(cumulative_rewards[dones_env == True])
-            cumulative_rewards[dones_env == True] = 0
-
-        # Compute average episode rewards
-        episode_rewards = np.concatenate(episode_rewards) # shape (self.eval_episodes, self.num_agents, 1)
-        episode_rewards = episode_rewards.squeeze(-1).mean(axis=-1) # shape: (self.eval_episodes,)
-        eval_average_episode_rewards = np.array(np.split(episode_rewards, self.num_opponents)).mean(axis=-1) # shape (self.num_opponents,)
-
-        opponent_episode_rewards = np.concatenate(opponent_episode_rewards)
-        opponent_episode_rewards = opponent_episode_rewards.squeeze(-1).mean(axis=-1)
-        opponent_average_episode_rewards = np.array(np.split(opponent_episode_rewards, self.num_opponents)).mean(axis=-1)
+        self.policy_weights.prefetch(eval_choose_opponents)
+
+        # [Selfplay] Evaluate opponents concurrently on their slices of eval envs,
+        # in rounds of at most n_eval_rollout_threads opponents
+        eval_average_episode_rewards, opponent_average_episode_rewards = [], []
+        num_rounds = -(-self.num_opponents // self.n_eval_rollout_threads)
+        for round_opponents in np.array_split(np.arange(self.num_opponents), num_rounds):
+            average_episode_rewards, opponent_rewards = self.eval_opponents(
+                [eval_choose_opponents[i] for i in round_opponents], eval_each_episodes)
+            eval_average_episode_rewards.append(average_episode_rewards)
+            opponent_average_episode_rewards.append(opponent_rewards)
+        eval_average_episode_rewards = np.concatenate(eval_average_episode_rewards)  # shape (self.num_opponents,)
+        opponent_average_episode_rewards = np.concatenate(opponent_average_episode_rewards)
 
         # Update elo
-        ego_elo = np.array([self.latest_elo for _ in range(self.n_eval_rollout_threads)])
+        ego_elo = np.array([self.latest_elo for _ in range(self.num_opponents)])
         opponent_elo = np.array([self.policy_pool[key] for key in eval_choose_opponents])
         expected_score = 1 / (1 + 10**((opponent_elo-ego_elo)/400))
 
@@ -229,6 +182,7 @@ class SelfplayJSBSimRunner(JSBSimRunner):
         eval_infos = {}
         eval_infos['eval_average_episode_rewards'] = eval_average_episode_rewards.mean()
         eval_infos['latest_elo'] = self.latest_elo
+        eval_infos.update(self.policy_weights.stats())
         logging.info(" eval average episode rewards: " + str(eval_infos['eval_average_episode_rewards']))
         logging.info(" latest elo score: " + str(self.latest_elo))
         self.log_info(eval_infos, total_num_steps)
@@ -236,6 +190,86 @@ class SelfplayJSBSimRunner(JSBSimRunner):
 
         # [Selfplay] Reset opponent for the following training
         self.reset_opponent()
+
+    @torch.no_grad()
+    def eval_opponents(self, opponents: List[str], num_episodes: int):
+        """Evaluate `opponents` concurrently, each one on its slice of eval envs, until each one played `num_episodes`.
+
+        Returns:
+            (average_episode_rewards, opponent_average_episode_rewards): average episode rewards of the ego policy
+                and of each opponent, shape (len(opponents),).
+        """
+        # [Selfplay] Load opponent policies, and split eval envs across them
+        policies = self.eval_opponent_policy[:len(opponents)]
+        for policy, policy_idx in zip(policies, opponents):
+            policy.actor.load_state_dict(self.policy_weights.get(policy_idx))
+            policy.prep_rollout()
+        env_split = np.array_split(np.arange(self.n_eval_rollout_threads), len(opponents))
+        env_opponent = np.zeros(self.n_eval_rollout_threads, dtype=int)
+        for opponent_idx, env_idx in enumerate(env_split):
+            env_opponent[env_idx] = opponent_idx
+        logging.info(f" Evaluate opponents {opponents} on eval envs {[env_idx.tolist() for env_idx in env_split]}")
+
+        # reset obs/rnn/mask
+        episode_rewards = [[] for _ in opponents]
+        opponent_episode_rewards = [[] for _ in opponents]
+        cumulative_rewards = np.zeros((self.n_eval_rollout_threads, *self.buffer.rewards.shape[2:]), dtype=np.float32)
+        opponent_cumulative_rewards = np.zeros_like(cumulative_rewards)
+        obs = self.eval_envs.reset()
+        masks = np.ones((self.n_eval_rollout_threads, *self.buffer.masks.shape[2:]), dtype=np.float32)
+        rnn_states = np.zeros((self.n_eval_rollout_threads, *self.buffer.rnn_states_actor.shape[2:]), dtype=np.float32)
+        opponent_obs = obs[:, self.num_agents // 2:, ...]
+        obs = obs[:, :self.num_agents // 2, ...]
+        opponent_masks = np.ones_like(masks, dtype=np.float32)
+        opponent_rnn_states = np.zeros_like(rnn_states, dtype=np.float32)
+
+        while min(len(rewards) for rewards in episode_rewards) < num_episodes:
+            # [Selfplay] get actions, of each opponent on its slice of envs
+            actions, rnn_states = self.policy.act(np.concatenate(obs),
+                                                  np.concatenate(rnn_states),
+                                                  np.concatenate(masks), deterministic=True)
+            actions = np.array(np.split(_t2n(actions), self.n_eval_rollout_threads))
+            rnn_states = np.array(np.split(_t2n(rnn_states), self.n_eval_rollout_threads))
+
+            opponent_actions = np.zeros_like(actions)
+            for policy, env_idx in zip(policies, env_split):
+                opponent_action, opponent_rnn_state \
+                    = policy.act(np.concatenate(opponent_obs[env_idx]),
+                                 np.concatenate(opponent_rnn_states[env_idx]),
+                                 np.concatenate(opponent_masks[env_idx]), deterministic=True)
+                opponent_actions[env_idx] = np.array(np.split(_t2n(opponent_action), len(env_idx)))
+                opponent_rnn_states[env_idx] = np.array(np.split(_t2n(opponent_rnn_state), len(env_idx)))
+            actions = np.concatenate((actions, opponent_actions), axis=1)
+
+            # Obser reward and next obs
+            obs, eval_rewards, dones, eval_infos = self.eval_envs.step(actions)
+            dones_env = np.all(dones.squeeze(axis=-1), axis=-1)
+
+            # [Selfplay] Reset obs, masks, rnn_states
+            opponent_obs = obs[:, self.num_agents // 2:, ...]
+            obs = obs[:, :self.num_agents // 2, ...]
+            masks = np.ones_like(masks, dtype=np.float32)
+            masks[dones_env == True] = np.zeros(((dones_env == True).sum(), *masks.shape[1:]), dtype=np.float32)
+            rnn_states[dones_env == True] = np.zeros(((dones_env == True).sum(), *rnn_states.shape[1:]), dtype=np.float32)
+            opponent_masks = masks.copy()
+            opponent_rnn_states[dones_env == True] = \
+                np.zeros(((dones_env == True).sum(), *opponent_rnn_states.shape[1:]), dtype=np.float32)
+
+            # [Selfplay] Get rewards, of finished episodes of each opponent
+            cumulative_rewards += eval_rewards[:, :self.num_agents // 2, ...]
+            opponent_cumulative_rewards += eval_rewards[:, self.num_agents // 2:, ...]
+            for env_idx in np.flatnonzero(dones_env):
+                episode_rewards[env_opponent[env_idx]].append(cumulative_rewards[env_idx].copy())
+                opponent_episode_rewards[env_opponent[env_idx]].append(opponent_cumulative_rewards[env_idx].copy())
+            cumulative_rewards[dones_env == True] = 0
+            opponent_cumulative_rewards[dones_env == True] = 0
+
+        # Compute average episode rewards of the first `num_episodes` episodes of each opponent
+        # shape (len(opponents), num_episodes, num_agents, 1) => (len(opponents),)
+        average_episode_rewards = np.array([rewards[:num_episodes] for rewards in episode_rewards]).mean(axis=(1, 2, 3))
+        opponent_average_episode_rewards = \
+            np.array([rewards[:num_episodes] for rewards in opponent_episode_rewards]).mean(axis=(1, 2, 3))
+        return average_episode_rewards, opponent_average_episode_rewards
         
     def save(self, episode):
         policy_actor_state_dict = self.policy.actor.state_dict()
@@ -244,14 +278,18 @@ class SelfplayJSBSimRunner(JSBSimRunner):
         torch.save(policy_critic_state_dict, str(self.save_dir) + '/critic_latest.pt')
         # [Selfplay] save policy & performance
         torch.save(policy_actor_state_dict, str(self.save_dir) + f'/actor_{episode}.pt')
+        self.policy_weights.add(str(episode), policy_actor_state_dict)
         self.policy_pool[str(episode)] = self.latest_elo
 
+    def close(self):
+        super().close()
+        self.policy_weights.close()
+
     def reset_opponent(self):
-        choose_opponents = []
-        for policy in self.opponent_policy:
-            choose_idx = self.selfplay_algo.choose(self.policy_pool)
-            choose_opponents.append(choose_idx)
-            policy.actor.load_state_dict(torch.load(str(self.save_dir) + f'/actor_{choose_idx}.pt'))
+        choose_opponents = [self.selfplay_algo.choose(self.policy_pool) for _ in self.opponent_policy]
+        self.policy_weights.prefetch(choose_opponents)
+        for policy, choose_idx in zip(self.opponent_policy, choose_opponents):
+            policy.actor.load_state_dict(self.policy_weights.get(choose_idx))
             policy.prep_rollout()
         logging.info(f" Choose opponents {choose_opponents} for training")
 
@@ -276,8 +314,8 @@ class SelfplayJSBSimRunner(JSBSimRunner):
         file_path = '/'.join(dir_list[:dir_list.index('results')+1])
         self.policy.actor.load_state_dict(torch.load(str(self.model_dir)+ f'/actor_{idx}.pt'))
         self.policy.prep_rollout()
-        self.eval_opponent_policy.actor.load_state_dict(torch.load(str(self.model_dir) + f'/actor_{opponent_idx}.pt'))
-        self.eval_opponent_policy.prep_rollout()
+        self.eval_opponent_policy[0].actor.load_state_dict(torch.load(str(self.model_dir) + f'/actor_{opponent_idx}.pt'))
+        self.eval_opponent_policy[0].prep_rollout()
         logging.info("\nStart render ...")
         render_episode_rewards = 0
         render_obs = self.envs.reset()
@@ -297,7 +335,7 @@ class SelfplayJSBSimRunner(JSBSimRunner):
             render_actions = np.expand_dims(_t2n(render_actions), axis=0)
             render_rnn_states = np.expand_dims(_t2n(render_rnn_states), axis=0)
             render_opponent_actions, render_opponent_rnn_states \
-                = self.eval_opponent_policy.act(np.concatenate(render_opponent_obs),
+                = self.eval_opponent_policy[0].act(np.concatenate(render_opponent_obs),
                                                 np.concatenate(render_opponent_rnn_states),
                                                 np.concatenate(render_opponent_masks),
                                                 deterministic=True)
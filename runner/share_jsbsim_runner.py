@@ -7,6 +7,7 @@ import torch
 
 from algorithms.utils.buffer import SharedReplayBuffer
 from .base_runner import Runner
+from .policy_pool import PolicyPool
 
 
 def _t2n(x):
@@ -21,6 +22,8 @@ class ShareJSBSimRunner(Runner):
         self.act_space = self.envs.action_space
         self.num_agents = self.envs.num_agents
         self.use_selfplay = self.all_args.use_selfplay  # type: bool
+        assert not self.all_args.use_torch_buffer, "ShareJSBSimRunner does not support torch buffer"
+        assert not self.all_args.use_async_learner, "ShareJSBSimRunner does not support async learner"
 
         # policy & algorithm
         if self.algorithm_name == "mappo":
@@ -47,6 +50,8 @@ class ShareJSBSimRunner(Runner):
                 "Number of different opponents({}) must less than or equal to number of training threads({})!" \
                 .format(self.all_args.n_choose_opponents, self.n_rollout_threads)
             self.policy_pool = {'latest': self.all_args.init_elo}  # type: dict[str, float]
+            # [Selfplay] weights of saved policies, cached in RAM
+            self.policy_weights = PolicyPool(self.save_dir, int(self.all_args.policy_pool_mib * 2 ** 20))
             self.opponent_policy = [
                 Policy(self.all_args, self.obs_space, self.share_obs_space, self.act_space, device=self.device)
                 for _ in range(self.all_args.n_choose_opponents)]
@@ -64,6 +69,9 @@ class ShareJSBSimRunner(Runner):
         if self.model_dir is not None:
             self.restore()
 
+        self.start_learners((self.obs_space, self.share_obs_space, self.act_space),
+                            (self.buffer.num_agents, self.obs_space, self.share_obs_space, self.act_space))
+
     def run(self):
         self.warmup()
 
@@ -216,6 +224,7 @@ class ShareJSBSimRunner(Runner):
             eval_each_episodes = self.eval_episodes // self.all_args.n_choose_opponents
             eval_cur_opponent_idx = 0
             logging.info(f" Choose opponents {eval_choose_opponents} for evaluation")
+            self.policy_weights.prefetch(eval_choose_opponents)
             # TODO: use eval results to update elo
 
         while total_episodes < self.eval_episodes:
@@ -223,7 +232,7 @@ class ShareJSBSimRunner(Runner):
             # [Selfplay] Load opponent policy
             if self.use_selfplay and total_episodes >= eval_cur_opponent_idx * eval_each_episodes:
                 policy_idx = eval_choose_opponents[eval_cur_opponent_idx]
-                self.eval_opponent_policy.actor.load_state_dict(torch.load(str(self.save_dir) + f'/actor_{policy_idx}.pt'))
+                self.eval_opponent_policy.actor.load_state_dict(self.policy_weights.get(policy_idx))
                 self.eval_opponent_policy.prep_rollout()
                 eval_cur_opponent_idx += 1
                 logging.info(f" Load opponent {policy_idx} for evaluation ({total_episodes+1}/{self.eval_episodes})")
@@ -281,6 +290,8 @@ class ShareJSBSimRunner(Runner):
 
         eval_infos = {}
         eval_infos['eval_average_episode_rewards'] = np.concatenate(eval_episode_rewards).mean() 
+        if self.use_selfplay:
+            eval_infos.update(self.policy_weights.stats())
         logging.info(" eval average episode rewards: " + str(eval_infos['eval_average_episode_rewards']))
         self.log_info(eval_infos, total_num_steps)
 
@@ -353,14 +364,20 @@ class ShareJSBSimRunner(Runner):
         # [Selfplay] save policy & performance
         if self.use_selfplay:
             torch.save(policy_actor_state_dict, str(self.save_dir) + f'/actor_{episode}.pt')
+            self.policy_weights.add(str(episode), policy_actor_state_dict)
+            self.policy_weights.add('latest', policy_actor_state_dict)
             self.policy_pool[str(episode)] = self.all_args.init_elo
 
+    def close(self):
+        super().close()
+        if self.use_selfplay:
+            self.policy_weights.close()
+
     def reset_opponent(self):
-        choose_opponents = []
-        for policy in self.opponent_policy:
-            choose_idx = self.selfplay_algo.choose(self.policy_pool)
-            choose_opponents.append(choose_idx)
-            policy.actor.load_state_dict(torch.load(str(self.save_dir) + f'/actor_{choose_idx}.pt'))
+        choose_opponents = [self.selfplay_algo.choose(self.policy_pool) for _ in self.opponent_policy]
+        self.policy_weights.prefetch(choose_opponents)
+        for policy, choose_idx in zip(self.opponent_policy, choose_opponents):
+            policy.actor.load_state_dict(self.policy_weights.get(choose_idx))
             policy.prep_rollout()
         logging.info(f" Choose opponents {choose_opponents} for training")
 
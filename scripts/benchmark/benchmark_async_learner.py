@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import tempfile
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from scripts.train.train_jsbsim import make_train_env
+from runner.jsbsim_runner import JSBSimRunner
+
+
+def parse_args(args):
+    parser = get_config()
+    parser.description = "Benchmark training wall time with and without the async learner."
+    parser.set_defaults(env_name="SingleCombat", n_rollout_threads=4, buffer_size=200, num_env_steps=4000,
+                        ppo_epoch=4, num_mini_batch=2, log_interval=1000, save_interval=1000)
+    group = parser.add_argument_group("Benchmark parameters")
+    group.add_argument("--scenario-name", type=str, default="1v1/DodgeMissile/vsBaseline",
+                       help="Which scenario to run on")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    torch.set_num_threads(all_args.n_training_threads)
+    timings = {}
+    for use_async_learner in [False, True]:
+        all_args.use_async_learner = use_async_learner
+        envs = make_train_env(all_args)
+        with tempfile.TemporaryDirectory() as run_dir:
+            torch.manual_seed(all_args.seed)
+            runner = JSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": None,
+                                   "device": torch.device("cpu"), "run_dir": run_dir})
+            start = time.perf_counter()
+            runner.run()
+            timings[use_async_learner] = time.perf_counter() - start
+        envs.close()
+    num_steps = int(all_args.num_env_steps) // (all_args.buffer_size * all_args.n_rollout_threads) \
+        * all_args.buffer_size * all_args.n_rollout_threads
+    logging.info(f"{all_args.scenario_name} n_rollout_threads={all_args.n_rollout_threads} "
+                 f"buffer_size={all_args.buffer_size} {num_steps} env steps: "
+                 f"sync {timings[False]:.1f} s ({num_steps / timings[False]:.0f} FPS), "
+                 f"async learner {timings[True]:.1f} s ({num_steps / timings[True]:.0f} FPS), "
+                 f"speedup {timings[False] / timings[True]:.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
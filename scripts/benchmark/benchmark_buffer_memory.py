@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from envs.JSBSim.envs import SingleCombatEnv, SingleControlEnv, MultipleCombatEnv
+from algorithms.utils.buffer import ReplayBuffer, SharedReplayBuffer
+
+
+def make_buffer(all_args, env):
+    """Replay buffer of the runner training `env` (see `JSBSimRunner`, `SelfplayJSBSimRunner` and `ShareJSBSimRunner`)."""
+    num_agents = env.num_agents // 2 if all_args.use_selfplay else env.num_agents
+    if all_args.algorithm_name == "mappo":
+        return SharedReplayBuffer(all_args, num_agents, env.observation_space, env.share_observation_space,
+                                  env.action_space)
+    return ReplayBuffer(all_args, num_agents, env.observation_space, env.action_space)
+
+
+def reallocating_clear(buffer: ReplayBuffer):
+    """Former `ReplayBuffer.clear`, which reallocated every array."""
+    buffer.step = 0
+    for name in buffer._fields:
+        array = getattr(buffer, name)
+        setattr(buffer, name, np.ones_like(array) if name in buffer._mask_fields else np.zeros_like(array))
+
+
+def parse_args(args):
+    parser = get_config()
+    parser.description = "Report replay buffer memory usage for buffer configurations."
+    parser.set_defaults(env_name="SingleCombat")
+    group = parser.add_argument_group("Benchmark parameters")
+    group.add_argument("--scenario-name", type=str, default="1v1/NoWeapon/Selfplay",
+                       help="Which scenario to run on")
+    group.add_argument("--buffer-sizes", type=int, nargs="+", default=[200, 1000, 3000],
+                       help="buffer sizes to report (default 200 1000 3000)")
+    group.add_argument("--time-clear", action="store_true", default=False,
+                       help="By default False, if set, also time in-place clear() against reallocating every array.")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    env = {"SingleCombat": SingleCombatEnv, "SingleControl": SingleControlEnv,
+           "MultipleCombat": MultipleCombatEnv}[all_args.env_name](all_args.scenario_name)
+    env.close()
+    for buffer_size in all_args.buffer_sizes:
+        all_args.buffer_size = buffer_size
+        # arrays are zero-initialized lazily, so that large configurations can be reported without using their memory
+        buffer = make_buffer(all_args, env)
+        usage = buffer.memory_usage()
+        logging.info(f"{type(buffer).__name__} of {all_args.env_name}/{all_args.scenario_name} "
+                     f"buffer_size={buffer_size} n_rollout_threads={all_args.n_rollout_threads} "
+                     f"num_agents={buffer.num_agents}: {buffer.nbytes / 2 ** 20:.1f} MiB")
+        for name, nbytes in usage.items():
+            logging.info(f"    {name:<20}{str(getattr(buffer, name).shape):<28}{nbytes / 2 ** 20:10.1f} MiB")
+        if all_args.time_clear:
+            timings = {}
+            for name, clear in [("reallocating", reallocating_clear), ("in-place", type(buffer).clear)]:
+                clear(buffer)
+                start = time.perf_counter()
+                clear(buffer)
+                timings[name] = time.perf_counter() - start
+            logging.info(f"    clear: reallocating {timings['reallocating'] * 1e3:.1f} ms, "
+                         f"in-place {timings['in-place'] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import gym
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from algorithms.utils.buffer import ReplayBuffer
+
+
+def step_by_step_returns(buffer: ReplayBuffer, next_value: np.ndarray):
+    """Reference step-by-step computation of `ReplayBuffer.compute_returns`."""
+    if buffer.use_gae:
+        buffer.value_preds[-1] = next_value
+        gae = 0
+        for step in reversed(range(buffer.rewards.shape[0])):
+            td_delta = buffer.rewards[step] + buffer.gamma * buffer.value_preds[step + 1] * buffer.masks[step + 1] \
+                - buffer.value_preds[step]
+            gae = td_delta + buffer.gamma * buffer.gae_lambda * buffer.masks[step + 1] * gae
+            if buffer.use_proper_time_limits:
+                gae = gae * buffer.bad_masks[step + 1]
+            buffer.returns[step] = gae + buffer.value_preds[step]
+    else:
+        buffer.returns[-1] = next_value
+        for step in reversed(range(buffer.rewards.shape[0])):
+            if buffer.use_proper_time_limits:
+                buffer.returns[step] = (buffer.returns[step + 1] * buffer.gamma * buffer.masks[step + 1] + buffer.rewards[step]) \
+                    * buffer.bad_masks[step + 1] + (1 - buffer.bad_masks[step + 1]) * buffer.value_preds[step]
+            else:
+                buffer.returns[step] = buffer.returns[step + 1] * buffer.gamma * buffer.masks[step + 1] + buffer.rewards[step]
+
+
+def make_buffer(buffer_size, n_rollout_threads, num_agents, use_gae, use_proper_time_limits, seed=0):
+    args = get_config().parse_args(["--buffer-size", str(buffer_size), "--n-rollout-threads", str(n_rollout_threads)])
+    args.use_gae, args.use_proper_time_limits = use_gae, use_proper_time_limits
+    buffer = ReplayBuffer(args, num_agents, gym.spaces.Box(low=-1, high=1, shape=(1,)), gym.spaces.Discrete(2))
+    rng = np.random.default_rng(seed)
+    buffer.rewards[:] = rng.normal(size=buffer.rewards.shape)
+    buffer.value_preds[:] = rng.normal(size=buffer.value_preds.shape)
+    buffer.masks[:] = rng.random(buffer.masks.shape) > 0.01
+    buffer.bad_masks[:] = rng.random(buffer.bad_masks.shape) > 0.01
+    return buffer, rng.normal(size=buffer.value_preds.shape[1:]).astype(np.float32)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark ReplayBuffer.compute_returns against a step-by-step loop.")
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[200, 1000, 3000],
+                        help="buffer sizes to benchmark (default 200 1000 3000)")
+    parser.add_argument("--n-rollout-threads", type=int, default=64,
+                        help="number of rollout threads (default 64)")
+    parser.add_argument("--num-agents", type=int, default=1,
+                        help="number of agents (default 1)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="number of timed calls, the best is reported (default 5)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    for buffer_size in all_args.buffer_sizes:
+        for use_gae in [True, False]:
+            for use_proper_time_limits in [False, True]:
+                buffer, next_value = make_buffer(buffer_size, all_args.n_rollout_threads, all_args.num_agents,
+                                                 use_gae, use_proper_time_limits)
+                timings = {}
+                returns = {}
+                for name, compute_returns in [("step-by-step", lambda: step_by_step_returns(buffer, next_value)),
+                                              ("compute_returns", lambda: buffer.compute_returns(next_value))]:
+                    durations = []
+                    for _ in range(all_args.repeats):
+                        buffer.returns[:] = 0
+                        start = time.perf_counter()
+                        compute_returns()
+                        durations.append(time.perf_counter() - start)
+                    timings[name] = min(durations)
+                    returns[name] = buffer.returns[:-1].copy()
+                identical = np.array_equal(returns["step-by-step"], returns["compute_returns"])
+                logging.info(f"buffer_size={buffer_size} use_gae={use_gae} use_proper_time_limits={use_proper_time_limits}: "
+                             f"step-by-step {timings['step-by-step'] * 1e3:.2f} ms, "
+                             f"compute_returns {timings['compute_returns'] * 1e3:.2f} ms "
+                             f"(x{timings['step-by-step'] / timings['compute_returns']:.2f}), identical: {identical}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import gym
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from algorithms.ppo.ppo_policy import PPOPolicy
+from algorithms.ppo.ppo_trainer import PPOTrainer
+from runner.distributed_learners import DistributedLearners
+from scripts.benchmark.benchmark_ppo_update import make_buffer
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark PPO updates/sec of data-parallel learner processes.")
+    parser.add_argument("--buffer-size", type=int, default=200,
+                        help="buffer size (default 200)")
+    parser.add_argument("--n-rollout-threads", type=int, default=32,
+                        help="number of rollout threads (default 32)")
+    parser.add_argument("--num-mini-batch", type=int, default=4,
+                        help="number of minibatches of each epoch (default 4)")
+    parser.add_argument("--ppo-epoch", type=int, default=4,
+                        help="number of ppo epochs of each update, timed after a warm-up update (default 4)")
+    parser.add_argument("--n-training-threads", type=int, default=1,
+                        help="number of torch threads of each learner (default 1)")
+    parser.add_argument("--num-learners", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="numbers of learner processes to benchmark (default 1 2 4 8)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    torch.set_num_threads(all_args.n_training_threads)
+    logging.info(f"{os.cpu_count()} CPUs: learners beyond this number (times torch threads) share cores, "
+                 f"and are expected to slow updates down")
+    # default 128 128 architecture of SingleCombat tasks
+    obs_space = gym.spaces.Box(low=-10, high=10, shape=(15,))
+    act_space = gym.spaces.MultiDiscrete([41, 41, 41, 30])
+    baseline = None
+    for num_learners in all_args.num_learners:
+        args = get_config().parse_args(["--buffer-size", str(all_args.buffer_size),
+                                        "--n-rollout-threads", str(all_args.n_rollout_threads),
+                                        "--num-mini-batch", str(all_args.num_mini_batch),
+                                        "--ppo-epoch", str(all_args.ppo_epoch),
+                                        "--n-training-threads", str(all_args.n_training_threads),
+                                        "--num-learners", str(num_learners)])
+        buffer = make_buffer(args, 1, obs_space, act_space)
+        torch.manual_seed(0)
+        policy = PPOPolicy(args, obs_space, act_space, device=torch.device("cpu"))
+        trainer = PPOTrainer(args, device=torch.device("cpu"))
+        learners = DistributedLearners(args, policy, trainer, buffer, (obs_space, act_space),
+                                       (1, obs_space, act_space)) if num_learners > 1 else None
+        try:
+            policy.prep_training()
+            durations = []
+            # all learners run `args.ppo_epoch` epochs: warm up, then timed update
+            for _ in range(2):
+                start = time.perf_counter()
+                if learners is not None:
+                    learners.sync(policy, buffer)
+                train_info = trainer.train(policy, buffer)
+                durations.append(time.perf_counter() - start)
+        finally:
+            if learners is not None:
+                learners.close()
+        updates_per_sec = all_args.ppo_epoch * all_args.num_mini_batch / durations[1]
+        baseline = baseline or updates_per_sec
+        logging.info(f"{num_learners} learners: {updates_per_sec:.2f} updates/s ({updates_per_sec / baseline:.2f}x), "
+                     f"minibatch of {all_args.buffer_size * all_args.n_rollout_threads // all_args.num_mini_batch} "
+                     f"steps, policy loss {train_info['policy_loss']:.4f}, value loss {train_info['value_loss']:.4f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
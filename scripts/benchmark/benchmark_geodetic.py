@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import numpy as np
+import pymap3d
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from envs.JSBSim.utils.utils import get_neu_converter
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Throughput of pymap3d vs vectorized NEUConverter LLA<->NEU conversion.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 256, 4096],
+                        help="number of points converted per call")
+    parser.add_argument("--repeat", type=int, default=2000,
+                        help="number of timed calls per batch size (default 2000)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    lon0, lat0, alt0 = 120.0, 60.0, 0.0
+    converter = get_neu_converter(lon0, lat0, alt0)
+    rng = np.random.default_rng(0)
+    for batch_size in all_args.batch_sizes:
+        lla = np.stack([lon0 + rng.uniform(-1, 1, batch_size),
+                        lat0 + rng.uniform(-1, 1, batch_size),
+                        rng.uniform(0, 20000, batch_size)], axis=-1)
+        neu = converter.lla2neu(lla)
+        if batch_size == 1:
+            # the per-step simulator path: one (3,) point per call
+            lla, neu = lla[0], neu[0]
+        repeat = max(all_args.repeat // batch_size, 10)
+        timings = {
+            "pymap3d lla2neu": timeit(lambda: pymap3d.geodetic2ned(lla[..., 1], lla[..., 0], lla[..., 2], lat0, lon0, alt0), repeat),
+            "converter lla2neu": timeit(lambda: converter.lla2neu(lla), repeat),
+            "pymap3d neu2lla": timeit(lambda: pymap3d.ned2geodetic(neu[..., 0], neu[..., 1], -neu[..., 2], lat0, lon0, alt0), repeat),
+            "converter neu2lla": timeit(lambda: converter.neu2lla(neu), repeat),
+        }
+        for name, duration in timings.items():
+            logging.info(f"batch {batch_size:5d} | {name}: {duration * 1e6:10.2f} us per call, "
+                         f"{batch_size / duration / 1e6:8.3f} M points/s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import torch
+import torch.nn.functional as F
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from algorithms.utils.gru import GRULayer
+
+
+def masked_forward(layer: GRULayer, x, hxs, masks):
+    """Candidate `GRULayer.forward` for T>1: rnn states reset per sequence at each step instead of splitting the
+    chunk at every step where any mask is zero. Input projections of all steps are one matmul per layer, only the
+    hidden state update (gates ordered as (reset, update, new) like nn.GRU) loops over steps."""
+    N = hxs.size(0)
+    T = int(x.size(0) / N)
+    x = x.view(T, N, x.size(1))
+    masks = masks.view(T, N, 1)
+    hxs = hxs.transpose(0, 1)
+    last_states = []
+    for i in range(layer._num_layers):
+        weight_ih, weight_hh, bias_ih, bias_hh = [getattr(layer.gru, f"{name}_l{i}")
+                                                  for name in ("weight_ih", "weight_hh", "bias_ih", "bias_hh")]
+        gi = F.linear(x, weight_ih, bias_ih)  # [T, N, 3 * hidden_size]
+        h = hxs[i]
+        outputs = []
+        for t in range(T):
+            h = h * masks[t]
+            i_r, i_z, i_n = gi[t].chunk(3, dim=-1)
+            h_r, h_z, h_n = F.linear(h, weight_hh, bias_hh).chunk(3, dim=-1)
+            r = torch.sigmoid(i_r + h_r)
+            z = torch.sigmoid(i_z + h_z)
+            n = torch.tanh(i_n + r * h_n)
+            h = n + z * (h - n)
+            outputs.append(h)
+        x = torch.stack(outputs)
+        last_states.append(h)
+    x = x.view(T * N, -1)
+    return layer.norm(x), torch.stack(last_states).transpose(0, 1)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark GRULayer sequence forward/backward against a per-sequence masked loop.")
+    parser.add_argument("--num-sequences", type=int, nargs="+", default=[64, 512],
+                        help="numbers of sequences of a minibatch (default 64 512)")
+    parser.add_argument("--reset-probs", type=float, nargs="+", default=[0.0, 0.01, 0.05, 0.2],
+                        help="probabilities of a zero mask at each step (default 0.0 0.01 0.05 0.2)")
+    parser.add_argument("--data-chunk-length", type=int, default=10,
+                        help="recurrent chunk length T (default 10)")
+    parser.add_argument("--recurrent-hidden-size", type=int, default=128,
+                        help="input and hidden size of the GRU (default 128)")
+    parser.add_argument("--recurrent-hidden-layers", type=int, default=1,
+                        help="number of GRU layers (default 1)")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help="number of timed forward/backward passes (default 20)")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu",
+                        help="device (default cuda if available, else cpu)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    device = torch.device(all_args.device)
+    torch.manual_seed(0)
+    size, L, T = all_args.recurrent_hidden_size, all_args.recurrent_hidden_layers, all_args.data_chunk_length
+    layer = GRULayer(size, size, L).to(device)
+    for N in all_args.num_sequences:
+        for reset_prob in all_args.reset_probs:
+            x = torch.randn(T * N, size, device=device)
+            hxs = torch.randn(N, L, size, device=device)
+            masks = (torch.rand(T * N, 1, device=device) > reset_prob).float()
+            timings = {}
+            for name, forward in [("split", GRULayer.forward), ("masked", masked_forward)]:
+                for i in range(all_args.repeats + 1):
+                    if i == 1:  # first pass is a warm-up
+                        if device.type == "cuda":
+                            torch.cuda.synchronize()
+                        start = time.perf_counter()
+                    out, h = forward(layer, x, hxs, masks)
+                    (out.sum() + h.sum()).backward()
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                timings[name] = (time.perf_counter() - start) / all_args.repeats
+                timings[name + "_out"] = out.detach(), h.detach()
+            error = max((a - b).abs().max().item() for a, b in zip(timings["split_out"], timings["masked_out"]))
+            num_split_calls = int(((masks.view(T, N)[1:] == 0).any(dim=-1)).sum()) + 1
+            logging.info(f"N={N} T={T} reset_prob={reset_prob}: split ({num_split_calls} GRU calls) "
+                         f"{timings['split'] * 1e3:.2f} ms, masked {timings['masked'] * 1e3:.2f} ms, "
+                         f"masked/split speedup {timings['split'] / timings['masked']:.2f}x, max abs diff {error:.2e}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
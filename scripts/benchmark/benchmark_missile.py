@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from envs.JSBSim.envs import MultipleCombatEnv
+from envs.JSBSim.core.simulatior import MissileSimulator
+
+
+def launch(env, num_missiles):
+    agents = list(env.agents.values())
+    for i in range(num_missiles):
+        parent = agents[i % len(agents)]
+        env.add_temp_simulator(MissileSimulator.create(parent, parent.enemies[i % len(parent.enemies)], f"M{i:04d}"))
+    return list(env._tempsims.values())
+
+
+def benchmark(env, num_missiles, num_steps, batched):
+    """Measure the latency of advancing `num_missiles` missiles by one simulation step."""
+    env.reset()
+    missiles = launch(env, num_missiles)
+    state = env.save_state()
+    if not batched:
+        env._missile_batch.clear()
+    latencies = []
+    for _ in range(num_steps):
+        start = time.perf_counter()
+        if batched:
+            env._missile_batch.run()
+        else:
+            for missile in missiles:
+                missile.run()
+        latencies.append(time.perf_counter() - start)
+    num_alive = sum(missile.is_alive for missile in missiles)
+    env.restore_state(state)
+    return np.array(latencies) * 1e6, num_alive
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark per-missile vs MissileBatch missile simulation.")
+    parser.add_argument("--scenario-name", type=str, default="2v2/ShootMissile/HierarchySelfplay",
+                        help="MultipleCombat scenario providing the launching/target aircrafts")
+    parser.add_argument("--num-missiles", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="number of simultaneous missiles")
+    parser.add_argument("--num-steps", type=int, default=120,
+                        help="number of timed simulation steps (default 120, i.e. 10 env steps)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    env = MultipleCombatEnv(all_args.scenario_name)
+    env.seed(0)
+    for num_missiles in all_args.num_missiles:
+        for batched in [False, True]:
+            latencies, num_alive = benchmark(env, num_missiles, all_args.num_steps, batched)
+            logging.info(f"{num_missiles:3d} missiles, {'batch' if batched else 'per-missile'}: "
+                         f"mean {latencies.mean():.1f} us, p50 {np.percentile(latencies, 50):.1f} us "
+                         f"per simulation step ({num_alive} alive at the end)")
+    env.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import tempfile
+import gym
+import numpy as np
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from algorithms.ppo.ppo_policy import PPOPolicy
+from algorithms.utils.selfplay import get_algorithm
+from runner.policy_pool import PolicyPool
+
+
+def parse_args(args):
+    parser = get_config()
+    parser.description = "Benchmark opponent switches with and without the in-memory policy pool."
+    parser.set_defaults(selfplay_algorithm="fsp")
+    group = parser.add_argument_group("Benchmark parameters")
+    group.add_argument("--num-checkpoints", type=int, default=500,
+                       help="number of saved policies (default 500)")
+    group.add_argument("--num-switches", type=int, default=200,
+                       help="number of timed opponent switches (default 200)")
+    group.add_argument("--pool-fraction", type=float, default=0.5,
+                       help="memory budget of the pool, as a fraction of the size of all checkpoints (default 0.5)")
+    group.add_argument("--rollout-ms", type=float, default=20,
+                       help="simulated rollout time between opponent switches, in ms (default 20)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    # default 128 128 architecture of SingleCombat tasks
+    obs_space = gym.spaces.Box(low=-10, high=10, shape=(15,))
+    act_space = gym.spaces.MultiDiscrete([41, 41, 41, 30])
+    policy = PPOPolicy(all_args, obs_space, act_space, device=torch.device("cpu"))
+    state_dict = policy.actor.state_dict()
+    nbytes = sum(v.numel() * v.element_size() for v in state_dict.values())
+    selfplay_algo = get_algorithm(all_args.selfplay_algorithm)
+    rng = np.random.default_rng(all_args.seed)
+
+    with tempfile.TemporaryDirectory() as save_dir:
+        for i in range(all_args.num_checkpoints):
+            torch.save(state_dict, f"{save_dir}/actor_{i}.pt")
+        policy_pool = {str(i): all_args.init_elo + rng.normal(scale=50) for i in range(all_args.num_checkpoints)}
+        np.random.seed(all_args.seed)
+        choices = [selfplay_algo.choose(policy_pool) for _ in range(all_args.num_switches)]
+
+        # time spent switching opponents only, rollouts in between are simulated by sleeping
+        load_duration = 0
+        for key in choices:
+            start = time.perf_counter()
+            policy.actor.load_state_dict(torch.load(f"{save_dir}/actor_{key}.pt"))
+            load_duration += time.perf_counter() - start
+            time.sleep(all_args.rollout_ms / 1e3)
+
+        pool = PolicyPool(save_dir, int(all_args.pool_fraction * all_args.num_checkpoints * nbytes))
+        pool_duration = 0
+        for i, key in enumerate(choices):
+            start = time.perf_counter()
+            policy.actor.load_state_dict(pool.get(key))
+            # the next opponent is loaded during the rollout, like eval opponents chosen before evaluating
+            if i + 1 < len(choices):
+                pool.prefetch([choices[i + 1]])
+            pool_duration += time.perf_counter() - start
+            time.sleep(all_args.rollout_ms / 1e3)
+        pool.close()
+
+    logging.info(f"{all_args.num_checkpoints} checkpoints of {nbytes / 2 ** 10:.0f} KiB, "
+                 f"{all_args.selfplay_algorithm} opponents, pool of {all_args.pool_fraction:.0%} of them")
+    logging.info(f"torch.load: {load_duration / all_args.num_switches * 1e3:.2f} ms stalled per switch")
+    logging.info(f"PolicyPool: {pool_duration / all_args.num_switches * 1e3:.2f} ms stalled per switch, {pool.stats()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import gym
+import numpy as np
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from algorithms.ppo.ppo_policy import PPOPolicy
+from algorithms.ppo.ppo_trainer import PPOTrainer
+from algorithms.utils.buffer import ReplayBuffer
+
+
+def make_buffer(args, num_agents, obs_space, act_space, seed=0):
+    """Replay buffer filled with random data, with episodes ending at 1% of steps."""
+    buffer = ReplayBuffer(args, num_agents, obs_space, act_space)
+    rng = np.random.default_rng(seed)
+    buffer.obs[:] = rng.normal(size=buffer.obs.shape)
+    buffer.actions[:] = np.stack([rng.integers(n, size=buffer.actions.shape[:-1]) for n in act_space.nvec], axis=-1)
+    buffer.action_log_probs[:] = rng.normal(size=buffer.action_log_probs.shape) - 10
+    buffer.value_preds[:] = rng.normal(size=buffer.value_preds.shape)
+    buffer.returns[:] = rng.normal(size=buffer.returns.shape)
+    buffer.masks[:] = rng.random(buffer.masks.shape) > 0.01
+    return buffer
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark PPO updates/sec of the default and fast training paths.")
+    parser.add_argument("--buffer-size", type=int, default=200,
+                        help="buffer size (default 200)")
+    parser.add_argument("--n-rollout-threads", type=int, default=32,
+                        help="number of rollout threads (default 32)")
+    parser.add_argument("--num-mini-batch", type=int, default=4,
+                        help="number of minibatches of each epoch (default 4)")
+    parser.add_argument("--ppo-epoch", type=int, default=4,
+                        help="number of timed ppo epochs, after one warm-up epoch (default 4)")
+    parser.add_argument("--n-training-threads", type=int, default=torch.get_num_threads(),
+                        help="number of torch threads (default torch default)")
+    parser.add_argument("--modes", type=str, nargs="+",
+                        default=["default", "--use-fused-optimizer", "--use-bf16-autocast", "--use-torch-compile",
+                                 "--use-fused-optimizer --use-bf16-autocast --use-torch-compile"],
+                        help="training flags to benchmark, 'default' for none")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    torch.set_num_threads(all_args.n_training_threads)
+    # default 128 128 architecture of SingleCombat tasks
+    obs_space = gym.spaces.Box(low=-10, high=10, shape=(15,))
+    act_space = gym.spaces.MultiDiscrete([41, 41, 41, 30])
+    for mode in all_args.modes:
+        flags = [] if mode == "default" else mode.split(" ")
+        args = get_config().parse_args(["--buffer-size", str(all_args.buffer_size),
+                                        "--n-rollout-threads", str(all_args.n_rollout_threads),
+                                        "--num-mini-batch", str(all_args.num_mini_batch)] + flags)
+        buffer = make_buffer(args, 1, obs_space, act_space)
+        torch.manual_seed(0)
+        policy = PPOPolicy(args, obs_space, act_space, device=torch.device("cpu"))
+        trainer = PPOTrainer(args, device=torch.device("cpu"))
+        policy.prep_training()
+
+        # warm up (and compile)
+        trainer.ppo_epoch = 1
+        start = time.perf_counter()
+        trainer.train(policy, buffer)
+        warmup = time.perf_counter() - start
+        trainer.ppo_epoch = all_args.ppo_epoch
+        start = time.perf_counter()
+        train_info = trainer.train(policy, buffer)
+        duration = time.perf_counter() - start
+        num_updates = all_args.ppo_epoch * all_args.num_mini_batch
+        logging.info(f"{mode}: {num_updates / duration:.2f} updates/s (warm-up epoch {warmup:.1f} s), "
+                     f"minibatch of {all_args.buffer_size * all_args.n_rollout_threads // all_args.num_mini_batch} steps, "
+                     f"policy loss {train_info['policy_loss']:.4f}, value loss {train_info['value_loss']:.4f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from envs.JSBSim.envs import SingleCombatEnv
+from envs.JSBSim.core.catalog import PropertyReadPlan
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Microbenchmark of per-property vs planned batched property reads.")
+    parser.add_argument("--scenario-name", type=str, default="1v1/NoWeapon/Selfplay",
+                        help="SingleCombat scenario whose task state_var is read")
+    parser.add_argument("--num-reads", type=int, default=20000,
+                        help="number of timed reads (default 20000)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    env = SingleCombatEnv(all_args.scenario_name)
+    env.seed(0)
+    env.reset()
+    sim = list(env.agents.values())[0]
+    props = env.task.state_var
+    plan = PropertyReadPlan(props)
+    assert np.all(plan.read(sim) == np.array([sim.get_property_value(prop) for prop in props]))
+
+    timings = {}
+    start = time.perf_counter()
+    for _ in range(all_args.num_reads):
+        np.array([sim.get_property_value(prop) for prop in props])
+    timings["per-property"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(all_args.num_reads):
+        plan.read(sim)
+    timings["read plan"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(all_args.num_reads):
+        sim.get_property_values(props)
+    timings["get_property_values"] = time.perf_counter() - start
+    for name, duration in timings.items():
+        logging.info(f"{name}: {duration / all_args.num_reads * 1e6:.2f} us per read of {len(props)} properties")
+    env.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
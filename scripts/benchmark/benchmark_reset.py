@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from envs.JSBSim.envs import SingleCombatEnv, SingleControlEnv, MultipleCombatEnv
+
+
+def make_env(env_name, scenario_name):
+    if env_name == "SingleCombat":
+        return SingleCombatEnv(scenario_name)
+    elif env_name == "SingleControl":
+        return SingleControlEnv(scenario_name)
+    elif env_name == "MultipleCombat":
+        return MultipleCombatEnv(scenario_name)
+    else:
+        logging.error("Can not support the " + env_name + "environment.")
+        raise NotImplementedError
+
+
+def benchmark(env, num_resets, episode_steps):
+    """Measure per-reset latency, stepping a few random actions between resets to dirty the FDM."""
+    env.seed(0)
+    env.action_space.seed(0)
+    env.reset()
+    latencies = []
+    for _ in range(num_resets):
+        for _ in range(episode_steps):
+            env.step(np.array([env.action_space.sample() for _ in range(env.num_agents)]))
+        start = time.perf_counter()
+        env.reset()
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark env.reset() latency with cold/warm JSBSim reset.")
+    parser.add_argument("--env-name", type=str, default="SingleCombat",
+                        help="specify the name of environment")
+    parser.add_argument("--scenario-name", type=str, default="1v1/NoWeapon/Selfplay",
+                        help="Which scenario to run on")
+    parser.add_argument("--num-resets", type=int, default=100,
+                        help="number of timed resets (default 100)")
+    parser.add_argument("--episode-steps", type=int, default=5,
+                        help="number of env steps between two resets (default 5)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    for warm_reset in [False, True]:
+        env = make_env(all_args.env_name, all_args.scenario_name)
+        env.config.warm_reset = warm_reset
+        env.load_simulator()
+        latencies = benchmark(env, all_args.num_resets, all_args.episode_steps)
+        env.close()
+        logging.info(f"{'warm' if warm_reset else 'cold'} reset: mean {latencies.mean():.3f} ms, "
+                     f"p50 {np.percentile(latencies, 50):.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms "
+                     f"({all_args.num_resets} resets, {all_args.env_name}/{all_args.scenario_name})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
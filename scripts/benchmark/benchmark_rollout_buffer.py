@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import gym
+import numpy as np
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from algorithms.ppo.ppo_policy import PPOPolicy
+from algorithms.ppo.ppo_trainer import PPOTrainer
+from algorithms.utils.buffer import ReplayBuffer, TorchReplayBuffer
+
+
+def _t2n(x):
+    return x.detach().cpu().numpy()
+
+
+def numpy_rollout(policy: PPOPolicy, buffer: ReplayBuffer, env_step):
+    """Rollout of `JSBSimRunner.collect` and `JSBSimRunner.insert`: policy outputs go through numpy."""
+    n = buffer.n_rollout_threads
+    for step in range(buffer.buffer_size):
+        values, actions, action_log_probs, rnn_states_actor, rnn_states_critic \
+            = policy.get_actions(np.concatenate(buffer.obs[step]),
+                                 np.concatenate(buffer.rnn_states_actor[step]),
+                                 np.concatenate(buffer.rnn_states_critic[step]),
+                                 np.concatenate(buffer.masks[step]))
+        values = np.array(np.split(_t2n(values), n))
+        actions = np.array(np.split(_t2n(actions), n))
+        action_log_probs = np.array(np.split(_t2n(action_log_probs), n))
+        rnn_states_actor = np.array(np.split(_t2n(rnn_states_actor), n))
+        rnn_states_critic = np.array(np.split(_t2n(rnn_states_critic), n))
+        obs, rewards, masks = env_step(actions)
+        buffer.insert(obs, actions, rewards, masks, action_log_probs, values, rnn_states_actor, rnn_states_critic)
+
+
+def torch_rollout(policy: PPOPolicy, buffer: TorchReplayBuffer, env_step):
+    """Rollout of `JSBSimRunner.sync_rollout`: policy outputs are written into tensors in place."""
+    n = buffer.n_rollout_threads
+    flat = lambda x: x.reshape(-1, *x.shape[2:])
+    for step in range(buffer.buffer_size):
+        values, actions, action_log_probs, rnn_states_actor, rnn_states_critic \
+            = policy.get_actions(flat(buffer.obs[step]), flat(buffer.rnn_states_actor[step]),
+                                 flat(buffer.rnn_states_critic[step]), flat(buffer.masks[step]))
+        split = lambda x: x.reshape(n, -1, *x.shape[1:])
+        buffer.actions[step] = split(actions)
+        buffer.value_preds[step] = split(values)
+        buffer.action_log_probs[step] = split(action_log_probs)
+        buffer.rnn_states_actor[step + 1] = split(rnn_states_actor)
+        buffer.rnn_states_critic[step + 1] = split(rnn_states_critic)
+        obs, rewards, masks = env_step(_t2n(split(actions)))
+        buffer.obs[step + 1] = torch.as_tensor(obs, device=buffer.device)
+        buffer.rewards[step] = torch.as_tensor(rewards, device=buffer.device)
+        buffer.masks[step + 1] = torch.as_tensor(masks, device=buffer.device)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark rollout and training with numpy and torch replay buffers.")
+    parser.add_argument("--n-rollout-threads", type=int, nargs="+", default=[8, 32],
+                        help="numbers of rollout threads to benchmark (default 8 32)")
+    parser.add_argument("--buffer-size", type=int, default=200,
+                        help="buffer size (default 200)")
+    parser.add_argument("--num-agents", type=int, default=1,
+                        help="number of agents (default 1)")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu",
+                        help="rollout and training device (default cuda if available, else cpu)")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    device = torch.device(all_args.device)
+    obs_space = gym.spaces.Box(low=-10, high=10, shape=(15,))
+    act_space = gym.spaces.MultiDiscrete([41, 41, 41, 30])
+    for n_rollout_threads in all_args.n_rollout_threads:
+        args = get_config().parse_args(["--buffer-size", str(all_args.buffer_size),
+                                        "--n-rollout-threads", str(n_rollout_threads)])
+        policy = PPOPolicy(args, obs_space, act_space, device=device)
+        trainer = PPOTrainer(args, device=device)
+        rng = np.random.default_rng(0)
+
+        def env_step(actions):
+            # random env outputs, the cost of the envs themselves is excluded
+            shape = (n_rollout_threads, all_args.num_agents)
+            return rng.normal(size=(*shape, *obs_space.shape)).astype(np.float32), \
+                rng.normal(size=(*shape, 1)).astype(np.float32), \
+                (rng.random((*shape, 1)) > 0.01).astype(np.float32)
+
+        timings = {}
+        for name, buffer, rollout in [
+                ("numpy", ReplayBuffer(args, all_args.num_agents, obs_space, act_space), numpy_rollout),
+                ("torch", TorchReplayBuffer(args, all_args.num_agents, obs_space, act_space, device=device), torch_rollout)]:
+            torch.manual_seed(0)
+            policy.prep_rollout()
+            start = time.perf_counter()
+            with torch.no_grad():
+                rollout(policy, buffer, env_step)
+            rollout_time = time.perf_counter() - start
+            start = time.perf_counter()
+            policy.prep_training()
+            trainer.train(policy, buffer)
+            timings[name] = rollout_time, time.perf_counter() - start
+        logging.info(f"n_rollout_threads={n_rollout_threads} buffer_size={all_args.buffer_size} device={device}: "
+                     + ", ".join(f"{name} buffer rollout {rollout_time:.2f} s train {train_time:.2f} s"
+                                 for name, (rollout_time, train_time) in timings.items()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
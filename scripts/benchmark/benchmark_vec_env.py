@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import logging
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from envs.JSBSim.envs import SingleCombatEnv, SingleControlEnv, MultipleCombatEnv
+from envs.env_wrappers import SubprocVecEnv, ShmemVecEnv, ShareSubprocVecEnv, ShareShmemVecEnv, AsyncSubprocVecEnv, \
+    DummyVecEnv, ShareDummyVecEnv
+from envs.remote_vec_env import RemoteVecEnv, start_loopback_workers
+
+
+def make_env_fn(env_name, scenario_name, seed):
+    def init_env():
+        if env_name == "SingleCombat":
+            env = SingleCombatEnv(scenario_name)
+        elif env_name == "SingleControl":
+            env = SingleControlEnv(scenario_name)
+        elif env_name == "MultipleCombat":
+            env = MultipleCombatEnv(scenario_name)
+        else:
+            logging.error("Can not support the " + env_name + "environment.")
+            raise NotImplementedError
+        env.seed(seed)
+        return env
+    return init_env
+
+
+def benchmark(envs, num_steps):
+    """Measure vectorized env throughput (env steps per second) with random actions."""
+    rng = np.random.RandomState(0)
+    envs.reset()
+    actions = np.array([[[rng.randint(n) for n in envs.action_space.nvec] for _ in range(envs.num_agents)]
+                        for _ in range(envs.num_envs)])
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        envs.step(actions)
+    return num_steps * envs.num_envs / (time.perf_counter() - start)
+
+
+def benchmark_async(envs, num_steps):
+    """Measure AsyncSubprocVecEnv throughput (env steps per second), stepping whichever envs are ready."""
+    rng = np.random.RandomState(0)
+    envs.reset()
+    actions = np.array([[[rng.randint(n) for n in envs.action_space.nvec] for _ in range(envs.num_agents)]
+                        for _ in range(envs.num_envs)])
+    env_ids = np.arange(envs.num_envs)
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        envs.step_async(actions[env_ids], env_ids)
+        env_ids = envs.step_wait()[-1]
+    return num_steps * envs.batch_size / (time.perf_counter() - start)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark pipe-based vs shared-memory vectorized envs.")
+    parser.add_argument("--env-name", type=str, default="SingleCombat",
+                        help="specify the name of environment")
+    parser.add_argument("--scenario-name", type=str, default="1v1/NoWeapon/Selfplay",
+                        help="Which scenario to run on")
+    parser.add_argument("--n-rollout-threads", type=int, default=64,
+                        help="number of parallel envs (default 64)")
+    parser.add_argument("--in-series", type=int, default=8,
+                        help="number of envs run in series by one subprocess (default 8)")
+    parser.add_argument("--num-steps", type=int, default=200,
+                        help="number of timed vectorized steps (default 200)")
+    parser.add_argument("--async-batch-size", type=int, default=None,
+                        help="if set, also benchmark AsyncSubprocVecEnv returning this many envs per step")
+    parser.add_argument("--remote-workers", type=int, default=None,
+                        help="if set, also benchmark RemoteVecEnv over this many loopback TCP workers, "
+                             "each running its envs in series")
+    return parser.parse_known_args(args)[0]
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    all_args = parse_args(args)
+    if all_args.env_name == "MultipleCombat":
+        vecenvs = [ShareSubprocVecEnv, ShareShmemVecEnv]
+    else:
+        vecenvs = [SubprocVecEnv, ShmemVecEnv]
+    env_fns = [make_env_fn(all_args.env_name, all_args.scenario_name, i) for i in range(all_args.n_rollout_threads)]
+    for vecenv in vecenvs:
+        envs = vecenv(env_fns, in_series=all_args.in_series)
+        fps = benchmark(envs, all_args.num_steps)
+        envs.close()
+        logging.info(f"{vecenv.__name__}: {fps:.1f} env steps/s ({all_args.n_rollout_threads} envs, "
+                     f"{all_args.in_series} in series, {all_args.env_name}/{all_args.scenario_name})")
+    if all_args.async_batch_size is not None:
+        envs = AsyncSubprocVecEnv(env_fns, batch_size=all_args.async_batch_size, in_series=all_args.in_series)
+        fps = benchmark_async(envs, all_args.num_steps)
+        envs.close()
+        logging.info(f"AsyncSubprocVecEnv: {fps:.1f} env steps/s ({all_args.n_rollout_threads} envs, batch size "
+                     f"{all_args.async_batch_size}, {all_args.in_series} in series, {all_args.env_name}/{all_args.scenario_name})")
+    if all_args.remote_workers is not None:
+        vecenv_cls = ShareDummyVecEnv if all_args.env_name == "MultipleCombat" else DummyVecEnv
+        authkey = os.urandom(32)
+        processes, addresses = start_loopback_workers(env_fns, all_args.remote_workers, authkey, vecenv_cls)
+        envs = RemoteVecEnv(addresses, authkey)
+        fps = benchmark(envs, all_args.num_steps)
+        envs.close()
+        for p in processes:
+            p.join()
+        logging.info(f"RemoteVecEnv: {fps:.1f} env steps/s ({all_args.n_rollout_threads} envs, "
+                     f"{all_args.remote_workers} loopback workers, {all_args.env_name}/{all_args.scenario_name})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import sys
+import os
+import logging
+import setproctitle
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from config import get_config
+from envs.remote_vec_env import RemoteEnvServer
+from scripts.train.train_jsbsim import make_lowlevel_server, make_train_env, parse_args
+
+
+def parse_worker_args(args, parser):
+    group = parser.add_argument_group("Remote env worker parameters")
+    group.add_argument("--host", type=str, default="127.0.0.1",
+                       help="interface to listen on (default 127.0.0.1, loopback only; e.g. 0.0.0.0 for all interfaces, "
+                            "clients authenticate with --remote-env-authkey)")
+    group.add_argument("--port", type=int, default=5555,
+                       help="port to listen on (default 5555)")
+    group.add_argument("--env-offset", type=int, default=0,
+                       help="global index of the first env of this worker among all workers of the training, "
+                            "env seeds are the same as with all envs on one host (default 0)")
+    return parse_args(args, parser)
+
+
+def main(args):
+    """Run `n_rollout_threads` training envs on this host (in local subprocesses as in training), and serve them
+    to a training process started with `--remote-env-addresses <this host>:<port>`."""
+    parser = get_config()
+    all_args = parse_worker_args(args, parser)
+    if not all_args.remote_env_authkey:
+        parser.error("remote env worker needs --remote-env-authkey (or REMOTE_ENV_AUTHKEY)")
+    # envs of this worker run locally, and are stepped synchronously by the client
+    all_args.remote_env_addresses = None
+    all_args.async_batch_size = None
+    all_args.seed = all_args.seed + all_args.env_offset * 1000
+
+    setproctitle.setproctitle(f"remote-env-worker-{all_args.env_name}@{all_args.port}")
+    server = make_lowlevel_server(all_args)
+    envs = make_train_env(all_args, server.client() if server is not None else None)
+    try:
+        remote_server = RemoteEnvServer(envs, all_args.remote_env_authkey.encode(), all_args.host, all_args.port)
+        logging.info(f"Remote env worker: {envs.num_envs} envs of {all_args.env_name}/{all_args.scenario_name} "
+                     f"listening at {remote_server.address[0]}:{remote_server.address[1]}")
+        remote_server.serve()
+    finally:
+        envs.close()
+        if server is not None:
+            server.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main(sys.argv[1:])
@@ -14,12 +14,29 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath
 from config import get_config
 from runner.share_jsbsim_runner import ShareJSBSimRunner
 from envs.JSBSim.envs import SingleCombatEnv, SingleControlEnv, MultipleCombatEnv
-from envs.env_wrappers import SubprocVecEnv, DummyVecEnv, ShareSubprocVecEnv, ShareDummyVecEnv
+from envs.env_wrappers import SubprocVecEnv, DummyVecEnv, ShareSubprocVecEnv, ShareDummyVecEnv, \
+    ShmemVecEnv, ShareShmemVecEnv, AsyncSubprocVecEnv
+from envs.remote_vec_env import RemoteVecEnv
+from envs.JSBSim.model.lowlevel_server import LowLevelPolicyServer, set_lowlevel_server
+from envs.JSBSim.model.numpy_actor import set_baseline_backend
+from envs.JSBSim.utils.utils import parse_config
 
 
-def make_train_env(all_args):
+def make_lowlevel_server(all_args):
+    """Low-level policy server of the envs if `--use-lowlevel-server`, handling requests of all agents of an env."""
+    if not all_args.use_lowlevel_server:
+        return None
+    num_agents = len(parse_config(all_args.scenario_name).aircraft_configs)
+    return LowLevelPolicyServer(max_agents=num_agents, backend=all_args.baseline_backend,
+                                context=all_args.vec_env_context)
+
+
+def make_train_env(all_args, lowlevel_server=None):
     def get_env_fn(rank):
         def init_env():
+            set_baseline_backend(all_args.baseline_backend)
+            if lowlevel_server is not None:
+                set_lowlevel_server(lowlevel_server)
             if all_args.env_name == "SingleCombat":
                 env = SingleCombatEnv(all_args.scenario_name)
             elif all_args.env_name == "SingleControl":
@@ -32,21 +49,40 @@ def make_train_env(all_args):
             env.seed(all_args.seed + rank * 1000)
             return env
         return init_env
+    if all_args.remote_env_addresses is not None:
+        assert all_args.remote_env_authkey, "remote env workers need --remote-env-authkey (or REMOTE_ENV_AUTHKEY)"
+        envs = RemoteVecEnv([address.rsplit(":", 1) for address in all_args.remote_env_addresses],
+                            all_args.remote_env_authkey.encode())
+        assert envs.num_envs == all_args.n_rollout_threads, \
+            f"Remote env workers run {envs.num_envs} envs, but n_rollout_threads is {all_args.n_rollout_threads}"
+        return envs
+    in_series = 'auto' if all_args.autotune_vec_env else 1
     if all_args.env_name == "MultipleCombat":
         if all_args.n_rollout_threads == 1:
             return ShareDummyVecEnv([get_env_fn(0)])
         else:
-            return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+            VecEnv = ShareShmemVecEnv if all_args.use_shared_memory else ShareSubprocVecEnv
+            return VecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                          in_series=in_series, context=all_args.vec_env_context)
     else:
         if all_args.n_rollout_threads == 1:
             return DummyVecEnv([get_env_fn(0)])
+        elif all_args.async_batch_size is not None:
+            return AsyncSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                                      batch_size=all_args.async_batch_size, in_series=in_series,
+                                      context=all_args.vec_env_context)
         else:
-            return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)])
+            VecEnv = ShmemVecEnv if all_args.use_shared_memory else SubprocVecEnv
+            return VecEnv([get_env_fn(i) for i in range(all_args.n_rollout_threads)],
+                          in_series=in_series, context=all_args.vec_env_context)
 
 
-def make_eval_env(all_args):
+def make_eval_env(all_args, lowlevel_server=None):
     def get_env_fn(rank):
         def init_env():
+            set_baseline_backend(all_args.baseline_backend)
+            if lowlevel_server is not None:
+                set_lowlevel_server(lowlevel_server)
             if all_args.env_name == "SingleCombat":
                 env = SingleCombatEnv(all_args.scenario_name)
             elif all_args.env_name == "SingleControl":
@@ -59,16 +95,21 @@ def make_eval_env(all_args):
             env.seed(all_args.seed * 50000 + rank * 1000)
             return env
         return init_env
+    in_series = 'auto' if all_args.autotune_vec_env else 1
     if all_args.env_name == "MultipleCombat":
         if all_args.n_eval_rollout_threads == 1:
             return ShareDummyVecEnv([get_env_fn(0)])
         else:
-            return ShareSubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+            VecEnv = ShareShmemVecEnv if all_args.use_shared_memory else ShareSubprocVecEnv
+            return VecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                          in_series=in_series, context=all_args.vec_env_context)
     else:
         if all_args.n_eval_rollout_threads == 1:
             return DummyVecEnv([get_env_fn(0)])
         else:
-            return SubprocVecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)])
+            VecEnv = ShmemVecEnv if all_args.use_shared_memory else SubprocVecEnv
+            return VecEnv([get_env_fn(i) for i in range(all_args.n_eval_rollout_threads)],
+                          in_series=in_series, context=all_args.vec_env_context)
 
 
 def parse_args(args, parser):
@@ -82,6 +123,16 @@ def parse_args(args, parser):
 def main(args):
     parser = get_config()
     all_args = parse_args(args, parser)
+    if all_args.async_batch_size is not None:
+        # AsyncSubprocVecEnv only replaces the SubprocVecEnv of local SingleCombat/SingleControl envs
+        if all_args.env_name == "MultipleCombat":
+            parser.error("--async-batch-size is not supported with MultipleCombat envs")
+        if all_args.n_rollout_threads == 1:
+            parser.error("--async-batch-size needs --n-rollout-threads > 1")
+        if all_args.use_shared_memory:
+            parser.error("--async-batch-size and --use-shared-memory can not be used together")
+        if all_args.remote_env_addresses is not None:
+            parser.error("--async-batch-size and --remote-env-addresses can not be used together")
 
     # seed
     np.random.seed(all_args.seed)
@@ -134,8 +185,10 @@ def main(args):
                               + "-" + str(all_args.experiment_name) + "@" + str(all_args.user_name))
 
     # env init
-    envs = make_train_env(all_args)
-    eval_envs = make_eval_env(all_args) if all_args.use_eval else None
+    server = make_lowlevel_server(all_args)
+    lowlevel_client = server.client() if server is not None else None
+    envs = make_train_env(all_args, lowlevel_client)
+    eval_envs = make_eval_env(all_args, lowlevel_client) if all_args.use_eval else None
 
     config = {
         "all_args": all_args,
@@ -160,7 +213,10 @@ def main(args):
         traceback.print_exc()
     finally:
         # post process
+        runner.close()
         envs.close()
+        if server is not None:
+            server.close()
 
         if all_args.use_wandb:
             run.finish()
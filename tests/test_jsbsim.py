@@ -1,6 +1,11 @@
 import sys
 import os
 import pytest
+import struct
+import subprocess
+import multiprocessing as mp
+import time
+import threading
 import torch
 import random
 import numpy as np
@@ -10,7 +15,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from envs.JSBSim.envs.singlecontrol_env import SingleControlEnv
 from envs.JSBSim.envs.singlecombat_env import SingleCombatEnv
 from envs.JSBSim.envs.multiplecombat_env import MultipleCombatEnv
-from envs.env_wrappers import DummyVecEnv, SubprocVecEnv, ShareDummyVecEnv, ShareSubprocVecEnv
+from envs.env_wrappers import DummyVecEnv, SubprocVecEnv, ShareDummyVecEnv, ShareSubprocVecEnv, \
+    ShmemVecEnv, ShareShmemVecEnv, AsyncSubprocVecEnv, autotune_in_series
+from envs.remote_vec_env import RemoteVecEnv, RemoteEnvServer, start_loopback_workers, pack_message, unpack_payload, \
+    send_message, recv_message, authenticate, PROTOCOL_VERSION, STEP, RESET, CLOSE, OK, ERROR
+from envs.JSBSim.utils.utils import LLA2NEU, NEU2LLA, get_neu_converter
+from envs.JSBSim.model.lowlevel_server import LowLevelPolicyServer, load_lowlevel_policy, set_lowlevel_server
+from envs.JSBSim.model.numpy_actor import BASELINE_BACKENDS, load_baseline_actor, numpy_weights_path
 
 
 class TestSingleControlEnv:
@@ -63,7 +74,56 @@ class TestSingleControlEnv:
                 and np.all(reward == rew_buf[t]) and np.all(done == done_buff[t])
             t += 1
 
-    @pytest.mark.parametrize("vecenv", [DummyVecEnv, SubprocVecEnv])
+    def test_warm_reset(self):
+        cold_env = SingleControlEnv("1/heading")
+        warm_env = SingleControlEnv("1/heading")
+        warm_env.config.warm_reset = True
+        warm_env.load_simulator()
+        fdms = [sim.jsbsim_exec for sim in warm_env.agents.values()]
+
+        # dirty the warm FDM with a previous episode
+        warm_env.seed(1)
+        warm_env.reset()
+        for _ in range(50):
+            warm_env.step(np.array([warm_env.action_space.sample() for _ in range(warm_env.num_agents)]))
+
+        # Consistency test (warm reset ~= cold reset)
+        cold_env.seed(0)
+        warm_env.seed(0)
+        cold_obs, warm_obs = cold_env.reset(), warm_env.reset()
+        assert all(sim.jsbsim_exec is fdm for sim, fdm in zip(warm_env.agents.values(), fdms))
+        assert np.allclose(cold_obs, warm_obs, atol=1e-6)
+        cold_env.action_space.seed(0)
+        for _ in range(50):
+            actions = np.array([cold_env.action_space.sample() for _ in range(cold_env.num_agents)])
+            cold_obs, cold_rew, cold_done, _ = cold_env.step(actions)
+            warm_obs, warm_rew, warm_done, _ = warm_env.step(actions)
+            assert np.allclose(cold_obs, warm_obs, atol=1e-3) and np.all(cold_done == warm_done)
+
+    def test_state_cache(self):
+        from envs.JSBSim.core.catalog import Catalog as c
+        env = SingleControlEnv("1/heading")
+        env.seed(0)
+        env.reset()
+        sim = env.agents[env.ego_ids[0]]
+        state = sim.get_property_values(env.task.state_var)
+        state[:] = 0  # returned values are a copy of the cache
+        assert np.any(sim.get_property_values(env.task.state_var) != 0)
+
+        # writing an input invalidates the derived properties
+        delta_altitude = sim.get_property_value(c.delta_altitude)
+        sim.set_property_value(c.target_altitude_ft, sim.get_property_value(c.target_altitude_ft) + 1000)
+        assert np.isclose(sim.get_property_value(c.delta_altitude), delta_altitude + 1000 * 0.3048)
+
+        # running the simulation invalidates everything
+        altitude = sim.get_property_value(c.position_h_sl_m)
+        sim_time = sim.get_property_value(c.simulation_sim_time_sec)
+        env.step(np.array([env.action_space.sample() for _ in range(env.num_agents)]))
+        assert sim.get_property_value(c.simulation_sim_time_sec) > sim_time
+        assert sim.get_property_value(c.position_h_sl_m) != altitude
+        assert sim.get_property_value(c.position_h_sl_m) == sim.jsbsim_exec.get_property_value("position/h-sl-ft") * 0.3048
+
+    @pytest.mark.parametrize("vecenv", [DummyVecEnv, SubprocVecEnv, ShmemVecEnv])
     def test_vec_env(self, vecenv):
         parallel_num = 4
         envs = vecenv([lambda: SingleControlEnv("1/heading") for _ in range(parallel_num)])
@@ -88,6 +148,112 @@ class TestSingleControlEnv:
                 break
         envs.close()
 
+    def test_autotune_in_series(self):
+        parallel_num = 4
+        env_fns = [lambda: SingleControlEnv("1/heading") for _ in range(parallel_num)]
+        # without parallelism, IPC is saved by running all envs in a single process
+        assert autotune_in_series(SubprocVecEnv, env_fns, num_cpus=1, num_steps=5) == parallel_num
+        assert autotune_in_series(AsyncSubprocVecEnv, env_fns, num_cpus=1, num_steps=5, batch_size=2) == 2
+        envs = SubprocVecEnv(env_fns, in_series='auto')
+        assert envs.nremotes * envs.in_series == parallel_num
+        obss = envs.reset()
+        obss, rewards, dones, infos = envs.step(np.array([[envs.action_space.sample()] for _ in range(parallel_num)]))
+        assert obss.shape == (parallel_num, envs.num_agents, *envs.observation_space.shape)
+        envs.close()
+
+    @pytest.mark.parametrize("context", ["fork", "spawn", "forkserver"])
+    def test_vec_env_context(self, context):
+        parallel_num = 2
+        envs = SubprocVecEnv([lambda: SingleControlEnv("1/heading") for _ in range(parallel_num)], context=context)
+        assert all(p.__class__.__name__.lower().startswith(context) for p in envs.ps)
+        assert envs.startup_times.shape == (parallel_num,) and np.all(envs.startup_times > 0)
+        obss = envs.reset()
+        obss, rewards, dones, infos = envs.step(np.array([[envs.action_space.sample()] for _ in range(parallel_num)]))
+        assert obss.shape == (parallel_num, envs.num_agents, *envs.observation_space.shape)
+        envs.close()
+
+    def test_remote_vec_env(self):
+        parallel_num = 4
+
+        def make_env_fn(seed):
+            def init_env():
+                env = SingleControlEnv("1/heading")
+                env.seed(seed)
+                return env
+            return init_env
+        env_fns = [make_env_fn(i) for i in range(parallel_num)]
+        authkey = os.urandom(32)
+        processes, addresses = start_loopback_workers(env_fns, 2, authkey)
+        envs = RemoteVecEnv(addresses, authkey)
+        local_envs = DummyVecEnv(env_fns)
+        assert envs.num_envs == parallel_num and envs.worker_num_envs == [2, 2]
+        assert envs.observation_space == local_envs.observation_space and envs.num_agents == local_envs.num_agents
+
+        # same results as local envs
+        assert np.array_equal(envs.reset(), local_envs.reset())
+        actions = np.array([[envs.action_space.sample()] for _ in range(parallel_num)])
+        for _ in range(5):
+            results, local_results = envs.step(actions), local_envs.step(actions)
+            for x, y in zip(results[:3], local_results[:3]):
+                assert x.dtype == y.dtype and np.array_equal(x, y)
+            assert list(results[3]) == list(local_results[3])
+
+        # errors of remote envs are raised in the client, which can still use them
+        with pytest.raises(RuntimeError, match="Remote env worker"):
+            envs.step(np.zeros((parallel_num, 1, 2)))
+        envs.step(actions)
+        envs.close()
+        local_envs.close()
+        for p in processes:
+            p.join(timeout=10)
+            assert p.exitcode == 0
+
+    def test_remote_env_protocol(self):
+        frames = [np.random.randn(3, 2, 5).astype(np.float32), np.array([[True], [False]]), np.arange(4),
+                  np.array(1.5), np.array([{"step": 1}, {"step": 2}]), {"num_envs": 2}]
+        message = memoryview(pack_message(STEP, frames))
+        version, command, num_frames, size = struct.unpack_from("!BBHQ", message)
+        assert (version, command, num_frames, size) == (PROTOCOL_VERSION, STEP, len(frames), len(message) - 12)
+        decoded = unpack_payload(num_frames, message[12:])
+        for x, y in zip(frames[:4], decoded[:4]):
+            assert x.dtype == y.dtype and x.shape == y.shape and np.array_equal(x, y)
+        assert list(decoded[4]) == list(frames[4]) and decoded[5] == frames[5]
+        with pytest.raises(ValueError, match="object frame"):
+            unpack_payload(num_frames, message[12:], allow_objects=False)
+
+    def test_remote_env_security(self):
+        import socket
+        import threading
+        authkey = os.urandom(32)
+        server = RemoteEnvServer(DummyVecEnv([lambda: SingleControlEnv("1/heading")]), authkey)
+        thread = threading.Thread(target=server.serve, daemon=True)
+        thread.start()
+
+        # clients without the key are rejected, and the worker keeps waiting for a client with it
+        with pytest.raises(ConnectionError):
+            RemoteVecEnv([server.address], b"wrong key", connect_timeout=5)
+        assert thread.is_alive()
+
+        # object frames of an authenticated client are rejected before being unpickled
+        unpickled = []
+        class Payload:
+            def __reduce__(self):
+                return unpickled.append, ("unpickled",)
+        with socket.create_connection(server.address) as sock:
+            authenticate(sock, authkey, server=False)
+            send_message(sock, STEP, [Payload()])
+            status, frames = recv_message(sock)
+            assert status == ERROR and "object frame" in frames[0] and unpickled == []
+            # arrays are still served
+            send_message(sock, RESET, [])
+            status, frames = recv_message(sock)
+            assert status == OK and frames[0].shape[0] == 1
+            send_message(sock, CLOSE, [])
+            assert recv_message(sock)[0] == OK
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+        server.envs.close()
+
 
 class TestSingleCombatEnv:
 
@@ -144,6 +310,19 @@ class TestSingleCombatEnv:
                 and np.all(rewards == rew_buf[t]) and np.all(dones == done_buff[t])
             t += 1
 
+    def test_property_read_plan(self):
+        from envs.JSBSim.core.catalog import Catalog as c
+        env = SingleCombatEnv("1v1/NoWeapon/Selfplay")
+        env.seed(0)
+        env.reset()
+        props = env.task.state_var + [c.delta_heading, c.velocities_vc_mps, c.accelerations_n_pilot_z_norm]
+        for _ in range(10):
+            env.step(np.array([env.action_space.sample() for _ in range(env.num_agents)]))
+            for sim in env.agents.values():
+                values = sim.get_property_values(props)
+                assert isinstance(values, np.ndarray)
+                assert np.all(values == np.array([sim.get_property_value(prop) for prop in props]))
+
     @pytest.mark.parametrize("config", ["1v1/NoWeapon/vsBaseline", "1v1/NoWeapon/Selfplay"])
     def test_agent_crash(self, config):
         # if no weapon, once enemy die, env terminate!
@@ -185,8 +364,44 @@ class TestSingleCombatEnv:
                     and rewards[0][0] == 0.0 \
                     and any([missile.is_alive for missile in env.agents[crash_id].launch_missiles])
 
+    @pytest.mark.parametrize("config", ["1v1/DodgeMissile/Selfplay", "1v1/DodgeMissile/HierarchyVsBaseline"])
+    def test_save_restore_state(self, config):
+        from envs.JSBSim.core.simulatior import MissileSimulator
+        env = SingleCombatEnv(config)
+        env.seed(0)
+        env.action_space.seed(0)
+        env.reset()
+        act_buf = [np.array([env.action_space.sample() for _ in range(env.num_agents)]) for _ in range(20)]
+        for t in range(5):
+            obs, _, _, _ = env.step(act_buf[t])
+        missile = MissileSimulator.create(env.agents[env.enm_ids[0]], env.agents[env.ego_ids[0]], 'C0000')
+        env.add_temp_simulator(missile)
+        env.step(act_buf[5])
+        state = env.save_state()
+        tempsim_ids = list(env._tempsims.keys())
+        num_launched = len(env.agents[env.enm_ids[0]].launch_missiles)
+        missile_position, missile_t = missile.get_position().copy(), missile._t
+        obs_buf = [env.get_obs()]
+        for t in range(6, 20):
+            obs, _, _, _ = env.step(act_buf[t])
+            obs_buf.append(env.get_obs())
+
+        # Restore test (branch from the same state twice)
+        for _ in range(2):
+            obs = env.restore_state(state)
+            assert env.current_step == 6 and list(env._tempsims.keys()) == tempsim_ids
+            assert np.all(missile.get_position() == missile_position) and missile._t == missile_t
+            assert len(env.agents[env.enm_ids[0]].launch_missiles) == num_launched
+            for agent_id in env.agents.keys():
+                assert np.allclose(obs_buf[0][agent_id], env.get_obs()[agent_id], atol=1e-6)
+            for t in range(6, 10):
+                env.step(act_buf[t])
+                for agent_id in env.agents.keys():
+                    # ownship features only: side flags may flip sign when targets are aligned
+                    assert np.allclose(obs_buf[t - 5][agent_id][:9], env.get_obs()[agent_id][:9], atol=1e-2)
+
     @pytest.mark.parametrize("vecenv, config", list(product(
-        [DummyVecEnv, SubprocVecEnv], ["1v1/DodgeMissile/Selfplay", "1v1/DodgeMissile/HierarchyVsBaseline"])))
+        [DummyVecEnv, SubprocVecEnv, ShmemVecEnv], ["1v1/DodgeMissile/Selfplay", "1v1/DodgeMissile/HierarchyVsBaseline"])))
     def test_vec_env(self, vecenv, config):
         parallel_num = 4
         envs = vecenv([lambda: SingleCombatEnv(config) for _ in range(parallel_num)])
@@ -211,6 +426,176 @@ class TestSingleCombatEnv:
                 break
         envs.close()
 
+    @pytest.mark.parametrize("config", ["1v1/DodgeMissile/vsBaseline", "1v1/NoWeapon/Selfplay"])
+    def test_shmem_vec_env(self, config):
+        parallel_num, in_series = 4, 2
+
+        def make_env(seed):
+            def init_env():
+                env = SingleCombatEnv(config)
+                env.seed(seed)
+                return env
+            return init_env
+
+        results = []
+        for vecenv in [SubprocVecEnv, ShmemVecEnv]:
+            envs = vecenv([make_env(i) for i in range(parallel_num)], in_series=in_series)
+            rng = np.random.RandomState(0)
+            result = [(envs.reset().copy(),)]
+            for _ in range(100):
+                actions = np.array([[[rng.randint(n) for n in envs.action_space.nvec]
+                                     for _ in range(envs.num_agents)] for _ in range(parallel_num)])
+                obss, rewards, dones, infos = envs.step(actions)
+                # shared buffers are overwritten by the next step
+                result.append((obss.copy(), rewards.copy(), dones.copy(), [info.keys() for info in infos]))
+            envs.close()
+            results.append(result)
+        for data, shm_data in zip(*results):
+            for x, shm_x in zip(data, shm_data):
+                assert np.array_equal(x, shm_x)
+
+    def test_async_vec_env(self):
+        parallel_num, batch_size = 4, 2
+        envs = AsyncSubprocVecEnv([lambda: SingleCombatEnv("1v1/NoWeapon/Selfplay") for _ in range(parallel_num)],
+                                  batch_size=batch_size)
+        obs_shape = (batch_size, envs.num_agents, *envs.observation_space.shape)
+        reward_shape = (batch_size, envs.num_agents, 1)
+        done_shape = (batch_size, envs.num_agents, 1)
+
+        obss = envs.reset()
+        assert obss.shape == (parallel_num, *obs_shape[1:])
+        env_ids = np.arange(parallel_num)
+        env_steps = np.zeros(parallel_num, dtype=int)
+        for _ in range(20):
+            actions = np.array([[envs.action_space.sample() for _ in range(envs.num_agents)] for _ in env_ids])
+            envs.step_async(actions, env_ids)
+            # envs whose step has not been received can not be stepped again
+            with pytest.raises(AssertionError):
+                envs.step_async(actions, env_ids)
+            obss, rewards, dones, infos, env_ids = envs.step_wait()
+            assert obss.shape == obs_shape and rewards.shape == reward_shape and dones.shape == done_shape \
+                and len(infos) == batch_size and isinstance(infos[0], dict)
+            assert len(np.unique(env_ids)) == batch_size and np.all(env_ids < parallel_num)
+            env_steps[env_ids] += 1
+        assert envs.waiting and env_steps.sum() == 20 * batch_size
+        # pending steps are discarded by reset
+        assert envs.reset().shape == (parallel_num, *obs_shape[1:]) and not envs.waiting
+        envs.close()
+
+    @pytest.mark.parametrize("model_name, input_dim, use_mlp_actlayer",
+                             [("baseline_model", 12, False), ("dodge_missile_model", 21, True)])
+    def test_baseline_backends(self, model_name, input_dim, use_mlp_actlayer):
+        rng = np.random.default_rng(0)
+        obs = rng.normal(size=(100, input_dim))
+        rnn_states = rng.normal(size=(100, 1, 128)).astype(np.float32)
+        outputs = {backend: load_baseline_actor(model_name, input_dim, use_mlp_actlayer, backend)(obs, rnn_states)
+                   for backend in BASELINE_BACKENDS}
+        actions, rnn_states = outputs["torch"]
+        assert actions.shape == (100, 4) and rnn_states.shape == (100, 1, 128)
+        for backend in ["torchscript", "numpy"]:
+            assert np.array_equal(outputs[backend][0], actions)
+            assert np.allclose(outputs[backend][1], rnn_states, atol=1e-5)
+
+    def test_torch_free_env(self):
+        # envs with numpy baseline actors never import torch, once weights are exported
+        for model_name in ['baseline_model', 'dodge_missile_model']:
+            numpy_weights_path(model_name)
+        code = "import sys\n" \
+               "from envs.JSBSim.envs import SingleCombatEnv\n" \
+               "from envs.JSBSim.model.numpy_actor import set_baseline_backend\n" \
+               "set_baseline_backend('numpy')\n" \
+               "env = SingleCombatEnv('1v1/DodgeMissile/HierarchyVsBaseline')\n" \
+               "env.reset()\n" \
+               "env.step([env.action_space.sample() for _ in range(env.num_agents)])\n" \
+               "assert 'torch' not in sys.modules\n"
+        root_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        subprocess.run([sys.executable, "-c", code], cwd=root_dir, check=True, capture_output=True)
+
+
+class TestNEUConverter:
+
+    @pytest.mark.parametrize("origin", [(120.0, 60.0, 0.0), (-75.5, -33.2, 1500.0)])
+    def test_accuracy(self, origin):
+        pymap3d = pytest.importorskip("pymap3d")
+        lon0, lat0, alt0 = origin
+        rng = np.random.default_rng(0)
+        lla = np.stack([lon0 + rng.uniform(-2, 2, 1000),
+                        lat0 + rng.uniform(-2, 2, 1000),
+                        rng.uniform(0, 20000, 1000)], axis=-1)
+        converter = get_neu_converter(*origin)
+        # batched conversion vs pymap3d
+        neu = converter.lla2neu(lla)
+        n, e, d = pymap3d.geodetic2ned(lla[:, 1], lla[:, 0], lla[:, 2], lat0, lon0, alt0)
+        assert neu.shape == (1000, 3) and np.allclose(neu, np.stack([n, e, -d], axis=-1), rtol=0, atol=1e-6)
+        lat, lon, h = pymap3d.ned2geodetic(neu[:, 0], neu[:, 1], -neu[:, 2], lat0, lon0, alt0)
+        back = converter.neu2lla(neu)
+        assert np.allclose(back[:, :2], np.stack([lon, lat], axis=-1), rtol=0, atol=1e-9)
+        assert np.allclose(back[:, 2], h, rtol=0, atol=1e-6)
+        assert np.allclose(back, lla, rtol=0, atol=1e-6)
+        # single point path agrees with the batched one
+        for i in range(10):
+            assert np.allclose(converter.lla2neu(lla[i]), neu[i], rtol=0, atol=1e-8)
+            assert np.allclose(converter.neu2lla(neu[i]), back[i], rtol=0, atol=1e-9)
+            assert np.allclose(LLA2NEU(*lla[i], *origin), neu[i], rtol=0, atol=1e-8)
+            assert np.allclose(NEU2LLA(*neu[i], *origin), back[i], rtol=0, atol=1e-9)
+        # array arguments keep the (3, N) layout of the component-wise api
+        assert np.allclose(LLA2NEU(*lla.T, *origin), neu.T, rtol=0, atol=1e-8)
+        assert np.allclose(NEU2LLA(*neu.T, *origin), back.T, rtol=0, atol=1e-9)
+
+
+class TestMissileBatch:
+
+    def _launch(self, env, num_missiles):
+        from envs.JSBSim.core.simulatior import MissileSimulator
+        agents = list(env.agents.values())
+        for i in range(num_missiles):
+            parent = agents[i % len(agents)]
+            env.add_temp_simulator(MissileSimulator.create(parent, parent.enemies[0], f"M{i:04d}"))
+        return list(env._tempsims.values())
+
+    def test_batch_vs_single(self):
+        from envs.JSBSim.core.simulatior import MissileSimulator
+        env = MultipleCombatEnv("2v2/ShootMissile/HierarchySelfplay")
+        env.seed(0)
+        env.reset()
+        missiles = self._launch(env, 12)
+        assert len(env._missile_batch) == 12 and all(missile in env._missile_batch for missile in missiles)
+        state = env.save_state()
+        # advance all missiles in one vectorized call
+        for _ in range(100):
+            env._missile_batch.run()
+        batch_states = [missile.save_state() for missile in missiles]
+        # advance each missile on its own, in the same order
+        env.restore_state(state)
+        env._missile_batch.clear()
+        assert not any(missile in env._missile_batch for missile in missiles)
+        for _ in range(100):
+            for missile in missiles:
+                missile.run()
+        for missile, batch_state in zip(missiles, batch_states):
+            single_state = missile.save_state()
+            assert single_state["status"] == batch_state["status"] == MissileSimulator.LAUNCHED
+            for key in ["position", "velocity", "posture", "geodetic", "t", "m"]:
+                assert np.allclose(single_state[key], batch_state[key], rtol=1e-12, atol=1e-9)
+        env.close()
+
+    def test_hit_order(self):
+        from envs.JSBSim.core.simulatior import MissileSimulator
+        env = MultipleCombatEnv("2v2/ShootMissile/HierarchySelfplay")
+        env.seed(0)
+        env.reset()
+        missiles = self._launch(env, 4)
+        target = missiles[0].target_aircraft
+        assert missiles[1].target_aircraft is target
+        # missiles 0 & 1 explode next to the same target: only the first one hits it
+        for missile in missiles[:2]:
+            missile._position[:] = target.get_position() + np.array([100., 0., 0.])
+        env._missile_batch.run()
+        assert missiles[0].is_success and not target.is_alive
+        assert missiles[1].is_done and not missiles[1].is_success
+        assert missiles[2].is_alive and missiles[3].is_alive
+        env.close()
+
 
 class TestJSBSimRunner:
 
@@ -273,6 +658,186 @@ class TestJSBSimRunner:
         # post process
         envs.close()
 
+    def test_async_rollout(self, tmp_path):
+        from scripts.train.train_jsbsim import make_train_env, parse_args, get_config
+        from runner.jsbsim_runner import JSBSimRunner
+        args = '--env-name SingleCombat --algorithm-name ppo --scenario-name 1v1/DodgeMissile/vsBaseline' \
+               ' --seed 1 --n-rollout-threads 4 --buffer-size 50' \
+               ' --hidden-size 32 --act-hidden-size 32 --recurrent-hidden-size 32 --recurrent-hidden-layers 1'
+
+        def rollout(async_batch_size):
+            all_args = parse_args((args + async_batch_size).split(' '), get_config())
+            envs = make_train_env(all_args)
+            torch.manual_seed(0)
+            runner = JSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": None,
+                                   "device": torch.device("cpu"), "run_dir": tmp_path})
+            runner.warmup()
+            if runner.use_async_envs:
+                runner.rollout()
+            else:
+                for step in range(runner.buffer_size):
+                    values, actions, action_log_probs, rnn_states_actor, rnn_states_critic = runner.collect(step)
+                    obs, rewards, dones, infos = envs.step(actions)
+                    runner.insert((obs, actions, rewards, dones, action_log_probs, values, rnn_states_actor, rnn_states_critic))
+            envs.close()
+            return runner.buffer
+
+        buffer = rollout('')
+        # waiting for all envs at each step is the same as synchronous rollout
+        async_buffer = rollout(' --async-batch-size 4')
+        for key in ["obs", "actions", "rewards", "masks", "action_log_probs", "value_preds",
+                    "rnn_states_actor", "rnn_states_critic"]:
+            assert np.array_equal(getattr(buffer, key), getattr(async_buffer, key))
+        # partial batches still fill every step of every env
+        async_buffer = rollout(' --async-batch-size 2')
+        assert np.all(np.any(async_buffer.obs[1:] != 0, axis=-1)) and async_buffer.step == 0
+
+    def test_torch_buffer_rollout(self, tmp_path):
+        from scripts.train.train_jsbsim import make_train_env, parse_args, get_config
+        from runner.jsbsim_runner import JSBSimRunner
+        from algorithms.utils.buffer import TorchReplayBuffer
+        args = '--env-name SingleCombat --algorithm-name ppo --scenario-name 1v1/DodgeMissile/vsBaseline' \
+               ' --seed 1 --n-rollout-threads 2 --buffer-size 30' \
+               ' --hidden-size 32 --act-hidden-size 32 --recurrent-hidden-size 32 --recurrent-hidden-layers 1'
+
+        def rollout(use_torch_buffer):
+            all_args = parse_args((args + use_torch_buffer).split(' '), get_config())
+            envs = make_train_env(all_args)
+            torch.manual_seed(0)
+            runner = JSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": None,
+                                   "device": torch.device("cpu"), "run_dir": tmp_path})
+            runner.warmup()
+            if runner.use_torch_buffer:
+                runner.rollout()
+            else:
+                for step in range(runner.buffer_size):
+                    values, actions, action_log_probs, rnn_states_actor, rnn_states_critic = runner.collect(step)
+                    obs, rewards, dones, infos = envs.step(actions)
+                    runner.insert((obs, actions, rewards, dones, action_log_probs, values, rnn_states_actor, rnn_states_critic))
+            runner.compute()
+            envs.close()
+            return runner.buffer
+
+        buffer = rollout('')
+        torch_buffer = rollout(' --use-torch-buffer')
+        assert isinstance(torch_buffer, TorchReplayBuffer) and torch_buffer.step == 0
+        for key in ["obs", "actions", "rewards", "masks", "action_log_probs", "value_preds",
+                    "rnn_states_actor", "rnn_states_critic"]:
+            assert isinstance(getattr(torch_buffer, key), torch.Tensor)
+            assert np.array_equal(getattr(buffer, key), getattr(torch_buffer, key).numpy())
+        assert np.allclose(buffer.returns, torch_buffer.returns.numpy(), atol=1e-5)
+
+    def test_async_learner(self, tmp_path):
+        from scripts.train.train_jsbsim import make_train_env, parse_args, get_config
+        from runner.jsbsim_runner import JSBSimRunner
+        args = '--env-name SingleCombat --algorithm-name ppo --scenario-name 1v1/DodgeMissile/vsBaseline' \
+               ' --seed 1 --n-rollout-threads 2 --buffer-size 30 --num-env-steps 240 --use-async-learner' \
+               ' --num-mini-batch 2 --ppo-epoch 2 --data-chunk-length 10 --log-interval 1 --save-interval 100' \
+               ' --hidden-size 32 --act-hidden-size 32 --recurrent-hidden-size 32 --recurrent-hidden-layers 1'
+        all_args = parse_args(args.split(' '), get_config())
+        envs = make_train_env(all_args)
+        runner = JSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": None,
+                               "device": torch.device("cpu"), "run_dir": tmp_path})
+        initial_weights = [p.detach().clone() for p in runner.policy.actor.parameters()]
+        logged_infos = []
+        runner.log_info = lambda infos, total_num_steps: logged_infos.append(infos)
+        runner.run()
+        envs.close()
+
+        # all 4 batches trained, the runner holds the final weights, which are saved
+        assert runner.learner.closed and runner.learner.version == 4
+        assert not all(torch.equal(p, q) for p, q in zip(initial_weights, runner.policy.actor.parameters()))
+        saved_weights = torch.load(tmp_path / 'actor_latest.pt')
+        assert all(torch.equal(saved_weights[k], v) for k, v in runner.policy.actor.state_dict().items())
+        # batches are collected by policies one update behind at most
+        staleness = [infos["policy_staleness"] for infos in logged_infos if "policy_staleness" in infos]
+        assert len(staleness) == 3 and all(0 <= x <= 1 for x in staleness)
+        assert all(np.isfinite(infos["value_loss"]) for infos in logged_infos if "value_loss" in infos)
+
+        # the learner process is also stopped by `close` when `run` did not end normally
+        envs = make_train_env(all_args)
+        runner = JSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": None,
+                               "device": torch.device("cpu"), "run_dir": tmp_path})
+        runner.close()
+        envs.close()
+        assert runner.learner.closed and not runner.learner.process.is_alive()
+
+    @pytest.mark.parametrize("n_eval_rollout_threads", [1, 4])
+    def test_selfplay_eval(self, tmp_path, n_eval_rollout_threads):
+        from scripts.train.train_jsbsim import make_train_env, make_eval_env, parse_args, get_config
+        from runner.selfplay_jsbsim_runner import SelfplayJSBSimRunner
+        args = '--env-name SingleCombat --algorithm-name ppo --scenario-name 1v1/NoWeapon/Selfplay --use-selfplay' \
+               ' --selfplay-algorithm fsp --n-choose-opponents 2 --seed 1 --n-rollout-threads 2 --buffer-size 30' \
+               f' --use-eval --n-eval-rollout-threads {n_eval_rollout_threads} --eval-episodes 4' \
+               ' --hidden-size 32 --act-hidden-size 32 --recurrent-hidden-size 32 --recurrent-hidden-layers 1'
+        all_args = parse_args(args.split(' '), get_config())
+        envs, eval_envs = make_train_env(all_args), make_eval_env(all_args)
+        runner = SelfplayJSBSimRunner({"all_args": all_args, "envs": envs, "eval_envs": eval_envs,
+                                       "device": torch.device("cpu"), "run_dir": tmp_path})
+        runner.save(0)
+        runner.save(1)
+        logged_infos, resets, rounds = [], [], []
+        runner.log_info = lambda infos, total_num_steps: logged_infos.append(infos)
+        eval_reset, eval_opponents = eval_envs.reset, runner.eval_opponents
+        eval_envs.reset = lambda: resets.append(1) or eval_reset()
+        runner.eval_opponents = lambda opponents, num_episodes: \
+            rounds.append(opponents) or eval_opponents(opponents, num_episodes)
+        runner.eval(0)
+        envs.close()
+        eval_envs.close()
+
+        # opponents are evaluated concurrently if there are enough eval envs, with a single reset
+        assert len(runner.eval_opponent_policy) == min(2, n_eval_rollout_threads)
+        assert [len(opponents) for opponents in rounds] == ([1, 1] if n_eval_rollout_threads == 1 else [2])
+        assert len(resets) == len(rounds)
+        assert len(logged_infos) == 1 and np.isfinite(logged_infos[0]['eval_average_episode_rewards'])
+        assert np.isfinite(runner.latest_elo) and set(runner.policy_pool) == {'0', '1'}
+        # saved policies are served from memory, to eval and training opponents
+        assert logged_infos[0]['policy_pool_misses'] == 0 and logged_infos[0]['policy_pool_hits'] == 2
+        assert runner.policy_weights.hits == 4
+        runner.close()
+
+    def test_policy_pool(self, tmp_path):
+        from runner.policy_pool import PolicyPool
+        weights = {str(i): {"weight": torch.full((256,), float(i))} for i in range(4)}  # 1 KiB each
+        for key, state_dict in weights.items():
+            torch.save(state_dict, tmp_path / f"actor_{key}.pt")
+        pool = PolicyPool(tmp_path, max_bytes=2 * 1024)
+        pool.add("0", weights["0"])
+        pool.add("1", weights["1"])
+        weights["1"]["weight"] += 1  # cached weights are copies
+        assert torch.equal(pool.get("0")["weight"], torch.zeros(256)) and torch.equal(pool.get("1")["weight"], torch.ones(256))
+        assert (pool.hits, pool.misses, pool.evictions) == (2, 0, 0)
+
+        # least recently used "0" is evicted by "2", which is loaded from its checkpoint
+        pool.get("1")
+        assert torch.equal(pool.get("2")["weight"], torch.full((256,), 2.))
+        assert (pool.hits, pool.misses, pool.evictions) == (3, 1, 1)
+        assert pool.stats()["policy_pool_size"] == 2 and pool.nbytes == 2 * 1024
+        assert torch.equal(pool.get("1")["weight"], torch.ones(256)) and pool.misses == 1
+
+        # prefetched weights are loaded in the background, and evict the less frequently sampled ones:
+        # "1" sampled 3 times stays cached, unlike with LRU
+        pool.prefetch(["0", "3"])
+        for key in ["0", "3"]:
+            while key in pool._pending:
+                time.sleep(0.01)
+        assert torch.equal(pool.get("3")["weight"], torch.full((256,), 3.)) and pool.misses == 1
+        assert set(pool._cache) == {"1", "3"} and pool.evictions == 3
+        # a prefetch still in progress is waited for, neither a hit nor a miss
+        loading = threading.Event()
+        pool._executor.submit(loading.wait)
+        pool.prefetch(["2"])
+        threading.Timer(0.1, loading.set).start()
+        assert torch.equal(pool.get("2")["weight"], torch.full((256,), 2.))
+        assert (pool.hits, pool.misses, pool.waits) == (5, 1, 1) and pool.stats()["policy_pool_waits"] == 1
+        # weights larger than the budget are not cached
+        pool.add("big", {"weight": torch.zeros(1024)})
+        assert pool.nbytes <= pool.max_bytes and pool.stats()["policy_pool_size"] == 2
+        with pytest.raises(FileNotFoundError):
+            pool.get("missing")
+        pool.close()
+
 
 class TestMultipleCombatEnv:
 
@@ -329,6 +894,80 @@ class TestMultipleCombatEnv:
                 and np.all(rewards == rew_buf[t]) and np.all(dones == done_buff[t])
             t += 1
 
+    @pytest.mark.parametrize("config", ["2v2/NoWeapon/HierarchySelfplay", "2v2/ShootMissile/HierarchySelfplay"])
+    def test_lowlevel_batch(self, config):
+        env = MultipleCombatEnv(config)
+        env.seed(0)
+        env.reset()
+        task = env.task
+        assert task._inner_rnn_states.shape == (env.num_agents, 1, 128)
+        for _ in range(5):
+            actions = env._unpack(np.array([env.action_space.sample() for _ in range(env.num_agents)]))
+            rnn_states = task._inner_rnn_states.copy()
+            # one forward pass over all agents
+            batch_actions = task.normalize_actions(env, actions)
+            batch_rnn_states = task._inner_rnn_states.copy()
+            # one forward pass per agent
+            task._inner_rnn_states = rnn_states
+            for agent_id in env.agents.keys():
+                assert np.allclose(task.normalize_action(env, agent_id, actions[agent_id]), batch_actions[agent_id])
+            assert np.allclose(task._inner_rnn_states, batch_rnn_states, atol=1e-6)
+            assert np.any(batch_rnn_states != 0)
+            env.step(np.array([actions[agent_id] for agent_id in env.ego_ids + env.enm_ids]))
+        env.close()
+
+    def test_lowlevel_server(self):
+        server = LowLevelPolicyServer(num_slots=8)
+        client = server.client()
+        local = load_lowlevel_policy()
+        obs, rnn_states = np.random.randn(4, 12), np.random.randn(4, 1, 128).astype(np.float32)
+        local_actions, local_rnn_states = local(obs, rnn_states)
+        actions, rnn_states = client(obs, rnn_states)
+        assert np.array_equal(actions, local_actions) and np.allclose(rnn_states, local_rnn_states, atol=1e-6)
+
+        def make_env_fn(rank, lowlevel_server):
+            def init_env():
+                if lowlevel_server is not None:
+                    set_lowlevel_server(lowlevel_server)
+                env = MultipleCombatEnv("2v2/NoWeapon/HierarchySelfplay")
+                env.seed(rank)
+                return env
+            return init_env
+        parallel_num = 2
+        rng = np.random.default_rng(0)
+        actions = rng.integers(0, [3, 5, 3], size=(10, parallel_num, 4, 3))
+        results = []
+        for lowlevel_server in [None, client]:
+            envs = ShareSubprocVecEnv([make_env_fn(i, lowlevel_server) for i in range(parallel_num)])
+            obs_buf = [envs.reset()[0]]
+            for action in actions:
+                obs_buf.append(envs.step(action)[0])
+            envs.close()
+            results.append(np.array(obs_buf))
+        server.close()
+        assert np.allclose(results[0], results[1])
+
+    def test_lowlevel_server_slots(self):
+        server = LowLevelPolicyServer(num_slots=2, max_agents=2, context="fork")
+        client = server.client()
+        obs, rnn_states = np.random.randn(2, 12), np.zeros((2, 1, 128), dtype=np.float32)
+        actions, _ = client(obs, rnn_states)
+
+        def call_client():
+            assert np.array_equal(client(obs, rnn_states)[0], actions)
+        # slots of exited processes are reused
+        for _ in range(4):
+            process = mp.get_context("fork").Process(target=call_client)
+            process.start()
+            process.join()
+            assert process.exitcode == 0
+        assert sorted(server.slot_pids) == sorted([os.getpid(), process.pid])
+        # a dead server raises instead of blocking
+        server.process.kill()
+        with pytest.raises(RuntimeError):
+            client(obs, rnn_states)
+        server.close()
+
     def test_agent_die(self):
         env = MultipleCombatEnv("2v2/NoWeapon/Selfplay")
         uid = list(env.agents.keys())[0]
@@ -382,8 +1021,8 @@ class TestMultipleCombatEnv:
                 break
 
     @pytest.mark.parametrize("vecenv, config", list(product(
-        [ShareDummyVecEnv, ShareSubprocVecEnv], ["2v2/NoWeapon/Selfplay", "2v2/NoWeapon/HierarchySelfplay",
-                                        "2v2/ShootMissile/HierarchySelfplay"])))
+        [ShareDummyVecEnv, ShareSubprocVecEnv, ShareShmemVecEnv],
+        ["2v2/NoWeapon/Selfplay", "2v2/NoWeapon/HierarchySelfplay", "2v2/ShootMissile/HierarchySelfplay"])))
     def test_vec_env(self, vecenv, config):
         parallel_num = 4
         envs = vecenv([lambda: MultipleCombatEnv(config) for _ in range(parallel_num)])
@@ -12,9 +12,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from config import get_config
 from algorithms.ppo.ppo_actor import PPOActor
 from algorithms.ppo.ppo_critic import PPOCritic
-from algorithms.utils.buffer import ReplayBuffer
+from algorithms.utils.buffer import ReplayBuffer, TorchReplayBuffer, SharedReplayBuffer
+from algorithms.utils.gru import GRULayer
 from algorithms.ppo.ppo_policy import PPOPolicy
 from algorithms.ppo.ppo_trainer import PPOTrainer
+from algorithms.mappo.ppo_policy import PPOPolicy as MAPPOPolicy
+from algorithms.mappo.ppo_trainer import PPOTrainer as MAPPOTrainer
 
 
 class TestPPO:
@@ -66,6 +69,29 @@ class TestPPO:
         assert value.shape[0] == batch_size
         assert rnn_states.shape == init_rnn_states.shape
 
+    @pytest.mark.parametrize("num_layers, reset_prob", list(product([1, 2], [0.0, 0.1, 1.0])))
+    def test_gru_layer(self, num_layers, reset_prob):
+        T, N = 8, 5
+        layer = GRULayer(6, 16, num_layers)
+        x = torch.randn(T * N, 6, requires_grad=True)
+        hxs = torch.randn(N, num_layers, 16)
+        masks = (torch.rand(T * N, 1) > reset_prob).float()
+        output, h_n = layer(x, hxs, masks)
+        assert output.shape == (T * N, 16) and h_n.shape == (N, num_layers, 16)
+        output.sum().backward()
+        grad = x.grad.clone()
+
+        # same as rollout step by step, each sequence reset at its own zero masks
+        x.grad = None
+        outputs, h = [], hxs
+        for t in range(T):
+            step_output, h = layer(x[t * N:(t + 1) * N], h, masks[t * N:(t + 1) * N])
+            outputs.append(step_output)
+        assert torch.allclose(output, torch.cat(outputs), atol=1e-6)
+        assert torch.allclose(h_n, h, atol=1e-6)
+        torch.cat(outputs).sum().backward()
+        assert torch.allclose(grad, x.grad, atol=1e-6)
+
     @pytest.mark.parametrize("num_agents, obs_space, act_space, num_mini_batch, data_chunk_length", list(product(
         [       # num_agents
             1, 2
@@ -110,6 +136,167 @@ class TestPPO:
 
         buffer.after_update()
 
+    @pytest.mark.parametrize("num_agents, data_chunk_length", list(product([1, 2], [1, 5])))
+    def test_recurrent_generator(self, num_agents, data_chunk_length):
+        args = get_config().parse_args(args='')
+        args.buffer_size, args.n_rollout_threads = 20, 3
+        buffer = ReplayBuffer(args, num_agents, gym.spaces.Box(low=-1, high=1, shape=(3,)), gym.spaces.Discrete(5))
+        # tag data with its (step, thread, agent)
+        steps, threads, agents = np.meshgrid(np.arange(args.buffer_size + 1), np.arange(args.n_rollout_threads),
+                                             np.arange(num_agents), indexing='ij')
+        buffer.obs[:] = np.stack([steps, threads, agents], axis=-1)
+        buffer.rnn_states_actor[:] = steps[..., None, None]
+        buffer.rnn_states_critic[:] = threads[..., None, None]
+
+        num_mini_batch = 2
+        chunks = []
+        for data in ReplayBuffer.recurrent_generator(buffer, num_mini_batch, data_chunk_length):
+            obs_batch, rnn_states_actor_batch, rnn_states_critic_batch = data[0], data[-2], data[-1]
+            assert isinstance(obs_batch, torch.Tensor)
+            # (L * N, dim) => (L, N, dim): each chunk is a sequence of consecutive steps of one thread and agent
+            obs_batch = obs_batch.reshape(data_chunk_length, -1, 3)
+            assert torch.all(obs_batch[1:, :, 0] == obs_batch[:-1, :, 0] + 1)
+            assert torch.all(obs_batch[1:, :, 1:] == obs_batch[:-1, :, 1:])
+            # rnn states at the start of each chunk
+            assert torch.all(rnn_states_actor_batch[:, 0, 0] == obs_batch[0, :, 0])
+            assert torch.all(rnn_states_critic_batch[:, 0, 0] == obs_batch[0, :, 1])
+            chunks.extend(map(tuple, obs_batch[0].tolist()))
+        data_chunks = args.n_rollout_threads * args.buffer_size // data_chunk_length
+        assert len(set(chunks)) == len(chunks) == data_chunks // num_mini_batch * num_mini_batch
+
+    @pytest.mark.parametrize("use_gae, use_proper_time_limits",list(product([True, False], [True, False])))
+    def test_compute_returns(self, use_gae, use_proper_time_limits):
+        args = get_config().parse_args(args='')
+        args.buffer_size, args.n_rollout_threads = 50, 4
+        args.use_gae, args.use_proper_time_limits = use_gae, use_proper_time_limits
+        buffer = ReplayBuffer(args, 2, gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.Discrete(5))
+        buffer.rewards[:] = np.random.randn(*buffer.rewards.shape)
+        buffer.value_preds[:] = np.random.randn(*buffer.value_preds.shape)
+        buffer.masks[:] = np.random.rand(*buffer.masks.shape) > 0.1
+        buffer.bad_masks[:] = np.random.rand(*buffer.bad_masks.shape) > 0.1
+        next_value = np.random.randn(*buffer.value_preds.shape[1:])
+        buffer.compute_returns(next_value)
+
+        # identical to step-by-step computation
+        gamma, gae_lambda = buffer.gamma, buffer.gae_lambda
+        rewards, value_preds, masks, bad_masks = buffer.rewards, buffer.value_preds, buffer.masks, buffer.bad_masks
+        returns = np.zeros_like(buffer.returns)
+        returns[-1] = next_value
+        gae = 0
+        for step in reversed(range(args.buffer_size)):
+            if use_gae:
+                td_delta = rewards[step] + gamma * value_preds[step + 1] * masks[step + 1] - value_preds[step]
+                gae = td_delta + gamma * gae_lambda * masks[step + 1] * gae
+                if use_proper_time_limits:
+                    gae = gae * bad_masks[step + 1]
+                returns[step] = gae + value_preds[step]
+            elif use_proper_time_limits:
+                returns[step] = (returns[step + 1] * gamma * masks[step + 1] + rewards[step]) * bad_masks[step + 1] \
+                    + (1 - bad_masks[step + 1]) * value_preds[step]
+            else:
+                returns[step] = returns[step + 1] * gamma * masks[step + 1] + rewards[step]
+        assert np.array_equal(buffer.returns[:-1], returns[:-1])
+
+    def test_buffer_clear(self):
+        args = get_config().parse_args(args='')
+        args.buffer_size, args.n_rollout_threads = 20, 3
+        buffer = ReplayBuffer(args, 2, gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.Discrete(5))
+        arrays = {name: getattr(buffer, name) for name in ReplayBuffer._fields}
+        for array in arrays.values():
+            array[:] = np.random.randn(*array.shape)
+        buffer.step = 5
+        buffer.clear()
+        assert buffer.step == 0
+        for name, array in arrays.items():
+            # cleared in place
+            assert getattr(buffer, name) is array
+            assert np.all(array == (1 if name in ["masks", "bad_masks"] else 0))
+        usage = buffer.memory_usage()
+        assert usage["rnn_states_actor"] == 21 * 3 * 2 * buffer.recurrent_hidden_layers * buffer.recurrent_hidden_size * 4
+        assert buffer.nbytes == sum(array.nbytes for array in arrays.values())
+
+    @pytest.mark.parametrize("rnn_states_storage, rnn_states_dtype", [("chunk", "float32"), ("full", "float16"),
+                                                                       ("chunk", "float16")])
+    def test_rnn_states_storage(self, rnn_states_storage, rnn_states_dtype):
+        args = get_config().parse_args(args='')
+        args.buffer_size, args.n_rollout_threads, args.data_chunk_length = 20, 3, 5
+        obs_space, act_space = gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.Discrete(5)
+        buffer = ReplayBuffer(args, 2, obs_space, act_space)
+        args.rnn_states_storage, args.rnn_states_dtype = rnn_states_storage, rnn_states_dtype
+        small_buffer = ReplayBuffer(args, 2, obs_space, act_space)
+        assert small_buffer.rnn_states_actor.shape == buffer.rnn_states_actor.shape
+        assert small_buffer.nbytes < buffer.nbytes
+
+        # same rollouts, reading rnn states of current step
+        for epoch in range(2):
+            for step in range(args.buffer_size):
+                assert np.allclose(buffer.rnn_states_actor[step], small_buffer.rnn_states_actor[step], atol=1e-2)
+                data = [np.random.randn(*x.shape[1:]).astype(np.float32) for x in
+                        [buffer.obs, buffer.actions, buffer.rewards, buffer.masks, buffer.action_log_probs,
+                         buffer.value_preds, buffer.rnn_states_actor, buffer.rnn_states_critic]]
+                buffer.insert(*data)
+                small_buffer.insert(*data)
+            next_value = np.random.randn(*buffer.value_preds.shape[1:]).astype(np.float32)
+            buffer.compute_returns(next_value)
+            small_buffer.compute_returns(next_value)
+            assert np.allclose(buffer.rnn_states_critic[-1], small_buffer.rnn_states_critic[-1], atol=1e-2)
+
+            # same minibatches
+            torch.manual_seed(0)
+            batches = list(ReplayBuffer.recurrent_generator(buffer, 2, 10))
+            torch.manual_seed(0)
+            small_batches = list(ReplayBuffer.recurrent_generator(small_buffer, 2, 10))
+            for data, small_data in zip(batches, small_batches):
+                for x, y in zip(data, small_data):
+                    assert torch.allclose(x, y.float(), atol=0 if rnn_states_dtype == "float32" else 1e-2)
+            buffer.after_update()
+            small_buffer.after_update()
+
+        if rnn_states_storage == "chunk":
+            with pytest.raises(IndexError):
+                small_buffer.rnn_states_actor[3]
+            with pytest.raises(AssertionError):
+                list(ReplayBuffer.recurrent_generator(small_buffer, 2, 4))
+
+    @pytest.mark.parametrize("use_gae, use_proper_time_limits", list(product([True, False], [True, False])))
+    def test_torch_buffer(self, use_gae, use_proper_time_limits):
+        args = get_config().parse_args(args='')
+        args.buffer_size, args.n_rollout_threads = 20, 3
+        args.use_gae, args.use_proper_time_limits = use_gae, use_proper_time_limits
+        obs_space, act_space = gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.MultiDiscrete([41, 41, 41, 30])
+        buffer = ReplayBuffer(args, 2, obs_space, act_space)
+        torch_buffer = TorchReplayBuffer(args, 2, obs_space, act_space)
+        assert all(isinstance(getattr(torch_buffer, key), torch.Tensor) for key in TorchReplayBuffer._fields)
+
+        # same numpy inserts
+        for _ in range(args.buffer_size):
+            data = [np.random.randn(*x.shape[1:]).astype(np.float32) for x in
+                    [buffer.obs, buffer.actions, buffer.rewards, buffer.masks, buffer.action_log_probs,
+                     buffer.value_preds, buffer.rnn_states_actor, buffer.rnn_states_critic, buffer.bad_masks]]
+            data[3], data[8] = (data[3] > -1.5).astype(np.float32), (data[8] > -1.5).astype(np.float32)
+            buffer.insert(*data)
+            torch_buffer.insert(*data)
+        assert torch_buffer.step == buffer.step == 0
+        next_value = np.random.randn(*buffer.value_preds.shape[1:]).astype(np.float32)
+        buffer.compute_returns(next_value)
+        torch_buffer.compute_returns(torch.from_numpy(next_value))
+        assert np.array_equal(buffer.returns, torch_buffer.returns.numpy())
+
+        # same minibatches
+        torch.manual_seed(0)
+        batches = list(ReplayBuffer.recurrent_generator(buffer, 2, 5))
+        torch.manual_seed(0)
+        torch_batches = list(ReplayBuffer.recurrent_generator(torch_buffer, 2, 5))
+        for data, torch_data in zip(batches, torch_batches):
+            for x, y in zip(data, torch_data):
+                assert torch.allclose(x, y, atol=1e-5)
+
+        buffer.after_update()
+        torch_buffer.after_update()
+        assert np.array_equal(buffer.obs[0], torch_buffer.obs[0].numpy())
+        torch_buffer.clear()
+        assert torch.all(torch_buffer.obs == 0) and torch.all(torch_buffer.masks == 1)
+
     @pytest.mark.parametrize("num_agents, obs_space, act_space", list(product(
         [       # num_agents
             1, 2
@@ -128,3 +315,82 @@ class TestPPO:
         trainer = PPOTrainer(args, device=torch.device("cpu"))
         policy.prep_training()
         trainer.train(policy, buffer)
+
+    @staticmethod
+    def _fill_buffer(buffer, seed=0):
+        """Fill `buffer` with random rollouts, the same for a given seed."""
+        rng = np.random.default_rng(seed)
+        buffer.obs[:] = rng.normal(size=buffer.obs.shape)
+        buffer.actions[:] = rng.integers(0, 30, size=buffer.actions.shape)
+        buffer.returns[:] = rng.normal(size=buffer.returns.shape)
+        buffer.masks[:] = rng.random(buffer.masks.shape) > 0.1
+        if isinstance(buffer, SharedReplayBuffer):
+            buffer.share_obs[:] = rng.normal(size=buffer.share_obs.shape)
+        return buffer
+
+    @staticmethod
+    def _adam_atol(args, num_updates):
+        # NOTE: Adam moves parameters by about lr per update whatever the gradient scale, so that
+        # parameters with tiny gradients may move in opposite directions
+        return 2 * num_updates * args.lr
+
+    @pytest.mark.parametrize("algorithm, flag", list(product(
+        ["ppo", "mappo"], ["--use-fused-optimizer", "--use-bf16-autocast", "--use-torch-compile"])))
+    def test_fast_training(self, algorithm, flag):
+        obs_space, act_space = gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.MultiDiscrete([41, 41, 41, 30])
+        share_obs_space = gym.spaces.Box(low=-1, high=1, shape=(36,))
+        train_infos, parameters = [], []
+        for flags in [[], [flag]]:
+            args = get_config().parse_args(["--buffer-size", "40", "--n-rollout-threads", "2", "--ppo-epoch", "2",
+                                            "--data-chunk-length", "8", "--num-mini-batch", "2"] + flags)
+            torch.manual_seed(0)
+            if algorithm == "ppo":
+                buffer = self._fill_buffer(ReplayBuffer(args, 2, obs_space, act_space))
+                policy = PPOPolicy(args, obs_space, act_space, device=torch.device("cpu"))
+                trainer = PPOTrainer(args, device=torch.device("cpu"))
+            else:
+                buffer = self._fill_buffer(SharedReplayBuffer(args, 2, obs_space, share_obs_space, act_space))
+                policy = MAPPOPolicy(args, obs_space, share_obs_space, act_space, device=torch.device("cpu"))
+                trainer = MAPPOTrainer(args, device=torch.device("cpu"))
+            policy.prep_training()
+            train_infos.append(trainer.train(policy, buffer))
+            parameters.append(torch.cat([p.detach().flatten() for p in policy.optimizer.param_groups[0]['params']]))
+        # same updates, up to bfloat16 precision
+        rtol = 5e-2 if flag == "--use-bf16-autocast" else 1e-4
+        for key in train_infos[0]:
+            assert np.isclose(train_infos[0][key], train_infos[1][key], rtol=rtol, atol=1e-4), key
+        atol = self._adam_atol(args, args.ppo_epoch * args.num_mini_batch) if flag == "--use-bf16-autocast" else 1e-4
+        assert torch.allclose(parameters[0], parameters[1], rtol=rtol, atol=atol)
+
+    @pytest.mark.parametrize("num_learners", [2, 3])
+    def test_distributed_learners(self, num_learners):
+        from runner.distributed_learners import DistributedLearners
+        obs_space, act_space = gym.spaces.Box(low=-1, high=1, shape=(18,)), gym.spaces.MultiDiscrete([41, 41, 41, 30])
+        gradients, parameters = [], []
+        for n in [1, num_learners]:
+            # a single update on 20 chunks, split unevenly over 3 learners
+            args = get_config().parse_args(["--buffer-size", "40", "--n-rollout-threads", "2", "--ppo-epoch", "1",
+                                            "--data-chunk-length", "8", "--num-mini-batch", "1",
+                                            "--num-learners", str(n)])
+            buffer = self._fill_buffer(ReplayBuffer(args, 2, obs_space, act_space))
+            torch.manual_seed(0)
+            policy = PPOPolicy(args, obs_space, act_space, device=torch.device("cpu"))
+            trainer = PPOTrainer(args, device=torch.device("cpu"))
+            learners = DistributedLearners(args, policy, trainer, buffer, (obs_space, act_space),
+                                           (2, obs_space, act_space)) if n > 1 else None
+            try:
+                if learners is not None:
+                    learners.sync(policy, buffer)
+                policy.prep_training()
+                train_info = trainer.train(policy, buffer)
+            finally:
+                if learners is not None:
+                    learners.close()
+            assert all(np.isfinite(v) for v in train_info.values())
+            modules = list(policy.actor.parameters()) + list(policy.critic.parameters())
+            gradients.append(torch.cat([p.grad.flatten() for p in modules]))
+            parameters.append(torch.cat([p.detach().flatten() for p in modules]))
+        assert learners.closed and not any(p.is_alive() for p in learners.processes)
+        # gradients of the shards, weighted by their number of chunks, average to the gradients of the minibatch
+        assert torch.allclose(gradients[0], gradients[1], rtol=1e-4, atol=1e-6)
+        assert torch.allclose(parameters[0], parameters[1], rtol=1e-4, atol=self._adam_atol(args, 1))